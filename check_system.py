@@ -1,14 +1,22 @@
+import os
+import json
+import argparse
 import redis
 import socket
 import logging
 from celery import Celery
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def check_redis():
     try:
-        r = redis.Redis(host='localhost', port=6379, db=0)
+        r = redis.Redis.from_url(REDIS_URL)
         r.ping()
         logger.info("Redis está funcionando")
         return True
@@ -28,7 +36,7 @@ def check_server(host='127.0.0.1', port=5000):
 
 def check_celery():
     try:
-        app = Celery('tasks', broker='redis://localhost:6379/0')
+        app = Celery('tasks', broker=os.getenv("CELERY_BROKER_URL", REDIS_URL))
         with app.connection() as conn:
             conn.ensure_connection(max_retries=3)
         logger.info("Celery está funcionando")
@@ -37,11 +45,54 @@ def check_celery():
         logger.error(f"Error en Celery: {e}")
         return False
 
+def report_prediction_cache():
+    """Muestra los contadores de aciertos/fallos de la caché de predicciones."""
+    try:
+        r = redis.Redis.from_url(REDIS_URL)
+        hits, misses = (int(value or 0) for value in r.mget("prediccion:stats:hits", "prediccion:stats:misses"))
+        total = hits + misses
+        ratio = hits / total if total else 0.0
+        logger.info(f"Caché de predicciones: {hits} aciertos, {misses} fallos ({ratio:.1%} de aciertos)")
+    except Exception as e:
+        logger.error(f"No se pudo leer la caché de predicciones: {e}")
+
+def report_metrics(host='127.0.0.1', port=5000):
+    """Pide al servidor los histogramas de latencia por etapa (acción "stats") y los muestra."""
+    try:
+        with socket.create_connection((host, port), timeout=5) as s:
+            request = json.dumps({"action": "stats", "protocol": 3}).encode()
+            s.sendall(len(request).to_bytes(4, "big") + request)
+            size = int.from_bytes(s.recv(4), "big")
+            data = b""
+            while len(data) < size:
+                chunk = s.recv(size - len(data))
+                if not chunk:
+                    raise ConnectionError("El servidor cerró la conexión")
+                data += chunk
+        stages = json.loads(data)["stages"]
+    except Exception as e:
+        logger.error(f"No se pudieron obtener las métricas: {e}")
+        return
+
+    print(f"{'Etapa':14} {'n':>7} {'media':>9} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    for stage, data in stages.items():
+        mean = data["sum_ms"] / data["count"] if data["count"] else 0.0
+        p50, p95, p99 = (data[key] or 0.0 for key in ("p50_ms", "p95_ms", "p99_ms"))
+        print(f"{stage:14} {data['count']:7} {mean:9.1f} {p50:9.1f} {p95:9.1f} {p99:9.1f}")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verificación del sistema FarmEye")
+    parser.add_argument("--metrics", action="store_true", help="Mostrar la latencia por etapa informada por el servidor")
+    args = parser.parse_args()
+
     print("Verificando sistema...")
     redis_ok = check_redis()
     server_ok = check_server()
     celery_ok = check_celery()
+    if redis_ok:
+        report_prediction_cache()
+    if args.metrics and server_ok:
+        report_metrics()
     
     if all([redis_ok, server_ok, celery_ok]):
         print("Todo el sistema está funcionando correctamente")
@@ -0,0 +1,88 @@
+"""Autoscaler de workers ante una carga sintética que sube y baja.
+
+Uso (desde src/):
+    python3 -m benchmarks.bench_autoscaler --farms 8 --phases 0.2:40 3:90 0.2:90 --target-ms 2000
+
+Levanta el stack local de `benchmarks.loadgen` sin worker fijo y `tasks.autoscaler --mode
+processes` con ventanas cortas; las granjas de loadgen suben imágenes nuevas al ritmo de
+cada fase (`imágenes/s por granja:segundos`). Cada ventana imprime procesos, p95 de la
+ventana, espera estimada de la cola y profundidad (lo que el autoscaler publica en Redis)
+y al final el p95 del tiempo hasta la predicción de cada fase, medido en las granjas.
+Con `--fixed N` corre N workers sin autoscaler, como referencia.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import redis
+
+from benchmarks.loadgen import Farm, LocalStack, summarize
+from tasks.autoscaler import STATUS_KEY
+
+
+def parse_phase(text):
+    rate, seconds = text.split(":")
+    return float(rate), float(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Autoscaler ante carga sintética")
+    parser.add_argument("--farms", type=int, default=8)
+    parser.add_argument("--phases", type=parse_phase, nargs="+", default=[(0.2, 40), (3, 90), (0.2, 90)],
+                        metavar="RITMO:SEGUNDOS", help="Imágenes/s por granja y duración de cada fase")
+    parser.add_argument("--target-ms", type=float, default=2000, help="Objetivo de p95 del tiempo hasta la predicción")
+    parser.add_argument("--max", type=int, default=4, help="Máximo de procesos worker")
+    parser.add_argument("--interval", type=float, default=3, help="Segundos por ventana del autoscaler")
+    parser.add_argument("--fixed", type=int, default=0, help="Usar N workers fijos en lugar del autoscaler")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[640, 480], metavar=("ANCHO", "ALTO"))
+    args = parser.parse_args()
+
+    # Farm lee ritmo, tamaño y timeouts de este objeto; el ritmo se cambia en cada fase
+    load = argparse.Namespace(rate=args.phases[0][0], image_size=args.image_size, quality=85, history_every=0, timeout=300)
+    # Antes de arrancar el stack: el servidor también tiene que ver MAX_BYTES_PER_MINUTE
+    env = {"AUTOSCALE_INTERVAL": str(args.interval), "AUTOSCALE_COOLDOWN": str(args.interval * 2),
+           "AUTOSCALE_MIN_SAMPLES": "3", "MAX_BYTES_PER_MINUTE": "0"}
+    with LocalStack([], worker=False, env=env) as stack:
+        if args.fixed:
+            for index in range(args.fixed):
+                stack.spawn(["celery", "-A", "tasks.celery_config", "worker", "-P", "solo", "-Q", "interactive,bulk",
+                             "-n", f"fijo{index}@%h", "--loglevel=warning"], f"worker{index}")
+        else:
+            stack.spawn([sys.executable, "-m", "tasks.autoscaler", "--mode", "processes", "--target-ms", str(args.target_ms),
+                         "--min", "1", "--max", str(args.max)], "autoscaler")
+        status_redis = redis.Redis.from_url(stack.env["REDIS_URL"], decode_responses=True)
+
+        samples = {"upload": [], "prediction": [], "history": [], "bytes": [], "busy": [], "errors": []}
+        stop = threading.Event()
+        farms = [Farm(index, load, "127.0.0.1", stack.port, stop, samples) for index in range(args.farms)]
+        for farm in farms:
+            farm.start()
+
+        phases = []
+        start = time.monotonic()
+        print(f"{'t':>5}  {'fase':>4}  {'procesos':>8}  {'p95 ventana':>12}  {'espera cola':>12}  {'en cola':>7}")
+        for number, (rate, seconds) in enumerate(args.phases, 1):
+            load.rate = rate
+            first = len(samples["prediction"])
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                time.sleep(args.interval)
+                status = json.loads(status_redis.get(STATUS_KEY) or "{}")
+                fmt = lambda value: "-" if value is None else f"{value:.0f} ms"
+                print(f"{time.monotonic() - start:5.0f}  {number:>4}  {status.get('workers', args.fixed or '-'):>8}  "
+                      f"{fmt(status.get('p95_ms')):>12}  {fmt(status.get('backlog_ms')):>12}  {status.get('depth', '-'):>7}")
+            phases.append((rate, seconds, samples["prediction"][first:]))
+        stop.set()
+        for farm in farms:
+            farm.join(10)
+
+    for number, (rate, seconds, latencies) in enumerate(phases, 1):
+        stats = summarize(latencies)
+        print(f"fase {number}: {rate * args.farms:5.1f} imágenes/s durante {seconds:.0f} s  n={stats['count']:5}  "
+              f"p50 {stats.get('p50_ms', 0):8.0f} ms  p95 {stats.get('p95_ms', 0):8.0f} ms  (objetivo {args.target_ms:.0f} ms)")
+    print(f"Rechazos por carga: {len(samples['busy'])}, errores: {len(samples['errors'])}")
+
+
+if __name__ == "__main__":
+    main()
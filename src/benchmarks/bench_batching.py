@@ -0,0 +1,78 @@
+"""Throughput vs. latencia del micro-batching para varias combinaciones de lote y espera.
+
+Uso (desde src/):
+    python3 -m benchmarks.bench_batching --rate 200 --duration 5
+Las llegadas siguen un proceso de Poisson a `--rate` imágenes/s y los lotes se infieren en
+este mismo proceso (sin Celery), así se mide solo el efecto del tamaño de lote.
+"""
+import argparse
+import glob
+import queue
+import random
+import threading
+import time
+
+from tasks.batching import MicroBatcher
+from tasks.image_processing import classify_batch
+from tasks.model import get_runner
+
+
+def run_setting(images, rate, duration, max_batch_size, max_wait_ms):
+    pending = queue.Queue()
+    latencies = []
+    batch_sizes = []
+    done = threading.Event()
+
+    def fetch(timeout):
+        try:
+            return pending.get(timeout=timeout) if timeout > 0 else pending.get_nowait()
+        except queue.Empty:
+            return None
+
+    def handle(batch):
+        classify_batch([image_path for image_path, _ in batch])
+        now = time.perf_counter()
+        latencies.extend(now - arrived for _, arrived in batch)
+        batch_sizes.append(len(batch))
+
+    def produce():
+        rng = random.Random(0)
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            pending.put((rng.choice(images), time.perf_counter()))
+            time.sleep(rng.expovariate(rate))
+        done.set()
+
+    batcher = MicroBatcher(fetch, handle, max_batch_size, max_wait_ms / 1000)
+    producer = threading.Thread(target=produce)
+    start = time.perf_counter()
+    producer.start()
+    batcher.run(should_stop=lambda: done.is_set() and pending.empty())
+    elapsed = time.perf_counter() - start
+    producer.join()
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    print(f"lote≤{max_batch_size:3} espera {max_wait_ms:5.0f} ms | {len(latencies) / elapsed:7.1f} img/s | "
+          f"lote medio {sum(batch_sizes) / len(batch_sizes):5.1f} | "
+          f"p50 {pct(0.50):8.1f} ms  p95 {pct(0.95):8.1f} ms  p99 {pct(0.99):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de micro-batching")
+    parser.add_argument("--rate", type=float, default=200, help="Imágenes por segundo ofrecidas")
+    parser.add_argument("--duration", type=float, default=5, help="Segundos de carga por configuración")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--waits", type=float, nargs="+", default=[0, 10, 50], help="Esperas máximas en ms")
+    parser.add_argument("--images", nargs="*", default=sorted(glob.glob("client/images/*")))
+    args = parser.parse_args()
+
+    get_runner()
+    print(f"Carga ofrecida: {args.rate} img/s durante {args.duration}s por configuración")
+    for max_batch_size in args.sizes:
+        for max_wait_ms in args.waits:
+            run_setting(args.images, args.rate, args.duration, max_batch_size, max_wait_ms)
+
+
+if __name__ == "__main__":
+    main()
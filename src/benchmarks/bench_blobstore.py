@@ -0,0 +1,79 @@
+"""Throughput de inferencia con 1, 2 y 4 "máquinas" de workers leyendo del almacenamiento de imágenes.
+
+Uso (desde src/, con Redis corriendo):
+    python3 -m benchmarks.bench_blobstore --images 200 --hosts 1 2 4
+Cada máquina simulada es un proceso con su propio IMAGE_FOLDER: la primera comparte el
+directorio del servidor (lee de disco) y las demás solo pueden pedir los bytes a Redis.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+
+from tasks.image_processing import classify_image
+from utils.blobstore import RedisBlobStore
+
+
+def make_images(directory, count, size=(1600, 1200)):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        pixels = rng.integers(0, 255, (size[1] // 16, size[0] // 16, 3), dtype=np.uint8)
+        path = os.path.join(directory, f"{i:05d}.jpg")
+        Image.fromarray(pixels).resize(size).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def host(root, keys, counts):
+    store = RedisBlobStore(root=root)
+    local = remote = 0
+    while (key := keys.get()) is not None:
+        if os.path.exists(store.local_path(key)):
+            local += 1
+        else:
+            remote += 1
+        with store.open(key) as image:
+            classify_image(image)
+    counts.put((local, remote))
+
+
+def run(server_root, keys, hosts):
+    queue = multiprocessing.Queue()
+    counts = multiprocessing.Queue()
+    for key in keys:
+        queue.put(key)
+    with tempfile.TemporaryDirectory() as remote_root:
+        roots = [server_root] + [remote_root] * (hosts - 1)
+        processes = [multiprocessing.Process(target=host, args=(root, queue, counts)) for root in roots]
+        for _ in processes:
+            queue.put(None)
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+    local, remote = map(sum, zip(*(counts.get() for _ in processes)))
+    print(f"{hosts} máquina(s): {len(keys) / elapsed:7.1f} img/s | disco local {local:5} | Redis {remote:5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput con workers en varias máquinas simuladas")
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--hosts", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as server_root:
+        store = RedisBlobStore(root=server_root)
+        keys = [store.put(path) for path in make_images(server_root, args.images)]
+        for hosts in args.hosts:
+            run(server_root, keys, hosts)
+        store.redis.delete(*(f"blob:{key}" for key in keys))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Compara cuántas conexiones concurrentes sostiene cada modo del servidor.
+
+Uso (desde src/, con Redis y la BD disponibles para que el servidor arranque):
+    python3 -m benchmarks.bench_connections --levels 100 500 1000 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+REQUEST = json.dumps({"action": "ping"}).encode()  # Acción sin BD ni Redis: mide solo el front-end TCP
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def wait_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+async def one_client(port, barrier, timeout):
+    """Abre una conexión, espera a que todas estén abiertas y hace un round trip."""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+    except Exception:
+        await barrier.wait()
+        return False
+    try:
+        await barrier.wait()
+        writer.write(len(REQUEST).to_bytes(4, "big") + REQUEST)
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(4096), timeout)
+        return b'"success"' in data
+    except Exception:
+        return False
+    finally:
+        writer.close()
+
+
+async def run_level(port, n, timeout):
+    barrier = asyncio.Barrier(n)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one_client(port, barrier, timeout) for _ in range(n)))
+    return sum(results), time.perf_counter() - start
+
+
+def bench_mode(mode, port, levels, backlog, timeout):
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "server.server", "--mode", mode, "--port", str(port), "--backlog", str(backlog)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_port(port):
+            print(f"[{mode}] el servidor no arrancó")
+            return []
+        rows = []
+        for n in levels:
+            ok, elapsed = asyncio.run(run_level(port, n, timeout))
+            rows.append((n, ok, elapsed))
+            print(f"[{mode:8}] {n:6} conexiones -> {ok:6} ok ({ok / n:6.1%}) en {elapsed:6.2f}s")
+        return rows
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de conexiones concurrentes: async vs threaded")
+    parser.add_argument("--levels", type=int, nargs="+", default=[100, 500, 1000, 2000])
+    parser.add_argument("--port", type=int, default=5900)
+    parser.add_argument("--backlog", type=int, default=1024)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    summary = {}
+    for offset, mode in enumerate(("threaded", "async")):
+        rows = bench_mode(mode, args.port + offset, args.levels, args.backlog, args.timeout)
+        sustained = [n for n, ok, _ in rows if ok == n]
+        summary[mode] = max(sustained) if sustained else 0
+
+    print("\nMáximo de conexiones sostenidas sin errores:")
+    for mode, n in summary.items():
+        print(f"  {mode:8}: {n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Exportación masiva: filas/s y pico de memoria (RSS) con cursor del servidor vs `.all()`.
+
+Uso (desde src/):
+    python3 -m benchmarks.bench_export --rows 1000000
+    DATABASE_URL=postgresql://... python3 -m benchmarks.bench_export --rows 1000000 --skip-seed
+
+Sin DATABASE_URL siembra una base SQLite temporal con `--rows` predicciones (semilla fija).
+Cada exportación corre en un proceso aparte (`python3 -m server.export`) y su pico de RSS se
+lee con wait4, así la siembra no contamina la medición. Parquet se mide solo si hay pyarrow.
+"""
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+directory = tempfile.mkdtemp(prefix="farmeye-export-")
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{directory}/bench_export.db"
+
+from sqlalchemy import func, insert, select
+from utils.database import Base, get_engine
+from server.models import Image, Prediction, User
+
+LABELS = ("Sano", "Posible Enfermedad", "Enfermo")
+
+# Misma consulta que server.export pero cargando todas las filas en memoria antes de escribir
+NAIVE_EXPORT = """
+import csv, gzip, sys
+from utils.database import session_scope
+from server.export import COLUMNS, export_query
+with session_scope() as db:
+    rows = db.execute(export_query()).all()
+with gzip.open(sys.argv[1], "wt", newline="") as f:
+    writer = csv.writer(f)
+    writer.writerow(COLUMNS)
+    writer.writerows(rows)
+"""
+
+
+def seed(rows, users=1000, chunk=50_000):
+    """Usuarios, una imagen por predicción y `rows` predicciones repartidas en un año."""
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": user_id, "username": f"usuario_{user_id}"} for user_id in range(1, users + 1)])
+    for offset in range(0, rows, chunk):
+        images, predictions = [], []
+        for image_id in range(offset + 1, min(rows, offset + chunk) + 1):
+            moment = start + timedelta(seconds=rng.randrange(365 * 86400))
+            images.append({"id": image_id, "user_id": rng.randint(1, users), "uploaded_at": moment,
+                           "image_path": f"server/uploads/{rng.getrandbits(128):032x}.jpg"})
+            predictions.append({"id": image_id, "image_id": image_id, "result": rng.choice(LABELS),
+                                "confidence": rng.choice((60, 80, 100)), "created_at": moment + timedelta(seconds=3)})
+        with engine.begin() as conn:
+            conn.execute(insert(Image), images)
+            conn.execute(insert(Prediction), predictions)
+
+
+def run(command):
+    """Corre un comando y devuelve (segundos, pico de RSS en MiB)."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    if status:
+        raise RuntimeError(f"Falló {' '.join(command)}")
+    return elapsed, usage.ru_maxrss / 1024  # ru_maxrss está en KiB en Linux
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la exportación de predicciones")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--skip-seed", action="store_true", help="Usar las filas que ya tiene DATABASE_URL")
+    parser.add_argument("--skip-naive", action="store_true", help="No medir la versión con .all()")
+    args = parser.parse_args()
+
+    if not args.skip_seed:
+        start = time.perf_counter()
+        seed(args.rows)
+        print(f"Sembradas {args.rows} predicciones en {time.perf_counter() - start:.1f} s")
+    with get_engine().connect() as conn:
+        rows = conn.scalar(select(func.count()).select_from(Prediction))
+
+    cases = [("cursor, csv.gz", [sys.executable, "-m", "server.export", "--output", f"{directory}/export.csv.gz",
+                                 "--chunk-size", str(args.chunk_size)])]
+    try:
+        import pyarrow  # noqa: F401
+        cases.append(("cursor, parquet", [sys.executable, "-m", "server.export", "--output", f"{directory}/export.parquet",
+                                          "--chunk-size", str(args.chunk_size)]))
+    except ImportError:
+        print("pyarrow no está instalado: se omite Parquet")
+    if not args.skip_naive:
+        cases.append((".all(), csv.gz", [sys.executable, "-c", NAIVE_EXPORT, f"{directory}/naive.csv.gz"]))
+
+    try:
+        for name, command in cases:
+            elapsed, peak_mib = run(command)
+            output = command[command.index("--output") + 1] if "--output" in command else command[-1]
+            size_mib = os.path.getsize(output) / 2**20
+            print(f"{name:18} {rows / elapsed:10,.0f} filas/s  {elapsed:6.1f} s  pico RSS {peak_mib:7.1f} MiB  "
+                  f"archivo {size_mib:6.1f} MiB")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
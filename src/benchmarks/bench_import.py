@@ -0,0 +1,74 @@
+"""Tiempo de importación de cada punto de entrada, con un presupuesto por módulo.
+
+Uso (desde src/):
+    python3 -m benchmarks.bench_import --repeat 5
+Cada import corre en un intérprete nuevo con REDIS_URL apuntando a un puerto cerrado y sin
+DATABASE_URL: si algún módulo intentara conectarse al importarse, fallaría o se pasaría del
+presupuesto. Sale con código 1 si algún punto de entrada supera su presupuesto.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Milisegundos por encima del arranque del intérprete
+BUDGETS_MS = {
+    "client.client": 150,
+    "tasks.celery_config": 500,
+    "tasks.batching": 500,
+    "tasks.image_processing": 900,
+    "server.server": 1200,
+}
+
+
+def import_time(statement, env, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], env=env, check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def slowest_imports(module, env, count=5):
+    """Módulos con mayor tiempo acumulado según `python -X importtime`."""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            env=env, capture_output=True, text=True).stderr
+    rows = []
+    for line in output.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, name = line.split("|")
+            rows.append((int(cumulative), name.strip()))
+    rows = [row for row in rows if row[1].split(".")[0] != module.split(".")[0]]
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Presupuesto de tiempo de importación")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--details", action="store_true", help="Mostrar las dependencias más lentas")
+    args = parser.parse_args()
+
+    env = dict(os.environ, REDIS_URL="redis://127.0.0.1:1/0")
+    env.pop("DATABASE_URL", None)
+    baseline = import_time("pass", env, args.repeat)
+    print(f"Arranque del intérprete: {baseline:.0f} ms")
+
+    over_budget = []
+    for module, budget in BUDGETS_MS.items():
+        elapsed = import_time(f"import {module}", env, args.repeat) - baseline
+        status = "OK" if elapsed <= budget else "EXCEDIDO"
+        print(f"{module:24} {elapsed:7.0f} ms  (presupuesto {budget} ms)  {status}")
+        if elapsed > budget:
+            over_budget.append(module)
+        if args.details:
+            for cumulative, name in slowest_imports(module, env):
+                print(f"    {name:40} {cumulative / 1000:7.0f} ms")
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
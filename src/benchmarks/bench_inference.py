@@ -0,0 +1,76 @@
+"""Latencia por imagen y memoria (RSS) de la ruta de inferencia de los workers.
+
+Uso (desde src/):
+    python3 -m benchmarks.bench_inference --iterations 50 --consensus fixed adaptive
+Además de las imágenes de ejemplo genera una foto JPEG de cámara (4032x3024) para medir
+la decodificación en modo draft.
+"""
+import argparse
+import glob
+import os
+import resource
+import statistics
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+
+from tasks.image_processing import classify_image
+from tasks.model import get_runner
+
+
+def rss_mb():
+    """RSS actual del proceso en MB (Linux)."""
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def camera_photo(directory, size=(4032, 3024)):
+    path = os.path.join(directory, "camara.jpg")
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 255, (size[1] // 8, size[0] // 8, 3), dtype=np.uint8)
+    Image.fromarray(pixels).resize(size).save(path, quality=90)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de inferencia por imagen")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--images", nargs="*", default=sorted(glob.glob("client/images/*")))
+    parser.add_argument("--consensus", nargs="+", default=["fixed"], choices=["fixed", "adaptive"],
+                        help="Modos de consenso a comparar")
+    args = parser.parse_args()
+
+    print(f"RSS inicial: {rss_mb():.1f} MB")
+    start = time.perf_counter()
+    get_runner()
+    print(f"Carga del modelo: {(time.perf_counter() - start) * 1000:.1f} ms, RSS: {rss_mb():.1f} MB")
+
+    with tempfile.TemporaryDirectory() as directory:
+        images = args.images + [camera_photo(directory)]
+        for mode in args.consensus:
+            print(f"Consenso {mode}:")
+            all_latencies = []
+            for image_path in images:
+                classify_image(image_path, mode=mode)  # Calentamiento
+                latencies = []
+                views = 0
+                for _ in range(args.iterations):
+                    start = time.perf_counter()
+                    views += len(classify_image(image_path, mode=mode)["details"])
+                    latencies.append((time.perf_counter() - start) * 1000)
+                all_latencies.extend(latencies)
+                latencies.sort()
+                p95 = latencies[int(len(latencies) * 0.95) - 1]
+                print(f"  {os.path.basename(image_path):12} media {statistics.mean(latencies):7.2f} ms  "
+                      f"p50 {statistics.median(latencies):7.2f} ms  p95 {p95:7.2f} ms  "
+                      f"variantes {views / args.iterations:.1f}")
+            print(f"  Latencia media ({mode}): {statistics.mean(all_latencies):.2f} ms")
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"RSS final: {rss_mb():.1f} MB, pico: {peak:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
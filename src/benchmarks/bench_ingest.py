@@ -0,0 +1,87 @@
+"""Mide round trips a la BD y latencia por subida: flujo anterior vs ingesta en una transacción.
+
+Uso (desde src/):
+    DATABASE_URL=postgresql://... python3 -m benchmarks.bench_ingest --uploads 500
+Sin DATABASE_URL usa una base SQLite temporal.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_ingest.db"
+
+from sqlalchemy import event
+from utils.database import Base, SessionLocal, engine, session_scope
+from server.models import Image, User
+from server.ingest import ingest_image
+
+
+def legacy_register_image(user_id, image_path):
+    """Flujo anterior: consulta de usuario, commit del usuario nuevo y commit de la imagen."""
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter_by(id=user_id).first()
+        if not user:
+            db.add(User(id=user_id, username=f"usuario_{user_id}"))
+            db.commit()
+        new_image = Image(image_path=image_path, user_id=user_id)
+        db.add(new_image)
+        db.commit()
+        return new_image.id  # Tras el commit el objeto expira: un SELECT más
+    finally:
+        db.close()
+
+
+def upsert_register_image(user_id, image_path):
+    with session_scope() as db:
+        return ingest_image(db, user_id, image_path)
+
+
+class RoundTripCounter:
+    """Cuenta sentencias y commits enviados al motor."""
+
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+        event.listen(engine, "commit", self.on_commit)
+
+    def on_execute(self, *args):
+        self.statements += 1
+
+    def on_commit(self, *args):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = self.commits = 0
+
+
+def run(name, register, uploads, users, counter, user_offset):
+    counter.reset()
+    start = time.perf_counter()
+    for i in range(uploads):
+        register(user_offset + i % users, f"bench/{name}/{i}.webp")
+    elapsed = time.perf_counter() - start
+    round_trips = (counter.statements + counter.commits) / uploads
+    print(f"{name:8}: {round_trips:4.2f} round trips/subida "
+          f"({counter.statements / uploads:.2f} sentencias + {counter.commits / uploads:.2f} commits), "
+          f"{elapsed / uploads * 1000:6.3f} ms/subida")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la ruta de ingesta")
+    parser.add_argument("--uploads", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50, help="Usuarios distintos (los primeros envíos crean el usuario)")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    counter = RoundTripCounter()
+    print(f"Motor: {engine.dialect.name}, {args.uploads} subidas, {args.users} usuarios")
+    run("anterior", legacy_register_image, args.uploads, args.users, counter, user_offset=10_000_000)
+    run("upsert", upsert_register_image, args.uploads, args.users, counter, user_offset=20_000_000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Latencia de consultas interactivas mientras otro usuario sube una importación masiva.
+
+Uso (desde src/, con Redis y al menos un worker `-Q interactive,bulk` corriendo):
+    python3 -m benchmarks.bench_priority --bulk-images 500 --interactive 20
+    python3 -m benchmarks.bench_priority --fifo   # comportamiento anterior: una sola cola FIFO
+Un usuario encola `--bulk-images` imágenes de golpe y otro envía `--interactive` imágenes
+espaciadas `--interval` segundos; se reporta p50/p99 desde el encolado hasta el resultado.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+from tasks.image_processing import process_image_task
+from tasks.scheduling import INTERACTIVE_QUEUE, route_image
+from utils.blobstore import get_blob_store
+from utils.redis_client import get_redis
+
+
+def stage(image_path):
+    """Copia una imagen de prueba al almacenamiento con su nombre por contenido; devuelve la clave."""
+    store = get_blob_store()
+    with open(image_path, "rb") as f:
+        data = f.read()
+    key = hashlib.sha256(data).hexdigest() + os.path.splitext(image_path)[1].lower()
+    os.makedirs(os.path.dirname(store.local_path(key)), exist_ok=True)
+    if not os.path.exists(store.local_path(key)):
+        with open(store.local_path(key), "wb") as f:
+            f.write(data)
+    return store.put(store.local_path(key))
+
+
+def submit(image_key, user_id, bulk, fifo):
+    task_id = str(uuid.uuid4())
+    route = {"queue": INTERACTIVE_QUEUE} if fifo else route_image(user_id, bulk)
+    process_image_task.apply_async(args=(image_key, user_id), task_id=task_id, **route)
+    return task_id
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prioridad interactiva vs. importación masiva")
+    parser.add_argument("--images", default="../images/*", help="Glob de imágenes de prueba")
+    parser.add_argument("--bulk-images", type=int, default=500)
+    parser.add_argument("--interactive", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--fifo", action="store_true", help="Sin colas ni prioridades (línea base)")
+    args = parser.parse_args()
+
+    images = [stage(image_path) for image_path in sorted(glob.glob(args.images))]
+    if not images:
+        raise SystemExit(f"No hay imágenes en {args.images}")
+    bulk_user = random.randint(1, 2**31 - 1)
+    interactive_user = bulk_user + 1
+
+    submitted = {}  # task_id -> (tipo, instante de encolado)
+    finished = {}
+    lock = threading.Lock()
+    pubsub = get_redis(decode_responses=True).pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(f"resultados:{bulk_user}", f"resultados:{interactive_user}")
+
+    def listen():
+        expected = args.bulk_images + args.interactive
+        deadline = time.perf_counter() + args.timeout
+        while len(finished) < expected and time.perf_counter() < deadline:
+            message = pubsub.get_message(timeout=1.0)
+            if message:
+                task_id = json.loads(message["data"]).get("task_id")
+                with lock:
+                    if task_id in submitted:
+                        finished[task_id] = time.perf_counter()
+
+    listener = threading.Thread(target=listen)
+    listener.start()
+
+    start = time.perf_counter()
+    for i in range(args.bulk_images):
+        task_id = submit(images[i % len(images)], bulk_user, True, args.fifo)
+        with lock:
+            submitted[task_id] = ("bulk", time.perf_counter())
+    for i in range(args.interactive):
+        task_id = submit(images[i % len(images)], interactive_user, False, args.fifo)
+        with lock:
+            submitted[task_id] = ("interactive", time.perf_counter())
+        time.sleep(args.interval)
+
+    listener.join()
+    elapsed = time.perf_counter() - start
+    pubsub.close()
+
+    for kind in ("interactive", "bulk"):
+        latencies = [finished[t] - sent for t, (k, sent) in submitted.items() if k == kind and t in finished]
+        total = sum(1 for k, _ in submitted.values() if k == kind)
+        print(f"{kind:12} {len(latencies):5}/{total:<5} | p50 {percentile(latencies, 0.50):9.1f} ms  "
+              f"p99 {percentile(latencies, 0.99):9.1f} ms")
+    print(f"Modo: {'FIFO' if args.fifo else 'colas con prioridad'} | {len(finished) / elapsed:.1f} img/s en {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Escalado del front end con `--workers N` (procesos acceptor con SO_REUSEPORT).
+
+Uso (desde src/):
+    python3 -m benchmarks.bench_workers --workers 1 2 4 --clients 16 --duration 15
+
+Para cada N levanta el stack local de `benchmarks.loadgen` con `server.server --workers N`,
+analiza una imagen una vez y después `--clients` procesos la suben en bucle: todas aciertan
+en la caché de predicciones, así que cada subida ejercita solo el front end (JSON, socket,
+SHA-256, registro en la BD y respuesta) sin esperar a la inferencia. Informa subidas/s y
+latencia por N. La BD es SQLite y serializa escrituras; en una máquina con PostgreSQL el
+escalado es mejor que el medido aquí.
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import socket
+import time
+import numpy as np
+
+from benchmarks.loadgen import LocalStack, make_image, send_request, summarize
+from client.client import recv_message
+
+
+def upload(conn, payload, user_id, request_id):
+    """Sube `payload` por protocolo v3 y devuelve la respuesta con la predicción (o el error)."""
+    send_request(conn, {"action": "send_image", "user_id": user_id, "image_name": "bench.jpg", "file_size": len(payload),
+                        "protocol": 3, "checksum": hashlib.sha256(payload).hexdigest(), "request_id": request_id})
+    conn.sendall(payload)
+    while True:
+        response = recv_message(conn)
+        if "final_result" in response or response.get("status") != "success":
+            return response
+
+
+def client_loop(port, payload, user_id, duration, results):
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+    with socket.create_connection(("127.0.0.1", port), timeout=60) as conn:
+        request_id = 0
+        while time.monotonic() < deadline:
+            request_id += 1
+            start = time.perf_counter()
+            response = upload(conn, payload, user_id, request_id)
+            if "final_result" in response:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+    results.put((latencies, errors))
+
+
+def measure(workers, args, payload):
+    with LocalStack(["--workers", str(workers), "--mode", args.mode]) as stack:
+        with socket.create_connection(("127.0.0.1", stack.port), timeout=120) as conn:
+            upload(conn, payload, 1, 0)  # Primera subida: inferencia real, deja la predicción en caché
+
+        results = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=client_loop, args=(stack.port, payload, 1000 + index, args.duration, results))
+                   for index in range(args.clients)]
+        start = time.perf_counter()
+        for process in clients:
+            process.start()
+        samples = [results.get() for _ in clients]
+        elapsed = time.perf_counter() - start
+        for process in clients:
+            process.join()
+
+    latencies = [latency for client_latencies, _ in samples for latency in client_latencies]
+    return len(latencies) / elapsed, summarize(latencies), sum(errors for _, errors in samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Escalado del servidor con varios procesos acceptor")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16, help="Procesos cliente concurrentes")
+    parser.add_argument("--duration", type=float, default=15, help="Segundos de carga por configuración")
+    parser.add_argument("--mode", choices=["async", "threaded"], default="async")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[640, 480], metavar=("ANCHO", "ALTO"))
+    args = parser.parse_args()
+
+    # Sin límite de bytes por minuto: todas las subidas de un cliente van con el mismo usuario
+    os.environ["MAX_BYTES_PER_MINUTE"] = "0"
+    payload = make_image(np.random.default_rng(0), args.image_size, 85)
+    print(f"{os.cpu_count()} CPUs, {args.clients} clientes, imagen de {len(payload) / 1024:.0f} KiB, modo {args.mode}")
+
+    baseline = None
+    for workers in args.workers:
+        throughput, stats, errors = measure(workers, args, payload)
+        baseline = baseline or throughput
+        print(f"workers={workers:<3} {throughput:8.1f} subidas/s  (x{throughput / baseline:.2f})  "
+              f"p50 {stats.get('p50_ms', 0):7.1f} ms  p99 {stats.get('p99_ms', 0):7.1f} ms  errores {errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Generador de carga: N granjas simuladas subiendo imágenes y consultando su historial.
+
+Uso (desde src/):
+    python3 -m benchmarks.loadgen --local --farms 20 --duration 60 --output carga.json
+    python3 -m benchmarks.loadgen --host 10.0.0.5 --port 5000 --farms 200 --rate 0.5
+    python3 -m benchmarks.loadgen --local --server-args="--mode threaded"
+
+Con `--local` levanta sus propios reemplazos: Redis (redis-server si está instalado, si no
+fakeredis con soporte Lua, `pip install "fakeredis[lua]"`, que el transporte de Celery
+necesita), SQLite en un directorio temporal, un worker de Celery `-P solo` y el servidor.
+Sin `--local` usa el servidor indicado y lo que éste tenga configurado.
+
+Cada granja abre una conexión (protocolo v3), sube imágenes JPEG nuevas de `--image-size`
+a `--rate` imágenes/s (llegadas de Poisson) y cada `--history-every` subidas consulta su
+historial por otra conexión. El reporte JSON trae throughput y p50/p95/p99 de la subida
+(hasta la confirmación), del tiempo hasta la predicción y de las consultas de historial.
+Las subidas rechazadas con "busy" se reintentan con el mismo backoff que el cliente y se
+cuentan aparte; sus tiempos incluyen la espera.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import shlex
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from PIL import Image
+
+from client.client import busy_delay, recv_message
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_port(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class LocalStack:
+    """Redis, SQLite, un worker de Celery (salvo `worker=False`) y el servidor en procesos locales.
+
+    `env` son variables extra para todos los procesos; se aplican antes de lanzar el servidor.
+    """
+
+    def __init__(self, server_args, worker=True, env=None):
+        self.server_args = server_args
+        self.worker = worker
+        self.extra_env = env or {}
+        self.directory = tempfile.mkdtemp(prefix="farmeye-carga-")
+        self.processes = []
+        self.fake_redis = None
+        self.port = free_port()
+
+    def start_redis(self):
+        port = free_port()
+        if shutil.which("redis-server"):
+            self.spawn(["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"], "redis")
+        else:
+            from fakeredis import TcpFakeServer  # Reemplazo en proceso si no hay redis-server (requiere lupa)
+
+            self.fake_redis = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+            threading.Thread(target=self.fake_redis.serve_forever, daemon=True).start()
+        if not wait_port(port):
+            raise RuntimeError("Redis no arrancó")
+        return f"redis://127.0.0.1:{port}/0"
+
+    def spawn(self, command, name):
+        log = open(os.path.join(self.directory, f"{name}.log"), "w")
+        self.processes.append(subprocess.Popen(command, env=self.env, stdout=log, stderr=subprocess.STDOUT))
+
+    def __enter__(self):
+        self.env = dict(os.environ)
+        self.env.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(self.directory, 'farmeye.db')}",
+            IMAGE_FOLDER=os.path.join(self.directory, "uploads") + "/",
+        )
+        self.env.update(self.extra_env)
+        self.env["REDIS_URL"] = self.start_redis()
+        subprocess.run([sys.executable, "-c", "from utils.database import Base, get_engine; import server.models; "
+                        "Base.metadata.create_all(bind=get_engine())"], env=self.env, check=True)
+        if self.worker:
+            self.spawn(["celery", "-A", "tasks.celery_config", "worker", "-P", "solo", "-Q", "interactive,bulk",
+                        "--loglevel=warning"], "worker")
+        self.spawn([sys.executable, "-m", "server.server", "--port", str(self.port), *self.server_args], "server")
+        if not wait_port(self.port):
+            raise RuntimeError(f"El servidor no arrancó; ver logs en {self.directory}")
+        time.sleep(2)  # Margen para que el worker termine de conectarse
+        return self
+
+    def __exit__(self, *exc):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if self.fake_redis:
+            self.fake_redis.shutdown()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def make_image(rng, size, quality):
+    """JPEG nuevo en cada subida, así ninguna acierta en la caché de predicciones."""
+    pixels = rng.integers(0, 255, (size[1] // 8, size[0] // 8, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).resize(size).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def send_request(conn, request):
+    data = json.dumps(request).encode()
+    conn.sendall(len(data).to_bytes(4, "big") + data)
+
+
+class Farm(threading.Thread):
+    """Una granja: sube imágenes a ritmo de Poisson y consulta su historial de vez en cuando."""
+
+    def __init__(self, index, args, host, port, stop, samples):
+        super().__init__(daemon=True)
+        self.index = index
+        self.args = args
+        self.address = (host, port)
+        self.stop = stop
+        self.samples = samples
+        self.user_id = random.randint(1, 2**31 - 1)
+        self.rng = np.random.default_rng(index)
+        self.random = random.Random(index)
+
+    def record(self, kind, value):
+        self.samples[kind].append(value)
+
+    def query_history(self):
+        start = time.perf_counter()
+        try:
+            with socket.create_connection(self.address, timeout=self.args.timeout) as conn:
+                send_request(conn, {"action": "get_history", "user_id": self.user_id, "protocol": 3, "limit": 50})
+                while not (response := recv_message(conn)).get("done"):
+                    if response.get("status") != "success":
+                        break
+            self.record("history", time.perf_counter() - start)
+        except (OSError, ValueError):
+            self.record("errors", "history")
+
+    def upload(self, conn, request_id):
+        payload = make_image(self.rng, self.args.image_size, self.args.quality)
+        metadata = {"action": "send_image", "user_id": self.user_id, "image_name": f"granja{self.index}_{request_id}.jpg",
+                    "file_size": len(payload), "protocol": 3, "checksum": hashlib.sha256(payload).hexdigest(),
+                    "request_id": request_id}
+        start = time.perf_counter()
+        send_request(conn, metadata)
+        conn.sendall(payload)
+        attempt = 0
+        while True:
+            response = recv_message(conn)
+            if response.get("request_id") != request_id:
+                continue
+            if response.get("status") == "busy":
+                # Rechazada por el control de admisión: se reintenta como el cliente, con backoff
+                self.record("busy", response.get("reason"))
+                if self.stop.wait(busy_delay(response, attempt)):
+                    return
+                attempt += 1
+                send_request(conn, metadata)
+                conn.sendall(payload)
+                continue
+            if "final_result" in response:
+                self.record("prediction", time.perf_counter() - start)
+                return
+            if response.get("status") != "success":
+                self.record("errors", response.get("message", "error"))
+                return
+            self.record("upload", time.perf_counter() - start)
+            self.record("bytes", len(payload))
+
+    def run(self):
+        time.sleep(self.random.uniform(0, 1 / self.args.rate))  # Las granjas no arrancan todas juntas
+        try:
+            with socket.create_connection(self.address, timeout=self.args.timeout) as conn:
+                request_id = 0
+                while not self.stop.is_set():
+                    request_id += 1
+                    self.upload(conn, request_id)
+                    if self.args.history_every and request_id % self.args.history_every == 0:
+                        self.query_history()
+                    self.stop.wait(self.random.expovariate(self.args.rate))
+        except (OSError, ValueError) as e:
+            self.record("errors", str(e))
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    pct = lambda p: round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 2)
+    return {"count": len(values), "mean_ms": round(statistics.mean(values) * 1000, 2),
+            "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99), "max_ms": round(values[-1] * 1000, 2)}
+
+
+def run_load(args, host, port):
+    samples = {"upload": [], "prediction": [], "history": [], "bytes": [], "busy": [], "errors": []}
+    stop = threading.Event()
+    farms = [Farm(index, args, host, port, stop, samples) for index in range(args.farms)]
+    start = time.perf_counter()
+    for farm in farms:
+        farm.start()
+    stop.wait(args.duration)
+    stop.set()
+    for farm in farms:
+        farm.join(args.timeout)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {"farms": args.farms, "rate_per_farm": args.rate, "duration_s": args.duration,
+                   "image_size": list(args.image_size), "quality": args.quality,
+                   "history_every": args.history_every, "local": args.local, "server_args": args.server_args},
+        "elapsed_s": round(elapsed, 2),
+        "throughput": {"uploads_per_s": round(len(samples["upload"]) / elapsed, 2),
+                       "predictions_per_s": round(len(samples["prediction"]) / elapsed, 2),
+                       "upload_mb_per_s": round(sum(samples["bytes"]) / elapsed / 2**20, 3)},
+        "upload": summarize(samples["upload"]),
+        "time_to_prediction": summarize(samples["prediction"]),
+        "history": summarize(samples["history"]),
+        "busy": {"count": len(samples["busy"]), "reasons": sorted(set(map(str, samples["busy"])))},
+        "errors": {"count": len(samples["errors"]), "examples": sorted(set(map(str, samples["errors"])))[:5]},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de carga para todo el pipeline")
+    parser.add_argument("--farms", type=int, default=10, help="Granjas (conexiones) concurrentes")
+    parser.add_argument("--rate", type=float, default=0.5, help="Imágenes por segundo por granja")
+    parser.add_argument("--duration", type=float, default=30, help="Segundos de carga")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[1024, 768], metavar=("ANCHO", "ALTO"))
+    parser.add_argument("--quality", type=int, default=85, help="Calidad JPEG de las imágenes generadas")
+    parser.add_argument("--history-every", type=int, default=10, help="Consultar historial cada N subidas (0 desactiva)")
+    parser.add_argument("--timeout", type=float, default=120, help="Segundos máximos esperando una respuesta")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--local", action="store_true", help="Levantar Redis, SQLite, worker y servidor locales")
+    parser.add_argument("--server-args", type=shlex.split, default=[],
+                        help='Argumentos extra para el servidor local, en un solo texto (ej. --server-args="--mode threaded")')
+    parser.add_argument("--output", help="Archivo JSON del reporte (por defecto loadgen-<fecha>.json)")
+    args = parser.parse_args()
+
+    if args.local:
+        with LocalStack(args.server_args) as stack:
+            report = run_load(args, "127.0.0.1", stack.port)
+    else:
+        report = run_load(args, args.host, args.port)
+
+    output = args.output or f"loadgen-{datetime.now():%Y%m%d-%H%M%S}.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{report['throughput']['predictions_per_s']} predicciones/s, {report['busy']['count']} rechazos por carga, "
+          f"{report['errors']['count']} errores")
+    for name in ("upload", "time_to_prediction", "history"):
+        stats = report[name]
+        if stats["count"]:
+            print(f"{name:20} n={stats['count']:6}  p50 {stats['p50_ms']:9.1f} ms  p95 {stats['p95_ms']:9.1f} ms  "
+                  f"p99 {stats['p99_ms']:9.1f} ms")
+    print(f"Reporte guardado en {output}")
+
+
+if __name__ == "__main__":
+    main()
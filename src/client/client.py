@@ -2,8 +2,15 @@ import random
 import socket
 import json
 import argparse
+import csv
+import gzip
+import hashlib
+import heapq
+import io
 import os
-import redis
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 import select
 # Cargar configuraciones desde .env
@@ -13,17 +20,304 @@ load_dotenv()
 HOST = os.getenv("HOST", "127.0.0.1")
 PORT = int(os.getenv("PORT", 5000))
 BUFFER_SIZE = int(os.getenv("BUFFER_SIZE", 65536))
-REDIS_HOST = os.getenv("REDIS_URL", "127.0.0.1").split("//")[-1].split(":")[0]
-REDIS_PORT = int(os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0").split(":")[-1].split("/")[0])
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
 REDIS_CHANNEL = os.getenv("REDIS_CHANNEL", "resultados")
+# 1: ACK por chunk (servidores antiguos), 2: streaming con un único ACK final y checksum,
+# 3: como v2 con respuestas enmarcadas y varias imágenes en vuelo por conexión
+PROTOCOL_VERSION = int(os.getenv("PROTOCOL_VERSION", 3))
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", 8))  # Imágenes enviadas sin predicción (protocolo v3)
+RESULT_TIMEOUT = int(os.getenv("RESULT_TIMEOUT", 60))
+UPLINK_KBPS = int(os.getenv("UPLINK_KBPS", 1000))  # Enlace de subida estimado para calcular el tiempo ahorrado
+BUSY_MAX_RETRIES = int(os.getenv("BUSY_MAX_RETRIES", 8))  # Reintentos de una imagen rechazada con "busy"
+BUSY_MAX_BACKOFF = float(os.getenv("BUSY_MAX_BACKOFF", 60))  # Tope en segundos de la espera base entre reintentos
+BURST_FRAME_STEP = int(os.getenv("BURST_FRAME_STEP", 5))  # De un video se envía un frame de cada tantos
+BURST_MAX_FRAMES = int(os.getenv("BURST_MAX_FRAMES", 32))  # Frames por ráfaga (el servidor rechaza más)
+EXPORT_TOKEN = os.getenv("EXPORT_TOKEN")  # Token para --export si el servidor lo exige
 
-def send_images(image_paths, host=None, port=None):
-    """Envía imágenes al servidor y maneja la conexión de manera segura."""
+def file_checksum(image_path):
+    """Calcula el SHA-256 de un archivo."""
+    with open(image_path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+def prepare_upload(image_path, max_side, quality, image_format):
+    """Reduce la imagen a `max_side` píxeles de lado y la recomprime en memoria.
+
+    Devuelve (nombre, bytes, transform); se ejecuta en un proceso del pool.
+    """
+    from PIL import Image, ImageOps  # Solo hace falta Pillow al usar --max-side
+
+    with Image.open(image_path) as img:
+        original_dimensions = list(img.size)
+        # En JPEG, draft decodifica directamente a 1/2, 1/4 u 1/8 de la resolución
+        img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((max_side, max_side), Image.LANCZOS, reducing_gap=2.0)
+        buffer = io.BytesIO()
+        img.save(buffer, format=image_format, quality=quality)
+
+    extension = ".webp" if image_format == "WEBP" else ".jpg"
+    name = os.path.splitext(os.path.basename(image_path))[0] + extension
+    transform = {
+        "max_side": max_side,
+        "quality": quality,
+        "format": image_format.lower(),
+        "original_size": os.path.getsize(image_path),
+        "original_dimensions": original_dimensions,
+        "dimensions": list(img.size),
+    }
+    return name, buffer.getvalue(), transform
+
+def prepare_uploads(image_paths, max_side, quality, image_format):
+    """Prepara todas las imágenes en paralelo e informa los bytes y el tiempo ahorrados.
+
+    Las que no se pueden leer (ilegibles o corruptas) se informan y quedan fuera del resultado.
+    """
+    image_paths = [path for path in image_paths if os.path.exists(path)]
+    start = time.perf_counter()
+    uploads = {}
+    with ProcessPoolExecutor() as pool:
+        futures = {path: pool.submit(prepare_upload, path, max_side, quality, image_format) for path in image_paths}
+        for path, future in futures.items():
+            try:
+                uploads[path] = future.result()
+            except OSError as e:  # Incluye PIL.UnidentifiedImageError
+                print(f"No se pudo preparar la imagen {path}: {e}")
+    elapsed = time.perf_counter() - start
+
+    original = sum(transform["original_size"] for _, _, transform in uploads.values())
+    sent = sum(len(data) for _, data, _ in uploads.values())
+    saved_seconds = (original - sent) * 8 / (UPLINK_KBPS * 1000)
+    print(f"Imágenes reducidas: {original} -> {sent} bytes ({original - sent} bytes ahorrados, "
+          f"{100 * (original - sent) / max(original, 1):.1f}%) en {elapsed:.2f} s; "
+          f"subida ~{saved_seconds - elapsed:.1f} s más rápida a {UPLINK_KBPS} kbit/s")
+    return uploads
+
+def recv_exact(client, size):
+    """Lee exactamente `size` bytes del socket."""
+    data = bytearray()
+    while len(data) < size:
+        chunk = client.recv(size - len(data))
+        if not chunk:
+            raise ConnectionResetError("El servidor cerró la conexión.")
+        data.extend(chunk)
+    return bytes(data)
+
+def recv_message(client):
+    """Lee una respuesta enmarcada (4 bytes de longitud + JSON) del protocolo v3."""
+    size = int.from_bytes(recv_exact(client, 4), "big")
+    return json.loads(recv_exact(client, size).decode())
+
+def video_frames(video_path, step=BURST_FRAME_STEP, max_frames=BURST_MAX_FRAMES, quality=85):
+    """Decodifica un video en el cliente y devuelve un frame de cada `step` como JPEG: [(nombre, bytes)].
+
+    GIF, WebP y PNG animados se leen con Pillow; otros formatos (mp4, avi...) necesitan
+    imageio con un backend de video (`pip install "imageio[pyav]"`).
+    """
+    from PIL import Image, ImageSequence  # Solo hace falta Pillow al enviar videos
+
+    def sample(frames):
+        sampled = []
+        for index, frame in enumerate(frames):
+            if index % step:
+                continue
+            buffer = io.BytesIO()
+            frame.convert("RGB").save(buffer, format="JPEG", quality=quality)
+            sampled.append((f"{stem}_{index:05d}.jpg", buffer.getvalue()))
+            if len(sampled) >= max_frames:
+                break
+        return sampled
+
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    try:
+        with Image.open(video_path) as video:
+            return sample(ImageSequence.Iterator(video))
+    except Image.UnidentifiedImageError:
+        import imageio.v3 as iio
+
+        return sample(Image.fromarray(frame) for frame in iio.imiter(video_path))
+
+def busy_delay(response, attempt):
+    """Espera antes de reintentar una subida rechazada con "busy".
+
+    Parte del retry_after del servidor, se duplica en cada intento y suma hasta un 50% al
+    azar para que los clientes rechazados a la vez no vuelvan todos juntos.
+    """
+    base = min(BUSY_MAX_BACKOFF, float(response.get("retry_after", 1)) * 2 ** attempt)
+    return base + random.uniform(0, base / 2)
+
+def send_image(client, image_path, user_id, protocol, request_id=None, bulk=False, upload=None):
+    """Envía la metadata y el contenido de una imagen; devuelve el checksum enviado (v2+).
+
+    `upload` es el resultado de prepare_upload: se envían esos bytes en lugar del archivo.
+    """
+    if upload:
+        filename, data, transform = upload
+        file_size = len(data)
+    else:
+        file_size = os.path.getsize(image_path)
+        filename = os.path.basename(image_path)
+    checksum = None
+
+    metadata = {
+        "action": "send_image",
+        "user_id": user_id,
+        "image_name": filename,
+        "file_size": file_size
+    }
+    if protocol >= 2:
+        checksum = hashlib.sha256(data).hexdigest() if upload else file_checksum(image_path)
+        metadata.update({"protocol": protocol, "checksum": checksum})
+    if request_id is not None:
+        metadata["request_id"] = request_id
+    if bulk:
+        metadata["bulk"] = True  # Importación masiva: el servidor la encola con menor prioridad
+    if upload:
+        metadata["transform"] = transform
+    metadata_bytes = json.dumps(metadata).encode()
+
+    print(f"Enviando metadata ({len(metadata_bytes)} bytes)")
+    client.sendall(len(metadata_bytes).to_bytes(4, "big"))
+    client.sendall(metadata_bytes)
+
+    print(f"Enviando imagen {filename} ({file_size} bytes)...")
+    with io.BytesIO(data) if upload else open(image_path, "rb") as f:
+        if protocol >= 2 and upload:
+            client.sendall(data)
+        elif protocol >= 2:
+            # Envío sin copias al espacio de usuario; el servidor confirma una sola vez al final
+            client.sendfile(f)
+        else:
+            while chunk := f.read(BUFFER_SIZE):
+                client.sendall(chunk)
+                ack = client.recv(3)  # Esperar confirmación del servidor
+                if ack != b"ACK":
+                    raise Exception("No se recibió ACK correctamente.")
+    return checksum
+
+def send_images_sequential(client, image_paths, user_id, protocol, tasks, bulk=False, uploads=None):
+    """Protocolos v1/v2: una imagen por vez, esperando su predicción antes de la siguiente."""
+    for image_path in image_paths:
+        if not os.path.exists(image_path):
+            print(f"La imagen {image_path} no existe.")
+            continue
+
+        filename = os.path.basename(image_path)
+        attempt = 0
+        while True:
+            checksum = send_image(client, image_path, user_id, protocol, bulk=bulk, upload=(uploads or {}).get(image_path))
+
+            response_data = client.recv(BUFFER_SIZE).decode()
+            if not response_data:
+                raise Exception("No se recibió respuesta del servidor.")
+
+            response = json.loads(response_data)
+            if response.get("status") != "busy" or attempt >= BUSY_MAX_RETRIES:
+                break
+            delay = busy_delay(response, attempt)
+            print(f"Servidor ocupado ({response.get('reason')}), se reintenta {filename} en {delay:.1f} s")
+            time.sleep(delay)
+            attempt += 1
+
+        if response.get("status") == "busy":
+            print(f"Servidor ocupado, se descarta {filename}: {response}")
+            continue
+        if protocol >= 2 and response.get("checksum") != checksum:
+            print(f"Checksum no coincide para {filename}: {response}")
+            continue
+
+        if "task_id" in response:
+            print(f"Imagen {filename} enviada correctamente. Task ID: {response['task_id']}")
+            tasks[response["task_id"]] = {"image": filename, "prediction": None}
+        else:
+            print(f"Error en respuesta del servidor: {response}")
+
+        print(f"Esperando predicción del servidor para {filename}...")
+
+        client.settimeout(RESULT_TIMEOUT)
+        ready, _, _ = select.select([client], [], [], RESULT_TIMEOUT)
+        if ready:
+            prediction_data = client.recv(BUFFER_SIZE).decode()
+            if prediction_data:
+                prediction = json.loads(prediction_data)
+                if "final_result" in prediction:
+                    print(f"Predicción recibida para {filename}: {prediction}")
+                else:
+                    print(f"No se pudo analizar {filename}: {prediction.get('message', prediction)}")
+        else:
+            print(f"No se recibió predicción para {filename} a tiempo.")
+
+def send_images_pipelined(client, image_paths, user_id, protocol, tasks, max_in_flight, bulk=False, uploads=None):
+    """Protocolo v3: varias imágenes en vuelo; las predicciones pueden llegar en cualquier orden."""
+    in_flight = {}  # request_id -> (nombre de archivo, checksum, ruta, intento)
+    pending = deque((request_id, image_path, 0) for request_id, image_path in enumerate(image_paths, start=1))
+    retries = []  # Heap de (momento del reintento, request_id, ruta, intento) para las rechazadas con "busy"
+
+    def handle(response):
+        request_id = response.get("request_id")
+        filename, checksum, image_path, attempt = in_flight.get(request_id, ("?", None, None, 0))
+        if "final_result" in response:
+            print(f"Predicción recibida para {filename}: {response}")
+            in_flight.pop(request_id, None)
+            if response.get("task_id") in tasks:
+                tasks[response["task_id"]]["prediction"] = response
+        elif response.get("status") == "success" and response.get("checksum") in (None, checksum):
+            print(f"Imagen {filename} enviada correctamente. Task ID: {response['task_id']}")
+            tasks[response["task_id"]] = {"image": filename, "prediction": None}
+        elif response.get("status") == "busy" and request_id in in_flight:
+            in_flight.pop(request_id)
+            if attempt < BUSY_MAX_RETRIES:
+                delay = busy_delay(response, attempt)
+                print(f"Servidor ocupado ({response.get('reason')}), se reintenta {filename} en {delay:.1f} s")
+                heapq.heappush(retries, (time.monotonic() + delay, request_id, image_path, attempt + 1))
+            else:
+                print(f"Servidor ocupado, se descarta {filename}: {response}")
+        else:
+            print(f"Error en respuesta del servidor para {filename}: {response}")
+            in_flight.pop(request_id, None)
+
+    client.settimeout(RESULT_TIMEOUT)
+    while pending or retries or in_flight:
+        now = time.monotonic()
+        while retries and retries[0][0] <= now:
+            _, request_id, image_path, attempt = heapq.heappop(retries)
+            pending.appendleft((request_id, image_path, attempt))
+
+        if pending and len(in_flight) < max_in_flight:
+            request_id, image_path, attempt = pending.popleft()
+            if not os.path.exists(image_path):
+                print(f"La imagen {image_path} no existe.")
+                continue
+
+            checksum = send_image(client, image_path, user_id, protocol, request_id, bulk, (uploads or {}).get(image_path))
+            in_flight[request_id] = (os.path.basename(image_path), checksum, image_path, attempt)
+
+            # Procesar las respuestas que ya llegaron sin frenar el envío
+            while select.select([client], [], [], 0)[0]:
+                handle(recv_message(client))
+            continue
+
+        # Nada para enviar por ahora: esperar respuestas o el próximo reintento
+        timeout = min(RESULT_TIMEOUT, retries[0][0] - now) if retries else RESULT_TIMEOUT
+        if select.select([client], [], [], max(0, timeout))[0]:
+            handle(recv_message(client))
+        elif not retries:
+            waiting = ", ".join(filename for filename, *_ in in_flight.values())
+            print(f"No se recibió predicción a tiempo para: {waiting}")
+            break
+
+def send_images(image_paths, host=None, port=None, protocol=None, max_in_flight=None, bulk=False,
+                max_side=None, quality=80, image_format="WEBP"):
+    """Envía imágenes al servidor y maneja la conexión de manera segura.
+
+    Con `max_side` las imágenes se reducen y recomprimen en el cliente antes de subirlas.
+    """
     user_id = random.randint(1, 2**31 - 1)
     tasks = {}
 
     host = host or HOST
     port = port or PORT
+    protocol = protocol or PROTOCOL_VERSION
+    max_in_flight = max_in_flight or MAX_IN_FLIGHT
 
     try:
         family, type_, proto, _, sockaddr = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM)[0]
@@ -34,64 +328,19 @@ def send_images(image_paths, host=None, port=None):
     client = socket.socket(family, type_, proto)
     
     try:
+        uploads = None
+        if max_side:
+            uploads = prepare_uploads(image_paths, max_side, quality, image_format)
+            # Las que no se pudieron preparar no se envían; las inexistentes siguen para informarlas al enviar
+            image_paths = [path for path in image_paths if path in uploads or not os.path.exists(path)]
+
         client.connect(sockaddr)
         print(f"Conectado al servidor en {host}:{port}")
 
-        for image_path in image_paths:
-            if not os.path.exists(image_path):
-                print(f"La imagen {image_path} no existe.")
-                continue
-
-            file_size = os.path.getsize(image_path)
-            filename = os.path.basename(image_path)
-
-            metadata = json.dumps({
-                "action": "send_image",
-                "user_id": user_id,
-                "image_name": filename,
-                "file_size": file_size
-            })
-            metadata_bytes = metadata.encode()
-
-            print(f"Enviando metadata ({len(metadata_bytes)} bytes)")
-            client.sendall(len(metadata_bytes).to_bytes(4, "big"))
-            client.sendall(metadata_bytes)
-
-            print(f"Enviando imagen {filename} ({file_size} bytes)...")
-            with open(image_path, "rb") as f:
-                while chunk := f.read(BUFFER_SIZE):
-                    try:
-                        client.sendall(chunk)
-                        ack = client.recv(3)  # Esperar confirmación del servidor
-                        if ack != b"ACK":
-                            raise Exception("No se recibió ACK correctamente.")
-                    except BrokenPipeError:
-                        print("Error: El servidor cerró la conexión antes de terminar el envío.")
-                        return user_id, []
-
-            response_data = client.recv(BUFFER_SIZE).decode()
-            if not response_data:
-                raise Exception("No se recibió respuesta del servidor.")
-
-            response = json.loads(response_data)
-
-            if "task_id" in response:
-                print(f"Imagen {filename} enviada correctamente. Task ID: {response['task_id']}")
-                tasks[response["task_id"]] = {"image": filename, "prediction": None}
-            else:
-                print(f"Error en respuesta del servidor: {response}")
-
-            print(f"Esperando predicción del servidor para {filename}...")
-
-            client.settimeout(60)
-            ready, _, _ = select.select([client], [], [], 60)
-            if ready:
-                prediction_data = client.recv(BUFFER_SIZE).decode()
-                if prediction_data:
-                    prediction = json.loads(prediction_data)
-                    print(f"Predicción recibida para {filename}: {prediction}")
-            else:
-                print(f"No se recibió predicción para {filename} a tiempo.")
+        if protocol >= 3:
+            send_images_pipelined(client, image_paths, user_id, protocol, tasks, max_in_flight, bulk, uploads)
+        else:
+            send_images_sequential(client, image_paths, user_id, protocol, tasks, bulk, uploads)
 
         print("Todas las imágenes fueron enviadas y sus predicciones recibidas.")
 
@@ -108,10 +357,58 @@ def send_images(image_paths, host=None, port=None):
     return user_id, list(tasks.keys())  # lista de task_ids
 
 
+def send_burst(frames, host=None, port=None, bulk=False):
+    """Envía varios frames de una cámara como una ráfaga y espera su única predicción agregada.
+
+    El servidor descarta los frames casi repetidos y solo infiere los distintos.
+    """
+    user_id = random.randint(1, 2**31 - 1)
+    metadata = {
+        "action": "send_burst",
+        "user_id": user_id,
+        "protocol": 3,
+        "frames": [{"image_name": name, "file_size": len(data), "checksum": hashlib.sha256(data).hexdigest()}
+                   for name, data in frames],
+    }
+    if bulk:
+        metadata["bulk"] = True
+    metadata_bytes = json.dumps(metadata).encode()
+
+    try:
+        with socket.create_connection((host or HOST, port or PORT)) as client:
+            client.settimeout(RESULT_TIMEOUT)
+            attempt = 0
+            while True:
+                print(f"Enviando ráfaga de {len(frames)} frames ({sum(len(data) for _, data in frames)} bytes)...")
+                client.sendall(len(metadata_bytes).to_bytes(4, "big") + metadata_bytes)
+                for _, data in frames:
+                    client.sendall(data)
+                response = recv_message(client)
+                if response.get("status") != "busy" or attempt >= BUSY_MAX_RETRIES:
+                    break
+                delay = busy_delay(response, attempt)
+                print(f"Servidor ocupado ({response.get('reason')}), se reintenta la ráfaga en {delay:.1f} s")
+                time.sleep(delay)
+                attempt += 1
+
+            if "final_result" not in response:
+                if response.get("status") != "success":
+                    print(f"Error en respuesta del servidor: {response}")
+                    return user_id
+                print(f"Ráfaga enviada: {response['frames']} frames, {response['distinct_frames']} distintos. "
+                      f"Task ID: {response['task_id']}")
+                response = recv_message(client)
+            print(f"Predicción de la ráfaga: {response}")
+    except Exception as e:
+        print(f"Error al enviar la ráfaga: {e}")
+    return user_id
+
 def wait_for_prediction(user_id, timeout=10):
     """Escucha en Redis hasta recibir la predicción o que pase el timeout."""
     try:
-        r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+        import redis  # Solo se usa aquí; no se carga al enviar imágenes
+
+        r = redis.Redis.from_url(REDIS_URL)
         pubsub = r.pubsub()
         channel = f"resultados:{user_id}"
         pubsub.subscribe(channel)
@@ -125,39 +422,155 @@ def wait_for_prediction(user_id, timeout=10):
     except Exception as e:
         print(f"Error al escuchar en Redis: {e}")
 
-def get_history(user_id):
-    """Consulta el historial de predicciones de un usuario."""
+def get_history(user_id, limit=None, since=None, all_pages=False, host=None, port=None):
+    """Consulta el historial de predicciones de un usuario, página por página."""
+    host = host or HOST
+    port = port or PORT
+    cursor = None
+
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client:
-            client.connect((HOST, PORT))
-            request = json.dumps({"action": "get_history", "user_id": user_id}).encode()
-            client.sendall(len(request).to_bytes(4, "big"))
-            client.sendall(request)
-            response_data = client.recv(BUFFER_SIZE).decode()
-            if response_data:
-                response = json.loads(response_data)
-                print("Historial de predicciones:")
-                for entry in response.get("historial", []):
-                    print(f"Imagen ID: {entry['image_id']}, Resultado: {entry['result']}, Confianza: {entry['confidence']}%")
-            else:
-                print("No se recibió respuesta del servidor.")
+        with socket.create_connection((host, port)) as client:
+            print("Historial de predicciones:")
+            while True:
+                request = {"action": "get_history", "user_id": user_id, "protocol": 3}
+                if limit:
+                    request["limit"] = limit
+                if since:
+                    request["since"] = since
+                if cursor:
+                    request["cursor"] = cursor
+                request = json.dumps(request).encode()
+                client.sendall(len(request).to_bytes(4, "big"))
+                client.sendall(request)
+
+                # La página llega en varios mensajes; el último trae el cursor de la siguiente
+                while True:
+                    response = recv_message(client)
+                    if response.get("status") != "success":
+                        print(f"Error en respuesta del servidor: {response}")
+                        return
+                    for entry in response.get("historial", []):
+                        print(f"Imagen ID: {entry['image_id']}, Resultado: {entry['result']}, Confianza: {entry['confidence']}%, Fecha: {entry['created_at']}")
+                    if response.get("done"):
+                        break
+
+                if response.get("message"):
+                    print(response["message"])
+                cursor = response.get("next_cursor")
+                if not cursor:
+                    break
+                if not all_pages:
+                    print("Hay más resultados; use --all para recorrer todas las páginas.")
+                    break
     except Exception as e:
         print(f"Error al obtener el historial: {e}")
 
+def get_stats(user_id, since=None, until=None, host=None, port=None):
+    """Consulta las tasas de enfermedad por día de un usuario (acción get_stats)."""
+    request = {"action": "get_stats", "user_id": user_id, "protocol": 3}
+    if since:
+        request["since"] = since
+    if until:
+        request["until"] = until
+
+    try:
+        with socket.create_connection((host or HOST, port or PORT)) as client:
+            request = json.dumps(request).encode()
+            client.sendall(len(request).to_bytes(4, "big") + request)
+            response = recv_message(client)
+    except Exception as e:
+        print(f"Error al obtener las estadísticas: {e}")
+        return
+
+    if response.get("status") != "success":
+        print(f"Error en respuesta del servidor: {response}")
+        return
+
+    print(f"Estadísticas del usuario {user_id} ({response['since']} a {response['until']}):")
+    for entry in response["days"] + [{"day": "Total", **response["totals"]}]:
+        if not entry["total"]:
+            print("No hay predicciones registradas.")
+            continue
+        results = ", ".join(f"{result}: {data['count']} ({data['avg_confidence']}%)" for result, data in entry["results"].items())
+        print(f"{entry['day']:10}  {entry['total']:6} predicciones, tasa de enfermedad {entry['disease_rate']:.1%}  [{results}]")
+
+def export_predictions(output, since=None, until=None, label=None, host=None, port=None):
+    """Descarga las predicciones de todos los usuarios a un CSV (gzip si termina en .gz), mensaje por mensaje."""
+    request = {"action": "export_predictions", "protocol": 3}
+    for key, value in (("since", since), ("until", until), ("label", label), ("token", EXPORT_TOKEN)):
+        if value:
+            request[key] = value
+    request = json.dumps(request).encode()
+
+    rows = 0
+    try:
+        with socket.create_connection((host or HOST, port or PORT)) as client, \
+                (gzip.open(output, "wt", newline="") if output.endswith(".gz") else open(output, "w", newline="")) as f:
+            client.sendall(len(request).to_bytes(4, "big") + request)
+            writer = csv.writer(f)
+            header = False
+            while True:
+                response = recv_message(client)
+                if response.get("status") != "success":
+                    print(f"Error en respuesta del servidor: {response}")
+                    return
+                if "columns" in response and not header:
+                    writer.writerow(response["columns"])
+                    header = True
+                writer.writerows(response["rows"])
+                rows += len(response["rows"])
+                if response.get("done"):
+                    break
+    except Exception as e:
+        print(f"Error al exportar las predicciones: {e}")
+        return
+    print(f"{rows} predicciones exportadas a {output}")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Cliente para enviar imágenes o consultar historial de predicciones")
     parser.add_argument("--images", nargs='+', help="Lista de imágenes a enviar")
     parser.add_argument("--historial", type=int, help="Consultar historial de predicciones de un usuario")
+    parser.add_argument("--limit", type=int, default=None, help="Predicciones por página del historial")
+    parser.add_argument("--since", type=str, default=None, help="Historial o estadísticas desde una fecha ISO (ej. 2025-05-01)")
+    parser.add_argument("--until", type=str, default=None, help="Fecha ISO final (inclusive con --stats, exclusiva con --export)")
+    parser.add_argument("--stats", type=int, metavar="USER_ID", help="Tasas de enfermedad por día de un usuario")
+    parser.add_argument("--export", type=str, metavar="ARCHIVO", help="Exportar todas las predicciones a un CSV (.csv o .csv.gz)")
+    parser.add_argument("--label", type=str, default=None, help="Con --export, solo predicciones con este resultado")
+    parser.add_argument("--all", action="store_true", help="Recorrer todas las páginas del historial")
     parser.add_argument("--host", type=str, default=None, help="Dirección del servidor (IPv4 o IPv6)")
     parser.add_argument("--port", type=int, default=None, help="Puerto del servidor")
+    parser.add_argument("--protocol", type=int, choices=[1, 2, 3], default=None, help="Versión del protocolo (1: ACK por chunk, 2: streaming, 3: streaming con varias imágenes en vuelo)")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Máximo de imágenes sin predicción en una conexión (protocolo 3)")
+    parser.add_argument("--bulk", action="store_true", help="Importación masiva: menor prioridad que las consultas interactivas")
+    parser.add_argument("--max-side", type=int, default=None, help="Reducir las imágenes a este lado máximo (px) antes de subirlas")
+    parser.add_argument("--quality", type=int, default=80, help="Calidad de recompresión con --max-side")
+    parser.add_argument("--format", choices=["webp", "jpeg"], default="webp", help="Formato de recompresión con --max-side")
+    parser.add_argument("--burst", action="store_true", help="Enviar las --images como una ráfaga con una sola predicción")
+    parser.add_argument("--video", type=str, default=None, help="Video (o GIF/WebP animado) a enviar como ráfaga de frames")
+    parser.add_argument("--frame-step", type=int, default=BURST_FRAME_STEP, help="Con --video, enviar un frame de cada N")
 
     args = parser.parse_args()
 
     if args.historial:
-        get_history(args.historial)
+        get_history(args.historial, args.limit, args.since, args.all, args.host, args.port)
+    elif args.stats:
+        get_stats(args.stats, args.since, args.until, args.host, args.port)
+    elif args.export:
+        export_predictions(args.export, args.since, args.until, args.label, args.host, args.port)
+    elif args.video or (args.images and args.burst):
+        if args.video:
+            frames = video_frames(args.video, args.frame_step)
+        else:
+            frames = []
+            for image_path in args.images:
+                with open(image_path, "rb") as f:
+                    frames.append((os.path.basename(image_path), f.read()))
+        user_id = send_burst(frames, args.host, args.port, args.bulk)
+        print(f"\nUsuario: {user_id}")
     elif args.images:
-        user_id, task_ids = send_images(args.images, args.host, args.port)
+        user_id, task_ids = send_images(args.images, args.host, args.port, args.protocol, args.max_in_flight, args.bulk,
+                                      args.max_side, args.quality, args.format.upper())
         print(f"\nUsuario: {user_id}")
         print(f"Tareas creadas: {task_ids if task_ids else 'Ninguna'}")
     else:
-        print("Debe especificar --images para enviar imágenes o --historial para ver historial.")
+        print("Debe especificar --images para enviar imágenes, --historial para ver historial o --stats para ver estadísticas.")
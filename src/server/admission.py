@@ -0,0 +1,149 @@
+"""Control de admisión de subidas: límites de cola, concurrencia por usuario y bytes por minuto.
+
+Antes de recibir una imagen el servidor pide permiso con `admit`. Si algún límite está
+alcanzado la subida se rechaza con `{"status": "busy", "retry_after": N, "reason": ...}` y
+el cliente reintenta más tarde. Los contadores por usuario viven en Redis, así valen para
+todos los procesos del servidor; un límite en 0 queda desactivado.
+"""
+import os
+import time
+import logging
+from dotenv import load_dotenv
+import redis
+from tasks.scheduling import queue_depth
+from utils.redis_client import get_redis
+
+# Cargar variables desde .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", 5000))  # Mensajes esperando inferencia en Redis
+MAX_UPLOADS_PER_USER = int(os.getenv("MAX_UPLOADS_PER_USER", 8))  # Subidas simultáneas de un usuario
+MAX_BYTES_PER_MINUTE = int(os.getenv("MAX_BYTES_PER_MINUTE", 500 * 2**20))  # Por usuario
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 50 * 2**20))  # Bytes de una imagen o de un frame de ráfaga
+PREDICTION_QUEUE_MAX = int(os.getenv("PREDICTION_QUEUE_MAX", 10_000))  # Predicciones sin guardar en la BD
+ADMISSION_RETRY_AFTER = float(os.getenv("ADMISSION_RETRY_AFTER", 5))  # Segundos sugeridos si la cola está llena
+QUEUE_DEPTH_CACHE_SECONDS = float(os.getenv("QUEUE_DEPTH_CACHE_SECONDS", 1))
+
+# DECR que nunca baja de cero: si la clave venció con la subida en curso no se recrea en -1
+# (DECR sobre una clave existente conserva su TTL); en cero se borra
+RELEASE_SCRIPT = """
+local uploads = tonumber(redis.call('GET', KEYS[1]) or '0')
+if uploads <= 1 then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+return redis.call('DECR', KEYS[1])
+"""
+
+
+def valid_size(file_size):
+    """True si `file_size` es un tamaño de payload que se puede leer (entero no negativo)."""
+    return isinstance(file_size, int) and not isinstance(file_size, bool) and file_size >= 0
+
+
+def check_upload_size(file_size):
+    """Falla con ValueError antes de reservar memoria para un payload inválido o mayor a MAX_UPLOAD_SIZE."""
+    if not valid_size(file_size):
+        raise ValueError(f"Tamaño de archivo inválido: {file_size!r}")
+    if file_size > MAX_UPLOAD_SIZE:
+        raise ValueError(f"El archivo supera el máximo de {MAX_UPLOAD_SIZE} bytes")
+
+
+class AdmissionController:
+    """Decide si se acepta una subida y lleva la cuenta de las que están en curso.
+
+    `local_backlog` es una función que devuelve cuántas predicciones esperan al writer de
+    este proceso (la cola acotada hacia la BD); si se va llenando también se rechazan subidas.
+    """
+
+    def __init__(self, local_backlog=None, max_queue_depth=MAX_QUEUE_DEPTH, max_uploads_per_user=MAX_UPLOADS_PER_USER,
+                 max_bytes_per_minute=MAX_BYTES_PER_MINUTE, max_local_backlog=PREDICTION_QUEUE_MAX):
+        self.redis = get_redis(decode_responses=True)
+        self.release_script = self.redis.register_script(RELEASE_SCRIPT)
+        self.local_backlog = local_backlog
+        self.max_queue_depth = max_queue_depth
+        self.max_uploads_per_user = max_uploads_per_user
+        self.max_bytes_per_minute = max_bytes_per_minute
+        self.max_local_backlog = max_local_backlog
+        self.depth = 0
+        self.depth_checked = 0.0
+
+    @staticmethod
+    def uploads_key(user_id):
+        return f"admision:subidas:{user_id}"
+
+    @staticmethod
+    def bytes_key(user_id, minute):
+        return f"admision:bytes:{user_id}:{minute}"
+
+    def queue_depth(self):
+        """Profundidad de las colas de inferencia, consultada a Redis como mucho una vez por segundo."""
+        now = time.monotonic()
+        if now - self.depth_checked >= QUEUE_DEPTH_CACHE_SECONDS:
+            self.depth = queue_depth()
+            self.depth_checked = now
+        return self.depth
+
+    def backlog_full(self):
+        if not (self.local_backlog and self.max_local_backlog):
+            return False
+        try:
+            # Se rechaza con margen: los resultados de imágenes ya aceptadas también van a esa cola
+            return self.local_backlog() >= self.max_local_backlog * 0.8
+        except NotImplementedError:  # Queue.qsize no existe en macOS
+            return False
+
+    def admit(self, user_id, file_size):
+        """Reserva un lugar para la subida; devuelve None si se acepta o la respuesta "busy" si no.
+
+        Cada subida aceptada debe liberarse con `release` al terminar.
+        """
+        try:
+            if self.backlog_full():
+                return self.busy("El guardado de predicciones está atrasado", ADMISSION_RETRY_AFTER)
+            if self.max_queue_depth and self.queue_depth() >= self.max_queue_depth:
+                return self.busy("Cola de inferencia llena", ADMISSION_RETRY_AFTER)
+
+            now = time.time()
+            minute = int(now // 60)
+            pipe = self.redis.pipeline()
+            pipe.incr(self.uploads_key(user_id))
+            pipe.expire(self.uploads_key(user_id), 3600)  # Por si un proceso muere sin liberar
+            pipe.incrby(self.bytes_key(user_id, minute), file_size)
+            pipe.expire(self.bytes_key(user_id, minute), 120)
+            uploads, _, sent_bytes, _ = pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Control de admisión sin Redis, se acepta la subida: {e}")
+            return None
+
+        if self.max_uploads_per_user and uploads > self.max_uploads_per_user:
+            self.undo(user_id, minute, file_size)
+            return self.busy("Demasiadas subidas simultáneas", 1)
+        if self.max_bytes_per_minute and sent_bytes > self.max_bytes_per_minute:
+            self.undo(user_id, minute, file_size)
+            return self.busy("Límite de bytes por minuto alcanzado", max(1, 60 - int(now % 60)))
+        return None
+
+    def release(self, user_id):
+        """Libera el lugar de una subida aceptada."""
+        try:
+            self.release_script(keys=[self.uploads_key(user_id)])
+        except redis.RedisError as e:
+            logger.warning(f"No se pudo liberar la subida de {user_id}: {e}")
+
+    def undo(self, user_id, minute, file_size):
+        """Descuenta una subida rechazada: no ocupa lugar ni consume bytes del minuto."""
+        try:
+            pipe = self.redis.pipeline()
+            self.release_script(keys=[self.uploads_key(user_id)], client=pipe)
+            pipe.decrby(self.bytes_key(user_id, minute), file_size)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"No se pudo descontar la subida rechazada de {user_id}: {e}")
+
+    @staticmethod
+    def busy(reason, retry_after):
+        logger.warning(f"Subida rechazada: {reason}")
+        return {"status": "busy", "retry_after": retry_after, "reason": reason}
@@ -0,0 +1,72 @@
+"""Ráfagas de frames (acción `send_burst`): deduplicación por hash perceptual.
+
+Una cámara fija manda varios frames casi iguales; antes de inferir se calcula el dHash de
+cada uno (miniatura en escala de grises con Pillow, comparación de píxeles vecinos en NumPy)
+y se descarta todo frame a BURST_DEDUP_DISTANCE bits o menos de uno ya elegido. Los frames
+distintos van a una sola tarea que devuelve una predicción agregada para la ráfaga.
+"""
+import io
+import os
+from dotenv import load_dotenv
+import numpy as np
+from PIL import Image
+from server.admission import MAX_UPLOAD_SIZE, valid_size
+
+# Cargar variables desde .env
+load_dotenv()
+
+BURST_MAX_FRAMES = int(os.getenv("BURST_MAX_FRAMES", 32))
+BURST_HASH_SIZE = int(os.getenv("BURST_HASH_SIZE", 8))  # dHash de 8x8 = 64 bits
+BURST_DEDUP_DISTANCE = int(os.getenv("BURST_DEDUP_DISTANCE", 6))  # Bits distintos para considerar iguales dos frames
+
+
+def validate_burst(metadata):
+    """Devuelve un mensaje de error si la solicitud send_burst no es válida, o None."""
+    frames = metadata.get("frames")
+    if int(metadata.get("protocol", 1)) < 3:
+        return "send_burst requiere el protocolo 3"
+    if not frames:
+        return "La ráfaga no tiene frames"
+    if not isinstance(frames, list):
+        return "frames debe ser una lista"
+    for index, frame in enumerate(frames, 1):
+        if not isinstance(frame, dict) or not isinstance(frame.get("image_name"), str) or not frame["image_name"]:
+            return f"El frame {index} no tiene image_name"
+        if not valid_size(frame.get("file_size")):
+            return f"El frame {index} no tiene un file_size válido"
+        if frame["file_size"] > MAX_UPLOAD_SIZE:
+            return f"El frame {index} supera el máximo de {MAX_UPLOAD_SIZE} bytes"
+    if len(frames) > BURST_MAX_FRAMES:
+        return f"La ráfaga supera el máximo de {BURST_MAX_FRAMES} frames"
+    return None
+
+
+def burst_size(metadata):
+    """Bytes de todos los frames, o None si algún tamaño no es válido y no se sabe dónde termina el payload."""
+    frames = metadata.get("frames") or []
+    if not isinstance(frames, list) or not all(isinstance(frame, dict) and valid_size(frame.get("file_size")) for frame in frames):
+        return None
+    return sum(frame["file_size"] for frame in frames)
+
+
+def thumbnail(payload, size=BURST_HASH_SIZE):
+    """Frame decodificado directamente a una miniatura en grises de (size, size + 1)."""
+    with Image.open(io.BytesIO(payload)) as img:
+        img.draft("L", (size * 4, size * 4))
+        return np.asarray(img.convert("L").resize((size + 1, size), Image.Resampling.BILINEAR, reducing_gap=2.0))
+
+
+def dhash(payloads, size=BURST_HASH_SIZE):
+    """dHash de todos los frames: una fila de size * size bits por frame (cada bit: ¿el píxel de la derecha es más claro?)."""
+    thumbnails = np.stack([thumbnail(payload, size) for payload in payloads]).astype(np.int16)
+    return (thumbnails[:, :, 1:] > thumbnails[:, :, :-1]).reshape(len(payloads), -1)
+
+
+def distinct_frames(hashes, max_distance=BURST_DEDUP_DISTANCE):
+    """Índices de los frames a inferir, en orden: cada uno a más de `max_distance` bits de todos los anteriores elegidos."""
+    distances = (hashes[:, np.newaxis, :] != hashes[np.newaxis, :, :]).sum(axis=2)
+    keep = []
+    for index in range(len(hashes)):
+        if not keep or distances[index, keep].min() > max_distance:
+            keep.append(index)
+    return keep
@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+import time
+import logging
+from dotenv import load_dotenv
+import redis
+from utils.redis_client import get_redis
+
+# Cargar variables desde .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+REDIS_CHANNEL = os.getenv("REDIS_CHANNEL", "resultados")
+RESULT_TIMEOUT = int(os.getenv("RESULT_TIMEOUT", 300))  # Segundos que se espera una predicción
+
+
+class ResultDispatcher:
+    """Una única suscripción a Redis por proceso que reparte cada resultado a quien lo espera.
+
+    Los resultados se enrutan por `task_id`, así que dos imágenes pendientes del mismo
+    usuario nunca reciben la predicción de la otra y la cantidad de conexiones a Redis
+    no depende de cuántas predicciones haya pendientes.
+    """
+
+    def __init__(self, pattern=f"{REDIS_CHANNEL}:*", timeout=RESULT_TIMEOUT):
+        self.redis = get_redis(decode_responses=True)
+        self.pattern = pattern
+        self.timeout = timeout
+        self.waiters = {}  # task_id -> (callback, vencimiento)
+        self.lock = threading.Lock()
+        self.running = threading.Event()
+        self.subscribed = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Inicia el hilo despachador (una vez por proceso) y espera la suscripción."""
+        if self.thread is None:
+            self.running.set()
+            self.thread = threading.Thread(target=self.run, name="result-dispatcher", daemon=True)
+            self.thread.start()
+            if not self.subscribed.wait(timeout=10):
+                logger.warning("El despachador de resultados todavía no está suscrito a Redis.")
+        return self
+
+    def stop(self):
+        self.running.clear()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def register(self, task_id, callback):
+        """Registra quién espera el resultado de `task_id`; registrar antes de encolar la tarea."""
+        with self.lock:
+            self.waiters[task_id] = (callback, time.monotonic() + self.timeout)
+
+    def unregister(self, task_id):
+        with self.lock:
+            self.waiters.pop(task_id, None)
+
+    def pending(self):
+        with self.lock:
+            return len(self.waiters)
+
+    def dispatch(self, result_data):
+        task_id = result_data.get("task_id")
+        with self.lock:
+            waiter = self.waiters.pop(task_id, None)
+        if waiter is None:
+            logger.debug(f"Resultado sin destinatario en este proceso: {task_id}")
+            return
+
+        callback, _ = waiter
+        try:
+            callback(result_data)
+        except Exception as e:
+            logger.error(f"Error entregando el resultado de {task_id}: {e}")
+
+    def expire(self):
+        """Descarta las esperas vencidas para que el diccionario no crezca sin límite."""
+        now = time.monotonic()
+        with self.lock:
+            expired = [task_id for task_id, (_, deadline) in self.waiters.items() if deadline < now]
+            for task_id in expired:
+                del self.waiters[task_id]
+        for task_id in expired:
+            logger.warning(f"Sin resultado para la tarea {task_id} tras {self.timeout}s.")
+
+    def run(self):
+        while self.running.is_set():
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(self.pattern)
+                self.subscribed.set()
+                logger.info(f"Despachador de resultados suscrito a {self.pattern}")
+
+                while self.running.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "pmessage":
+                        self.dispatch(json.loads(message["data"]))
+                    self.expire()
+
+            except redis.ConnectionError as e:
+                self.subscribed.clear()
+                logger.error(f"Despachador de resultados sin conexión a Redis: {e}. Reintentando...")
+                time.sleep(1)
+            except Exception as e:
+                logger.error(f"Error en el despachador de resultados: {e}")
+            finally:
+                pubsub.close()
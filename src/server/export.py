@@ -0,0 +1,161 @@
+"""Exportación masiva de predicciones (con la ruta y fecha de subida de su imagen) para reentrenar.
+
+Las filas se leen con un cursor del lado del servidor (`stream_results` + `yield_per`) y se
+escriben por bloques de EXPORT_CHUNK_SIZE, así la memoria no depende de cuántas filas haya:
+
+    cd src && python3 -m server.export --output predicciones.csv.gz --since 2025-01-01 --label Enfermo
+    cd src && python3 -m server.export --output predicciones.parquet --format parquet
+
+CSV comprimido con gzip o Parquet (requiere `pip install pyarrow`). La misma consulta se
+ofrece por protocolo con la acción `export_predictions`.
+"""
+import csv
+import gzip
+import hmac
+import os
+import time
+import argparse
+import logging
+from datetime import datetime
+from dotenv import load_dotenv
+from sqlalchemy import select
+from utils.database import session_scope
+from server.models import Image, Prediction
+
+# Cargar variables desde .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 10_000))  # Filas por bloque leído y escrito
+EXPORT_MESSAGE_ROWS = int(os.getenv("EXPORT_MESSAGE_ROWS", 1000))  # Filas por mensaje de la acción export_predictions
+EXPORT_TOKEN = os.getenv("EXPORT_TOKEN")  # La acción export_predictions lo exige; sin definir queda deshabilitada
+
+COLUMNS = ("prediction_id", "image_id", "user_id", "image_path", "uploaded_at", "result", "confidence", "created_at")
+
+
+def export_query(since=None, until=None, label=None, user_id=None):
+    """Predicciones con los datos de su imagen, en orden de id; `since`/`until` filtran por fecha de la predicción."""
+    query = (
+        select(Prediction.id, Prediction.image_id, Image.user_id, Image.image_path, Image.uploaded_at,
+               Prediction.result, Prediction.confidence, Prediction.created_at)
+        .join(Image, Prediction.image_id == Image.id)
+        .order_by(Prediction.id)
+    )
+    if since is not None:
+        query = query.where(Prediction.created_at >= since)
+    if until is not None:
+        query = query.where(Prediction.created_at < until)
+    if label is not None:
+        query = query.where(Prediction.result == label)
+    if user_id is not None:
+        query = query.where(Image.user_id == user_id)
+    return query
+
+
+def parse_filters(metadata):
+    """Filtros de una solicitud (fechas ISO; `until` es exclusivo)."""
+    since = datetime.fromisoformat(metadata["since"]) if metadata.get("since") else None
+    until = datetime.fromisoformat(metadata["until"]) if metadata.get("until") else None
+    user_id = int(metadata["user_id"]) if metadata.get("user_id") is not None else None
+    return {"since": since, "until": until, "label": metadata.get("label"), "user_id": user_id}
+
+
+def stream_chunks(filters, chunk_size=EXPORT_CHUNK_SIZE):
+    """Genera bloques de hasta `chunk_size` filas (tuplas en el orden de COLUMNS) desde un cursor del servidor."""
+    with session_scope() as db:
+        result = db.execute(export_query(**filters).execution_options(stream_results=True, yield_per=chunk_size))
+        for partition in result.partitions():
+            yield [tuple(row) for row in partition]
+
+
+def write_csv(chunks, output):
+    """CSV (gzip si la ruta termina en .gz) escrito bloque por bloque; devuelve las filas escritas."""
+    rows = 0
+    with (gzip.open(output, "wt", newline="", compresslevel=6) if output.endswith(".gz") else open(output, "w", newline="")) as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for chunk in chunks:
+            writer.writerows(chunk)
+            rows += len(chunk)
+    return rows
+
+
+def write_parquet(chunks, output):
+    """Parquet con un row group por bloque; devuelve las filas escritas."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('Para exportar a Parquet hace falta pyarrow: pip install pyarrow')
+
+    schema = pa.schema([
+        ("prediction_id", pa.int64()), ("image_id", pa.int64()), ("user_id", pa.int64()), ("image_path", pa.string()),
+        ("uploaded_at", pa.timestamp("us")), ("result", pa.string()), ("confidence", pa.int32()), ("created_at", pa.timestamp("us")),
+    ])
+    confidence = COLUMNS.index("confidence")
+    rows = 0
+    with pq.ParquetWriter(output, schema, compression="zstd") as writer:
+        for chunk in chunks:
+            columns = list(zip(*chunk))
+            # Filas guardadas antes de redondear la confianza pueden traerla como float
+            columns[confidence] = [None if value is None else round(value) for value in columns[confidence]]
+            writer.write_table(pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                                                    schema=schema))
+            rows += len(chunk)
+    return rows
+
+
+def export_predictions(output, output_format="csv", chunk_size=EXPORT_CHUNK_SIZE, **filters):
+    """Exporta las predicciones filtradas a `output`; devuelve (filas, segundos)."""
+    start = time.perf_counter()
+    chunks = stream_chunks(filters, chunk_size)
+    rows = write_parquet(chunks, output) if output_format == "parquet" else write_csv(chunks, output)
+    elapsed = time.perf_counter() - start
+    logger.info(f"{rows} predicciones exportadas a {output} en {elapsed:.1f} s ({rows / max(elapsed, 1e-9):,.0f} filas/s)")
+    return rows, elapsed
+
+
+def export_messages(metadata):
+    """Mensajes de la acción export_predictions: filas en bloques de EXPORT_MESSAGE_ROWS y un último con `done`."""
+    if not EXPORT_TOKEN:
+        yield {"status": "error", "message": "Exportación deshabilitada en el servidor (falta EXPORT_TOKEN)", "done": True}
+        return
+    if not hmac.compare_digest(str(metadata.get("token") or ""), EXPORT_TOKEN):
+        yield {"status": "error", "message": "Token de exportación inválido", "done": True}
+        return
+    try:
+        filters = parse_filters(metadata)
+    except (ValueError, TypeError) as e:
+        yield {"status": "error", "message": f"Filtros de exportación inválidos: {e}", "done": True}
+        return
+
+    rows = 0
+    first = True
+    for chunk in stream_chunks(filters, EXPORT_MESSAGE_ROWS):
+        message = {"status": "success", "rows": [
+            [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in chunk
+        ], "done": False}
+        if first:
+            message["columns"] = COLUMNS
+            first = False
+        rows += len(chunk)
+        yield message
+    yield {"status": "success", "rows": [], "columns": COLUMNS, "done": True, "count": rows}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Exportación masiva de predicciones")
+    parser.add_argument("--output", required=True, help="Archivo de salida (.csv, .csv.gz o .parquet)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default=None, help="Por defecto según la extensión")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="Desde esta fecha ISO (inclusive)")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="Hasta esta fecha ISO (exclusive)")
+    parser.add_argument("--label", default=None, help="Solo predicciones con este resultado")
+    parser.add_argument("--user", type=int, default=None, help="Solo predicciones de este usuario")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    output_format = args.format or ("parquet" if args.output.endswith(".parquet") else "csv")
+    export_predictions(args.output, output_format, args.chunk_size, since=args.since, until=args.until,
+                       label=args.label, user_id=args.user)
@@ -0,0 +1,142 @@
+import json
+import os
+import logging
+from datetime import datetime
+from dotenv import load_dotenv
+import redis
+from utils.redis_client import get_redis
+from sqlalchemy import tuple_
+from server.models import Image, Prediction
+
+# Cargar variables desde .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 100))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", 1000))
+HISTORY_CHUNK_SIZE = int(os.getenv("HISTORY_CHUNK_SIZE", 50))  # Filas por mensaje enviado al cliente
+HISTORY_CACHE_TTL = int(os.getenv("HISTORY_CACHE_TTL", 60))  # Segundos
+
+
+class HistoryCache:
+    """Caché read-through de páginas de historial en Redis.
+
+    Cada usuario tiene un número de versión que forma parte de la clave; el writer de
+    predicciones lo incrementa al guardar filas nuevas, lo que invalida todas sus páginas
+    de una vez sin tener que buscarlas.
+    """
+
+    def __init__(self, ttl=HISTORY_CACHE_TTL):
+        self.redis = get_redis(decode_responses=True)
+        self.ttl = ttl
+
+    @staticmethod
+    def version_key(user_id):
+        return f"historial:version:{user_id}"
+
+    def get_or_load(self, user_id, page_args, loader):
+        try:
+            version = self.redis.get(self.version_key(user_id)) or 0
+            key = f"historial:{user_id}:v{version}:{json.dumps(page_args, sort_keys=True)}"
+            cached = self.redis.get(key)
+            if cached is not None:
+                return json.loads(cached)
+        except redis.RedisError as e:
+            logger.warning(f"Caché de historial no disponible: {e}")
+            return loader()
+
+        page = loader()
+        try:
+            self.redis.set(key, json.dumps(page), ex=self.ttl)
+        except redis.RedisError as e:
+            logger.warning(f"No se pudo guardar la página de historial en caché: {e}")
+        return page
+
+    def invalidate(self, user_ids):
+        """Invalida las páginas de los usuarios indicados (se llama tras cada commit del writer)."""
+        if not user_ids:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.incr(self.version_key(user_id))
+                pipe.expire(self.version_key(user_id), self.ttl * 10)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"No se pudo invalidar la caché de historial: {e}")
+
+
+history_cache = HistoryCache()
+
+
+def parse_history_request(metadata):
+    """Extrae y valida los parámetros de paginación de una solicitud get_history."""
+    limit = min(int(metadata.get("limit") or HISTORY_PAGE_SIZE), HISTORY_MAX_PAGE_SIZE)
+    cursor = metadata.get("cursor")
+    if cursor is not None:
+        created_at, prediction_id = cursor
+        cursor = (datetime.fromisoformat(created_at), int(prediction_id))
+    since = metadata.get("since")
+    if since is not None:
+        since = datetime.fromisoformat(since)
+    return limit, cursor, since
+
+
+def fetch_history_page(db, user_id, limit, cursor=None, since=None):
+    """Página de historial con paginación keyset sobre (created_at, id)."""
+    query = (
+        db.query(Prediction.id, Prediction.image_id, Prediction.result, Prediction.confidence, Prediction.created_at)
+        .join(Image, Prediction.image_id == Image.id)
+        .filter(Image.user_id == user_id)
+    )
+    if since is not None:
+        query = query.filter(Prediction.created_at >= since)
+    if cursor is not None:
+        query = query.filter(tuple_(Prediction.created_at, Prediction.id) > tuple_(*cursor))
+
+    rows = query.order_by(Prediction.created_at, Prediction.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    history = [
+        {
+            "id": row.id,
+            "image_id": row.image_id,
+            "result": row.result,
+            "confidence": row.confidence,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+        }
+        for row in rows
+    ]
+    next_cursor = [history[-1]["created_at"], history[-1]["id"]] if has_more else None
+    return {"historial": history, "next_cursor": next_cursor}
+
+
+def get_history_page(db, metadata):
+    """Devuelve una página de historial pasando por la caché."""
+    user_id = int(metadata["user_id"])
+    limit, cursor, since = parse_history_request(metadata)
+    page_args = {"limit": limit, "cursor": metadata.get("cursor"), "since": metadata.get("since")}
+    return history_cache.get_or_load(user_id, page_args, lambda: fetch_history_page(db, user_id, limit, cursor, since))
+
+
+def history_messages(page, chunk_size=HISTORY_CHUNK_SIZE):
+    """Divide una página en mensajes para enviarla al cliente a medida que se serializa."""
+    rows = page["historial"]
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)] or [[]]
+    for index, chunk in enumerate(chunks):
+        message = {"status": "success", "historial": chunk, "done": index == len(chunks) - 1}
+        if message["done"]:
+            message["next_cursor"] = page["next_cursor"]
+            if not rows:
+                message["message"] = "No hay predicciones registradas."
+        yield message
+
+
+def history_response(page):
+    """Respuesta en un solo mensaje para clientes sin protocolo v3."""
+    response = {"status": "success", **page}
+    if not page["historial"]:
+        response["message"] = "No hay predicciones registradas."
+    return response
@@ -0,0 +1,46 @@
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+from server.models import Image, User
+
+DIALECT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def ingest_image(db, user_id, image_path):
+    """Registra el usuario (si no existe) y la imagen en una sola transacción; devuelve el id de la imagen.
+
+    En PostgreSQL es una única sentencia (CTE con INSERT ... ON CONFLICT + INSERT ... RETURNING),
+    es decir, un round trip más el commit; en SQLite son dos sentencias en la misma transacción.
+    Con otros motores se usa el ORM (buscar el usuario y crearlo si falta).
+    """
+    dialect = db.bind.dialect.name
+    dialect_insert = DIALECT_INSERTS.get(dialect)
+    if dialect_insert is None:
+        return ingest_image_orm(db, user_id, image_path)
+
+    new_user = (
+        dialect_insert(User)
+        .values(id=user_id, username=f"usuario_{user_id}")
+        .on_conflict_do_nothing(index_elements=[User.id])
+    )
+    new_image = insert(Image).values(user_id=user_id, image_path=image_path).returning(Image.id)
+
+    if dialect == "postgresql":
+        return db.execute(new_image.add_cte(new_user.cte("new_user"))).scalar_one()
+
+    db.execute(new_user)
+    return db.execute(new_image).scalar_one()
+
+
+def ingest_image_orm(db, user_id, image_path):
+    """Misma ingesta con el ORM, para motores sin INSERT ... ON CONFLICT en SQLAlchemy."""
+    if db.get(User, user_id) is None:
+        try:
+            with db.begin_nested():
+                db.add(User(id=user_id, username=f"usuario_{user_id}"))
+        except IntegrityError:
+            pass  # Otra conexión creó el mismo usuario al mismo tiempo
+    image = Image(user_id=user_id, image_path=image_path)
+    db.add(image)
+    db.flush()
+    return image.id
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, func
+from sqlalchemy import BigInteger, Column, Date, Integer, String, ForeignKey, DateTime, Index, func
 from sqlalchemy.orm import relationship
 from utils.database import Base 
 
@@ -11,17 +11,28 @@ class User(Base):
 class Image(Base):
     __tablename__ = "images"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    image_path = Column(String(255), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    image_path = Column(String(255), nullable=False, index=True)  # server.storage actualiza las filas por ruta
     uploaded_at = Column(DateTime, default=func.now())
     user = relationship("User", back_populates="images")
     predictions = relationship("Prediction", back_populates="image")
 
 class Prediction(Base):
     __tablename__ = "predictions"
+    # Paginación keyset del historial sobre (created_at, id)
+    __table_args__ = (Index("ix_predictions_created_at_id", "created_at", "id"),)
     id = Column(Integer, primary_key=True, index=True)
-    image_id = Column(Integer, ForeignKey("images.id"), nullable=False)
+    image_id = Column(Integer, ForeignKey("images.id"), nullable=False, index=True)
     result = Column(String(100), nullable=False)
     confidence = Column(Integer, nullable=False)
     created_at = Column(DateTime, default=func.now())
     image = relationship("Image", back_populates="predictions")
+
+class PredictionRollup(Base):
+    __tablename__ = "prediction_rollups"
+    # Conteos por (usuario, día, resultado); el writer los suma en la misma transacción que las predicciones
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    result = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(BigInteger, nullable=False, default=0)
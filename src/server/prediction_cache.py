@@ -0,0 +1,87 @@
+import json
+import os
+import time
+import logging
+from dotenv import load_dotenv
+import redis
+from utils.redis_client import get_redis
+
+# Cargar variables desde .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_CACHE_TTL = int(os.getenv("PREDICTION_CACHE_TTL", 7 * 24 * 3600))  # Segundos
+PREDICTION_CACHE_MAX = int(os.getenv("PREDICTION_CACHE_MAX", 100_000))  # Entradas antes de desalojar
+CACHED_FIELDS = ("final_result", "confidence", "details")
+
+
+class PredictionCache:
+    """Caché de predicciones por SHA-256 del contenido de la imagen.
+
+    Cada acierto renueva el TTL de la entrada y su posición en un sorted set de último
+    acceso; al pasar de PREDICTION_CACHE_MAX entradas se desalojan las menos usadas.
+    """
+
+    LRU_KEY = "prediccion:lru"
+    HITS_KEY = "prediccion:stats:hits"
+    MISSES_KEY = "prediccion:stats:misses"
+
+    def __init__(self, ttl=PREDICTION_CACHE_TTL, max_entries=PREDICTION_CACHE_MAX):
+        self.redis = get_redis(decode_responses=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    @staticmethod
+    def key(digest):
+        return f"prediccion:{digest}"
+
+    def get(self, digest):
+        """Devuelve la predicción guardada para ese contenido o None."""
+        try:
+            cached = self.redis.get(self.key(digest))
+            pipe = self.redis.pipeline(transaction=False)
+            if cached is None:
+                pipe.incr(self.MISSES_KEY)
+            else:
+                pipe.incr(self.HITS_KEY)
+                pipe.expire(self.key(digest), self.ttl)
+                pipe.zadd(self.LRU_KEY, {digest: time.time()})
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Caché de predicciones no disponible: {e}")
+            return None
+        return json.loads(cached) if cached is not None else None
+
+    def put(self, digest, result_data):
+        """Guarda la predicción de un contenido y desaloja las entradas más antiguas si hace falta."""
+        entry = {field: result_data[field] for field in CACHED_FIELDS if field in result_data}
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.set(self.key(digest), json.dumps(entry), ex=self.ttl)
+            pipe.zadd(self.LRU_KEY, {digest: time.time()})
+            pipe.zcard(self.LRU_KEY)
+            size = pipe.execute()[-1]
+            if size > self.max_entries:
+                self.evict(size - self.max_entries)
+        except redis.RedisError as e:
+            logger.warning(f"No se pudo guardar la predicción en caché: {e}")
+
+    def evict(self, count):
+        oldest = self.redis.zrange(self.LRU_KEY, 0, count - 1)
+        if oldest:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.delete(*(self.key(digest) for digest in oldest))
+            pipe.zrem(self.LRU_KEY, *oldest)
+            pipe.execute()
+            logger.info(f"Desalojadas {len(oldest)} predicciones de la caché")
+
+    def stats(self):
+        """Contadores de aciertos y fallos compartidos por todos los procesos del servidor."""
+        hits, misses = self.redis.mget(self.HITS_KEY, self.MISSES_KEY)
+        hits, misses = int(hits or 0), int(misses or 0)
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "hit_ratio": round(hits / total, 4) if total else 0.0}
+
+
+prediction_cache = PredictionCache()
@@ -0,0 +1,142 @@
+import csv
+import io
+import os
+import time
+import logging
+from datetime import datetime
+from queue import Empty
+from dotenv import load_dotenv
+from sqlalchemy import insert, select
+from utils.database import SessionLocal
+from server.models import Image, Prediction
+from server.rollups import rollup_deltas, upsert_rollups
+
+# Cargar variables desde .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_BATCH_SIZE = int(os.getenv("PREDICTION_BATCH_SIZE", 200))
+PREDICTION_FLUSH_INTERVAL = float(os.getenv("PREDICTION_FLUSH_INTERVAL", 0.5))  # Segundos
+
+
+class PredictionBatchWriter:
+    """Agrupa las predicciones de la cola y las guarda en lotes (por tamaño o por tiempo)."""
+
+    def __init__(self, batch_size=PREDICTION_BATCH_SIZE, flush_interval=PREDICTION_FLUSH_INTERVAL,
+                 session_factory=SessionLocal, on_commit=None, on_flush=None):
+        self.batch_size = batch_size
+        self.on_commit = on_commit  # Recibe los user_id afectados tras cada commit
+        self.on_flush = on_flush  # Recibe la duración en ms de cada lote guardado
+        self.flush_interval = flush_interval
+        self.session_factory = session_factory
+        self.stats = {"batches": 0, "rows": 0, "dropped": 0, "last_batch_size": 0, "last_flush_ms": 0.0, "max_flush_ms": 0.0}
+
+    def run(self, queue, alive=None):
+        """Drena la cola hasta recibir el centinela None; al cerrar guarda el lote pendiente.
+
+        Si se pasa `alive`, sin lote pendiente se consulta cada segundo y el writer termina
+        cuando devuelve False (por ejemplo, si murió el proceso que lo lanzó).
+        """
+        batch = []
+        deadline = None
+
+        while True:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            if timeout is None and alive is not None:
+                timeout = 1.0
+            try:
+                task = queue.get(timeout=timeout)
+            except Empty:
+                self.flush(batch)
+                batch = []
+                if alive is not None and not alive():
+                    logger.warning("El proceso principal terminó sin avisar; se cierra el writer")
+                    break
+                continue
+
+            if task is None:
+                logger.info("Cerrando proceso de predicciones...")
+                self.flush(batch)
+                break
+
+            batch.append(task)
+            if len(batch) == 1:
+                deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+
+    def flush(self, batch):
+        """Guarda un lote en una sola transacción, validando la clave foránea en bloque.
+
+        En la misma transacción suma el lote a los agregados por usuario, día y resultado.
+        """
+        if not batch:
+            return
+
+        start = time.perf_counter()
+        db = self.session_factory()
+        try:
+            image_ids = {image_id for image_id, _, _ in batch}
+            owners = dict(db.execute(select(Image.id, Image.user_id).where(Image.id.in_(image_ids))).all())
+            existing = set(owners)
+            missing = image_ids - existing
+            if missing:
+                logger.error(f"Imágenes no encontradas, se descartan sus predicciones: {sorted(missing)}")
+
+            created_at = datetime.now()
+            # `predictions.confidence` es entera: "66.67" haría fallar el COPY de PostgreSQL
+            rows = [
+                {"image_id": image_id, "result": result, "confidence": round(confidence), "created_at": created_at}
+                for image_id, result, confidence in batch
+                if image_id in existing
+            ]
+            if rows:
+                self.insert_rows(db, rows)
+                upsert_rollups(db, rollup_deltas(rows, owners, created_at.date()))
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error al guardar lote de {len(batch)} predicciones: {e}")
+            return
+        finally:
+            db.close()
+
+        if rows and self.on_commit:
+            self.on_commit({owners[row["image_id"]] for row in rows})
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.stats["batches"] += 1
+        self.stats["rows"] += len(rows)
+        self.stats["dropped"] += len(batch) - len(rows)
+        self.stats["last_batch_size"] = len(rows)
+        self.stats["last_flush_ms"] = elapsed_ms
+        self.stats["max_flush_ms"] = max(self.stats["max_flush_ms"], elapsed_ms)
+        logger.info(f"Lote de {len(rows)} predicciones guardado en {elapsed_ms:.1f} ms "
+                    f"(lotes: {self.stats['batches']}, filas: {self.stats['rows']})")
+        if self.on_flush:
+            self.on_flush(elapsed_ms)
+
+    @staticmethod
+    def copy_buffer(rows):
+        """CSV para `COPY predictions (image_id, result, confidence, created_at)`."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow((row["image_id"], row["result"], int(row["confidence"]), row["created_at"].isoformat(sep=" ")))
+        buffer.seek(0)
+        return buffer
+
+    @staticmethod
+    def insert_rows(db, rows):
+        """INSERT multi-fila; en PostgreSQL con psycopg2 usa COPY."""
+        if db.bind.dialect.name == "postgresql":
+            cursor = db.connection().connection.cursor()
+            if hasattr(cursor, "copy_expert"):
+                cursor.copy_expert(
+                    "COPY predictions (image_id, result, confidence, created_at) FROM STDIN WITH (FORMAT csv)",
+                    PredictionBatchWriter.copy_buffer(rows),
+                )
+                return
+        db.execute(insert(Prediction), rows)
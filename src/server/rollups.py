@@ -0,0 +1,155 @@
+"""Agregados de predicciones por usuario, día y resultado (tabla `prediction_rollups`).
+
+El writer de predicciones suma cada lote a la tabla en la misma transacción del INSERT,
+así los tableros leen una fila por (día, resultado) en lugar de recorrer `predictions`.
+Para recalcular los agregados a partir de las predicciones ya guardadas:
+
+    cd src && python3 -m server.rollups --backfill [--user <user_id>]
+
+Conviene correrlo con el servidor detenido: las predicciones que el writer guarde mientras
+tanto podrían contarse dos veces.
+"""
+import os
+import argparse
+import logging
+from datetime import date, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from utils.database import Base, get_engine, session_scope
+from server.models import Image, Prediction, PredictionRollup
+
+# Cargar variables desde .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HEALTHY_LABEL = os.getenv("HEALTHY_LABEL", "Sano")  # Resultado que no cuenta para la tasa de enfermedad
+STATS_DEFAULT_DAYS = int(os.getenv("STATS_DEFAULT_DAYS", 30))
+STATS_MAX_DAYS = int(os.getenv("STATS_MAX_DAYS", 366))
+
+
+def rollup_deltas(rows, owners, day):
+    """Suma las filas de un lote por (usuario, día, resultado): {clave: (cantidad, suma de confianza)}."""
+    deltas = {}
+    for row in rows:
+        key = (owners[row["image_id"]], day, row["result"])
+        count, confidence_sum = deltas.get(key, (0, 0))
+        # Redondeada como queda en la columna entera `predictions.confidence`
+        deltas[key] = (count + 1, confidence_sum + round(row["confidence"]))
+    return deltas
+
+
+def upsert_rollups(db, deltas):
+    """Suma los deltas a la tabla de agregados dentro de la transacción de `db`.
+
+    En PostgreSQL y SQLite es un único INSERT ... ON CONFLICT DO UPDATE; en otros motores,
+    UPDATE y si no había fila INSERT. Las claves se ordenan para que dos writers no se bloqueen.
+    """
+    if not deltas:
+        return
+    values = [
+        {"user_id": user_id, "day": day, "result": result, "count": count, "confidence_sum": confidence_sum}
+        for (user_id, day, result), (count, confidence_sum) in sorted(deltas.items())
+    ]
+    table = PredictionRollup.__table__
+    dialect = db.bind.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        statement = (postgresql if dialect == "postgresql" else sqlite).insert(table).values(values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.day, table.c.result],
+            set_={"count": table.c.count + statement.excluded.count,
+                  "confidence_sum": table.c.confidence_sum + statement.excluded.confidence_sum},
+        )
+        db.execute(statement)
+        return
+
+    for value in values:
+        updated = db.execute(
+            update(table)
+            .where(table.c.user_id == value["user_id"], table.c.day == value["day"], table.c.result == value["result"])
+            .values(count=table.c.count + value["count"], confidence_sum=table.c.confidence_sum + value["confidence_sum"])
+        )
+        if not updated.rowcount:
+            db.execute(insert(table).values(value))
+
+
+def parse_stats_request(metadata):
+    """Extrae y valida el rango de días (ISO, inclusivo) de una solicitud get_stats."""
+    until = date.fromisoformat(metadata["until"]) if metadata.get("until") else date.today()
+    since = date.fromisoformat(metadata["since"][:10]) if metadata.get("since") else until - timedelta(days=STATS_DEFAULT_DAYS - 1)
+    if since > until:
+        raise ValueError("since es posterior a until")
+    if (until - since).days >= STATS_MAX_DAYS:
+        raise ValueError(f"El rango no puede superar {STATS_MAX_DAYS} días")
+    return since, until
+
+
+def summarize(results):
+    """Total, tasa de enfermedad y confianza media a partir de {resultado: {count, confidence_sum}}."""
+    total = sum(data["count"] for data in results.values())
+    healthy = results.get(HEALTHY_LABEL, {}).get("count", 0)
+    for data in results.values():
+        data["avg_confidence"] = round(data["confidence_sum"] / data["count"], 2) if data["count"] else None
+    return {"total": total, "disease_rate": round((total - healthy) / total, 4) if total else None, "results": results}
+
+
+def get_rollup_stats(db, metadata):
+    """Tasas de enfermedad por día y resultado de un usuario, leyendo solo la tabla de agregados."""
+    user_id = int(metadata["user_id"])
+    since, until = parse_stats_request(metadata)
+    rows = db.execute(
+        select(PredictionRollup.day, PredictionRollup.result, PredictionRollup.count, PredictionRollup.confidence_sum)
+        .where(PredictionRollup.user_id == user_id, PredictionRollup.day >= since, PredictionRollup.day <= until)
+        .order_by(PredictionRollup.day, PredictionRollup.result)
+    ).all()
+
+    days, totals = {}, {}
+    for row in rows:
+        days.setdefault(row.day.isoformat(), {})[row.result] = {"count": row.count, "confidence_sum": row.confidence_sum}
+        total = totals.setdefault(row.result, {"count": 0, "confidence_sum": 0})
+        total["count"] += row.count
+        total["confidence_sum"] += row.confidence_sum
+
+    return {
+        "user_id": user_id,
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "days": [{"day": day, **summarize(results)} for day, results in days.items()],
+        "totals": summarize(totals),
+    }
+
+
+def backfill(user_id=None):
+    """Recalcula los agregados desde `predictions` (todos los usuarios o uno) en una sola transacción."""
+    Base.metadata.create_all(bind=get_engine(), tables=[PredictionRollup.__table__])
+    day = func.date(Prediction.created_at)
+    query = (
+        select(Image.user_id, day, Prediction.result, func.count(), func.sum(Prediction.confidence))
+        .join(Image, Prediction.image_id == Image.id)
+        .group_by(Image.user_id, day, Prediction.result)
+    )
+    clear = delete(PredictionRollup)
+    if user_id is not None:
+        query = query.where(Image.user_id == user_id)
+        clear = clear.where(PredictionRollup.user_id == user_id)
+
+    with session_scope() as db:
+        db.execute(clear)
+        db.execute(insert(PredictionRollup).from_select(["user_id", "day", "result", "count", "confidence_sum"], query))
+        rows = db.scalar(select(func.count()).select_from(PredictionRollup))
+    logger.info(f"Agregados recalculados: {rows} filas")
+    return rows
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Agregados de predicciones por usuario, día y resultado")
+    parser.add_argument("--backfill", action="store_true", help="Recalcular los agregados desde las predicciones guardadas")
+    parser.add_argument("--user", type=int, default=None, help="Recalcular solo este usuario")
+    args = parser.parse_args()
+
+    if args.backfill:
+        backfill(args.user)
+    else:
+        parser.print_help()
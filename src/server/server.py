@@ -2,16 +2,34 @@ import socket
 import threading
 import json
 import os
+import argparse
+import asyncio
+import functools
+import hashlib
+import uuid
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import redis
 import multiprocessing
+import multiprocessing.connection
 from multiprocessing import Lock, Queue
-from sqlalchemy.exc import OperationalError
-from tasks.celery_config import celery
-from tasks.image_processing import process_image_task
+from queue import Full
+from tasks.scheduling import submit_burst, submit_image
 import logging
-from utils.database import SessionLocal
-from server.models import Image, User, Prediction
+from utils.blobstore import blob_key, content_lock, shard_path
+from utils.database import session_scope
+from utils.metrics import Trace, prometheus_text, record_stages, snapshot
+from utils.redis_client import wait_for_redis
+from server.admission import AdmissionController, MAX_UPLOAD_SIZE, PREDICTION_QUEUE_MAX, check_upload_size, valid_size
+from server.bursts import burst_size, dhash, distinct_frames, validate_burst
+from server.ingest import ingest_image
+from server.dispatcher import ResultDispatcher, RESULT_TIMEOUT
+from server.export import export_messages
+from server.prediction_writer import PredictionBatchWriter
+from server.history import get_history_page, history_messages, history_response, history_cache
+from server.prediction_cache import prediction_cache
+from server.rollups import get_rollup_stats
 
 # Configuración de logging
 logging.basicConfig(level=logging.DEBUG)
@@ -25,196 +43,496 @@ HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", 5000))
 BUFFER_SIZE = int(os.getenv("BUFFER_SIZE", 65536))
 IMAGE_FOLDER = os.getenv("IMAGE_FOLDER", "server/uploads/")
+SERVER_MODE = os.getenv("SERVER_MODE", "async")  # "async" o "threaded"
+BACKLOG = int(os.getenv("BACKLOG", 1024))
+ASYNC_DB_WORKERS = int(os.getenv("ASYNC_DB_WORKERS", 16))  # Hilos para BD/Celery en modo async
+RESULT_WORKERS = int(os.getenv("RESULT_WORKERS", 8))  # Hilos que guardan y reenvían resultados en modo threaded
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", 1))  # Procesos acceptor que comparten el puerto
+SHUTDOWN_GRACE = float(os.getenv("SHUTDOWN_GRACE", 10))  # Segundos esperando resultados pendientes al detenerse
+# Versiones del protocolo de subida:
+#   1: ACK por cada chunk de BUFFER_SIZE (clientes antiguos)
+#   2: payload completo en streaming, un único ACK final con checksum SHA-256
+#   3: como v2, con respuestas enmarcadas (longitud + JSON) y request_id para
+#      tener varias imágenes en vuelo por conexión
+PROTOCOL_VERSION = 3
 
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-REDIS_HOST = REDIS_URL.split("//")[-1].split(":")[0]
-REDIS_PORT = int(REDIS_URL.split(":")[-1].split("/")[0])
-
-redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+# Una sola suscripción a Redis por proceso para todas las predicciones pendientes
+result_dispatcher = ResultDispatcher()
 
 #Colas
-prediction_queue = Queue()  # Para guardar predicciones en la BD
-history_queue = Queue()  # Para consultas de historial
+prediction_queue = Queue(maxsize=PREDICTION_QUEUE_MAX)  # Para guardar predicciones en la BD
+
+# Límites de cola, subidas simultáneas por usuario y bytes por minuto
+admission = AdmissionController(local_backlog=prediction_queue.qsize)
 
 # Lock para evitar conflictos en la BD
 db_lock = Lock()
 
-def prediction_worker(queue):
-    """Proceso que guarda predicciones en la BD."""
-    db = SessionLocal()
+def prediction_worker(queue, parent_pid):
+    """Proceso que guarda predicciones en la BD en lotes.
+
+    Termina con el centinela None que envía el proceso principal al detenerse, o solo si
+    ese proceso muere sin enviarlo; Ctrl+C no lo interrumpe para no perder el lote en curso.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
     logger.info("Proceso de guardado de predicciones iniciado...")
+    writer = PredictionBatchWriter(on_commit=history_cache.invalidate,
+                                   on_flush=lambda elapsed_ms: record_stages({"guardado": elapsed_ms}))
+    writer.run(queue, alive=lambda: os.getppid() == parent_pid)
 
-    while True:
-        try:
-            task = queue.get()
-            if task is None:
-                logger.info("Cerrando proceso de predicciones...")
-                break
 
-            image_id, result, confidence = task
-            logger.info(f"Guardando predicción: {result} ({confidence}%) para imagen {image_id}")
+def use_prediction_queue(queue):
+    """Apunta `save_prediction` y el control de admisión a la cola del writer compartido."""
+    global prediction_queue
+    prediction_queue = queue
+    admission.local_backlog = queue.qsize
 
-            image = db.query(Image).filter(Image.id == image_id).first()
-            if not image:
-                logger.error(f"Imagen {image_id} no encontrada.")
-                continue
 
-            prediction = Prediction(image_id=image_id, result=result, confidence=confidence)
-            db.add(prediction)
-            db.commit()
-            logger.info(f"Predicción guardada en la BD.")
+def save_prediction(image_id, result_data):
+    """Encola una predicción para el writer; si la cola está llena espera a que libere lugar."""
+    item = (image_id, result_data["final_result"], result_data["confidence"])
+    try:
+        prediction_queue.put_nowait(item)
+    except Full:
+        logger.warning("Cola de predicciones llena, esperando al writer...")
+        prediction_queue.put(item)
+
+
+def log_delivery_error(future):
+    if future.exception() is not None:
+        logger.error(f"Error entregando un resultado: {future.exception()}")
+
+
+def encode_message(payload, metadata):
+    """Serializa una respuesta; desde el protocolo v3 lleva prefijo de longitud y request_id."""
+    if "request_id" in metadata:
+        payload = {**payload, "request_id": metadata["request_id"]}
+    data = json.dumps(payload).encode()
+    if int(metadata.get("protocol", 1)) >= 3:
+        return len(data).to_bytes(4, "big") + data
+    return data
+
+
+def listening_socket(port, reuse_port=False):
+    """Socket de escucha IPv6 que acepta también IPv4; con `reuse_port` varios procesos comparten el puerto."""
+    sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)  # Permite IPv4 e IPv6
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        # El kernel reparte las conexiones nuevas entre todos los procesos que escuchan el puerto
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("::", port))  # Escucha en todas las interfaces
+    return sock
+
+
+def wait_for_pending_results(grace=SHUTDOWN_GRACE):
+    """Al detenerse, espera (hasta `grace` segundos) los resultados de las imágenes ya aceptadas."""
+    deadline = time.monotonic() + grace
+    while result_dispatcher.pending() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    if result_dispatcher.pending():
+        logger.warning(f"Se detiene el servidor con {result_dispatcher.pending()} predicciones sin recibir")
+
+
+def recv_exact(conn, size):
+    """Lee exactamente `size` bytes; devuelve b"" si el cliente cerró la conexión."""
+    data = bytearray()
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            return b""
+        data.extend(chunk)
+    return bytes(data)
+
+
+def receive_payload(conn, file_size):
+    """Recibe el payload completo en un buffer preasignado con recv_into (protocolo v2)."""
+    check_upload_size(file_size)
+    payload = bytearray(file_size)
+    view = memoryview(payload)
+    received_size = 0
+    while received_size < file_size:
+        received = conn.recv_into(view[received_size:], min(BUFFER_SIZE, file_size - received_size))
+        if not received:
+            raise ConnectionError("Conexión interrumpida")
+        received_size += received
+    return payload
+
+
+def discard_payload(conn, file_size, protocol):
+    """Lee y descarta el payload de una subida rechazada para que la conexión siga sincronizada."""
+    scratch = bytearray(max(1, min(BUFFER_SIZE, file_size)))
+    remaining = file_size
+    while remaining:
+        received = conn.recv_into(scratch, min(len(scratch), remaining))
+        if not received:
+            raise ConnectionError("Conexión interrumpida")
+        remaining -= received
+        if protocol < 2:
+            conn.sendall(b"ACK")  # Los clientes v1 esperan un ACK por chunk
+
+
+def verify_checksum(metadata, payload):
+    """Calcula el SHA-256 del payload y lo compara con el enviado por el cliente (si lo hay)."""
+    checksum = hashlib.sha256(payload).hexdigest()
+    expected = metadata.get("checksum")
+    return expected is None or expected == checksum, checksum
 
-        except Exception as e:
-            db.rollback()
-            logger.error(f"Error al guardar predicción: {e}")
 
-    db.close()
+def content_path(checksum, filename):
+    """Ruta direccionada por contenido: el nombre es el SHA-256 (con la extensión original) en su subdirectorio."""
+    extension = os.path.splitext(filename)[1].lower()
+    return shard_path(IMAGE_FOLDER, f"{checksum}{extension}")
 
 
-def history_worker(queue):
-    """Proceso que maneja solicitudes de historial."""
-    db = SessionLocal()
-    logger.info("Proceso de historial iniciado...")
+def temporary_path():
+    return os.path.join(IMAGE_FOLDER, f".{uuid.uuid4().hex}.part")
 
-    while True:
+
+def reuse_stored(image_path):
+    """True si ese contenido ya está guardado.
+
+    Le actualiza la fecha de modificación bajo el lock del contenido: server.storage no borra
+    archivos usados hace poco, así el archivo sigue ahí cuando se registre la nueva imagen.
+    """
+    with content_lock(IMAGE_FOLDER, os.path.basename(image_path)):
         try:
-            task = queue.get()
-            if task is None:
-                logger.info("Cerrando proceso de historial...")
-                break
-
-            user_id, client_conn = task
-            logger.info(f"Procesando historial para usuario {user_id}")
-
-            predictions = (
-                db.query(Prediction)
-                .join(Image, Prediction.image_id == Image.id)
-                .filter(Image.user_id == user_id)
-                .all()
-            )
-
-            if not predictions:
-                response = {"status": "success", "historial": [], "message": "No hay predicciones registradas."}
-            else:
-                history = [
-                    {"image_id": p.image_id, "result": p.result, "confidence": p.confidence}
-                    for p in predictions
-                ]
-                response = {"status": "success", "historial": history}
-
-            client_conn.sendall(json.dumps(response).encode())
-            client_conn.close()
-            logger.info(f"Historial enviado al cliente {user_id}")
+            os.utime(image_path)
+            return True
+        except FileNotFoundError:
+            return False
 
-        except Exception as e:
-            logger.error(f"Error en historial: {e}")
 
-    db.close()
+def store_file(tmp_path, checksum, filename):
+    """Mueve un archivo recibido a su ruta por contenido; si ya existe, descarta la copia."""
+    image_path = content_path(checksum, filename)
+    if reuse_stored(image_path):
+        os.remove(tmp_path)
+        logger.info(f"Imagen duplicada, se reutiliza {image_path}")
+    else:
+        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+        os.replace(tmp_path, image_path)
+    return image_path
+
+
+def store_payload(payload, checksum, filename):
+    """Guarda un payload en su ruta por contenido, salvo que ese contenido ya esté almacenado."""
+    image_path = content_path(checksum, filename)
+    if reuse_stored(image_path):
+        logger.info(f"Imagen duplicada, se reutiliza {image_path}")
+        return image_path
+    tmp_path = temporary_path()
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.makedirs(os.path.dirname(image_path), exist_ok=True)
+    os.replace(tmp_path, image_path)
+    return image_path
+
+
+def stats_response(metadata):
+    """Histogramas de latencia por etapa; con "format": "prometheus" en formato de texto de Prometheus."""
+    stages = snapshot()
+    if metadata.get("format") == "prometheus":
+        return {"status": "success", "text": prometheus_text(stages)}
+    return {"status": "success", "stages": stages}
+
+
+def prepare_burst(metadata, payloads):
+    """Verifica los frames de una ráfaga, descarta los casi repetidos y guarda los distintos.
+
+    Devuelve las rutas de los frames distintos (el primero representa la ráfaga en la BD) y
+    un checksum de la ráfaga, calculado sobre los de esos frames, para la caché de predicciones.
+    """
+    frames = metadata["frames"]
+    checksums = []
+    for frame, payload in zip(frames, payloads):
+        valid, checksum = verify_checksum(frame, payload)
+        if not valid:
+            raise ValueError(f"Checksum inválido para {frame['image_name']}")
+        checksums.append(checksum)
+    try:
+        keep = distinct_frames(dhash(payloads))
+    except OSError as e:
+        raise ValueError(f"Frame ilegible: {e}")
+
+    logger.info(f"Ráfaga de {len(frames)} frames: {len(keep)} distintos")
+    image_paths = [store_payload(payloads[index], checksums[index], frames[index]["image_name"]) for index in keep]
+    digest = hashlib.sha256("".join(checksums[index] for index in keep).encode()).hexdigest()
+    return image_paths, digest
+
+
+def register_frames(user_id, image_paths):
+    """Registra en `images` los frames distintos de una ráfaga que no la representan.
+
+    Solo el primero lleva la predicción, pero todos quedan en IMAGE_FOLDER: con su fila
+    server.storage también los compacta y borra. El historial y los agregados parten de
+    las predicciones, así que estas filas no aparecen en ellos.
+    """
+    if not image_paths:
+        return
+    with session_scope() as db:
+        for image_path in image_paths:
+            ingest_image(db, user_id, image_path)
+
+
+def rollup_response(metadata):
+    """Tasas de enfermedad por día y resultado de un usuario, desde la tabla de agregados."""
+    try:
+        with session_scope() as db:
+            return {"status": "success", **get_rollup_stats(db, metadata)}
+    except (ValueError, TypeError, KeyError) as e:
+        return {"status": "error", "message": f"Parámetros de estadísticas inválidos: {e}"}
+
+
+def cached_prediction(user_id, image_path, checksum):
+    """Si ese contenido ya fue analizado registra la imagen y devuelve la predicción guardada, sin Celery.
+
+    `image` es la clave de la imagen, como en las respuestas de los workers (no la ruta del servidor).
+    """
+    cached = prediction_cache.get(checksum)
+    if cached is None:
+        return None
+
+    with session_scope() as db:
+        image_id = ingest_image(db, user_id, image_path)
+    save_prediction(image_id, cached)
+    logger.info(f"Predicción en caché para {image_path}")
+    return {"status": "success", "task_id": None, "cached": True, "image": blob_key(image_path),
+            "user_id": user_id, "checksum": checksum, **cached}
+
+
+class LockedSocket:
+    """Socket con lock de escritura: varias respuestas de la misma conexión pueden salir desde distintos hilos."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def sendall(self, data):
+        with self.lock:
+            self.conn.sendall(data)
 
 
 class ImageServer:
     def __init__(self):
         self.server = None
+        # Guardar en la BD y en la caché puede esperar (cola del writer llena, Redis lento): se
+        # hace en estos hilos para que el despachador solo reparta resultados
+        self.results = ThreadPoolExecutor(max_workers=RESULT_WORKERS, thread_name_prefix="farmeye-resultados")
         os.makedirs(IMAGE_FOLDER, exist_ok=True)
 
-    def listen_for_result(self, conn, user_id, image_id, task_id):
-        """Escucha el canal en Redis y envía el resultado al cliente sin cerrar la conexión antes de tiempo."""
-        channel = f"resultados:{user_id}"
-        pubsub = redis_client.pubsub()
-        pubsub.subscribe(channel)
-        logger.info(f"Cliente {user_id} suscrito a {channel}")
+    def result_callback(self, *args):
+        """Callback para el despachador: encola `deliver_result(*args, result_data)` en `self.results`."""
+        def submit(result_data):
+            self.results.submit(self.deliver_result, *args, result_data).add_done_callback(log_delivery_error)
+        return submit
 
-        try:
-            for message in pubsub.listen():
-                if message["type"] == "message":
-                    result_data = json.loads(message["data"])
-                    logger.info(f"Resultado recibido para {user_id}: {result_data}")
-
-                    # Encolar la predicción para que el worker la guarde en la BD
-                    prediction_queue.put((image_id, result_data["final_result"], result_data["confidence"]))
-                    logger.info(f"Predicción encolada para guardar.")
-
-                    # **Verificar si la conexión sigue activa antes de enviar datos**
-                    if conn.fileno() != -1:  
-                        try:
-                            conn.sendall(json.dumps(result_data).encode())
-                            logger.info(f"Resultado enviado a {user_id}")
-                        except (BrokenPipeError, ConnectionResetError):
-                            logger.error(f"El cliente {user_id} cerró la conexión antes de recibir el resultado.")
-                    else:
-                        logger.warning(f"Conexión con {user_id} ya estaba cerrada.")
-
-                    break  # Termina la escucha una vez que se recibe el resultado
+    def deliver_result(self, conn, metadata, user_id, image_id, checksum, trace, result_data):
+        """Guarda y reenvía al cliente un resultado (se ejecuta en un hilo de `self.results`)."""
+        logger.info(f"Resultado recibido para {user_id}: {result_data}")
 
-        except Exception as e:
-            logger.error(f"Error en listen_for_result para {user_id}: {e}")
+        # Encolar la predicción para que el worker la guarde en la BD (los errores del worker solo se reenvían)
+        if "final_result" in result_data:
+            save_prediction(image_id, result_data)
+            prediction_cache.put(checksum, result_data)
+            logger.info(f"Predicción encolada para guardar.")
+
+        # **Verificar si la conexión sigue activa antes de enviar datos**
+        if conn.fileno() != -1:
+            try:
+                conn.sendall(encode_message(result_data, metadata))
+                logger.info(f"Resultado enviado a {user_id}")
+            except (BrokenPipeError, ConnectionResetError, OSError):
+                logger.error(f"El cliente {user_id} cerró la conexión antes de recibir el resultado.")
+        else:
+            logger.warning(f"Conexión con {user_id} ya estaba cerrada.")
+        trace.finish("total")
+
+    def process_image_request(self, metadata, conn):
+        """Procesa una solicitud de imagen si el control de admisión la acepta."""
+        user_id = int(metadata["user_id"])
+        file_size = metadata.get("file_size")
+        if not valid_size(file_size):
+            # Sin un tamaño válido no se sabe dónde termina el payload: se responde y se cierra
+            conn.sendall(encode_message({"status": "error", "message": "Tamaño de archivo inválido"}, metadata))
+            conn.shutdown(socket.SHUT_RDWR)
+            return
+        if file_size > MAX_UPLOAD_SIZE:
+            discard_payload(conn, file_size, int(metadata.get("protocol", 1)))
+            conn.sendall(encode_message({"status": "error", "message": f"La imagen supera el máximo de {MAX_UPLOAD_SIZE} bytes"}, metadata))
+            return
+        busy = admission.admit(user_id, metadata["file_size"])
+        if busy is not None:
+            discard_payload(conn, metadata["file_size"], int(metadata.get("protocol", 1)))
+            conn.sendall(encode_message(busy, metadata))
+            return
+        try:
+            self.receive_image(metadata, conn)
         finally:
-            pubsub.close()
+            admission.release(user_id)
 
-    def process_image_request(self, metadata, conn, db):
-        """Procesa una solicitud de imagen."""
+    def receive_image(self, metadata, conn):
+        """Recibe una imagen, la registra y lanza su procesamiento."""
+        trace = Trace()  # Mide cada etapa de esta imagen; el id viaja hasta el worker y vuelve en el resultado
         user_id = int(metadata["user_id"])
         filename = metadata["image_name"]
         file_size = metadata["file_size"]
 
         logger.debug(f"Recibiendo imagen {filename} ({file_size} bytes)...")
+        if "transform" in metadata:
+            logger.info(f"Imagen {filename} reducida por el cliente: {metadata['transform']}")
 
-        user = db.query(User).filter_by(id=user_id).first()
-        if not user:
-            logger.info(f"Creando usuario {user_id}...")
-            new_user = User(id=user_id)
-            db.add(new_user)
-            db.commit()
+        protocol = int(metadata.get("protocol", 1))
 
-        image_path = os.path.join(IMAGE_FOLDER, filename)
-        received_size = 0
-        with open(image_path, "wb") as f:
-            while received_size < file_size:
-                chunk = conn.recv(min(BUFFER_SIZE, file_size - received_size))
-                if not chunk:
-                    raise Exception("Conexión interrumpida")
-                f.write(chunk)
-                received_size += len(chunk)
-                conn.sendall(b"ACK")
+        if protocol >= 2:
+            payload = receive_payload(conn, file_size)
+            valid, checksum = verify_checksum(metadata, payload)
+            if not valid:
+                logger.error(f"Checksum inválido para {filename}")
+                conn.sendall(encode_message({"status": "error", "message": "Checksum inválido", "checksum": checksum}, metadata))
+                return
+            image_path = store_payload(payload, checksum, filename)
+        else:
+            # El hash se calcula mientras se recibe; el nombre final se conoce al terminar
+            hasher = hashlib.sha256()
+            tmp_path = temporary_path()
+            received_size = 0
+            with open(tmp_path, "wb") as f:
+                while received_size < file_size:
+                    chunk = conn.recv(min(BUFFER_SIZE, file_size - received_size))
+                    if not chunk:
+                        os.remove(tmp_path)
+                        raise Exception("Conexión interrumpida")
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    received_size += len(chunk)
+                    conn.sendall(b"ACK")
+            checksum = hasher.hexdigest()
+            image_path = store_file(tmp_path, checksum, filename)
 
         logger.info(f"Imagen guardada en {image_path}")
+        trace.lap("recepcion")
 
-        new_image = Image(image_path=image_path, user_id=user_id)
-        db.add(new_image)
-        db.commit()
-
+        task_id = str(uuid.uuid4())
         try:
-            task = process_image_task.delay(image_path, user_id)
-            response = {"status": "success", "task_id": task.id, "message": "Imagen recibida y procesamiento iniciado"}
-            conn.sendall(json.dumps(response).encode())
+            # Con respuestas enmarcadas (v3) un acierto de caché responde en un solo mensaje
+            cached = cached_prediction(user_id, image_path, checksum) if protocol >= 3 else None
+            if cached is not None:
+                conn.sendall(encode_message({**cached, "trace_id": trace.trace_id}, metadata))
+                trace.finish("total_cache")
+                return
+
+            with trace.stage("registro"):
+                with session_scope() as db:
+                    image_id = ingest_image(db, user_id, image_path)
 
-            listener_thread = threading.Thread(target=self.listen_for_result, args=(conn, user_id, new_image.id, task.id))
-            listener_thread.daemon = True
-            listener_thread.start()
+            # Registrar la espera antes de encolar: el resultado no puede llegar antes que el suscriptor
+            result_dispatcher.register(task_id, self.result_callback(conn, metadata, user_id, image_id, checksum, trace))
+            with trace.stage("encolado"):
+                submit_image(image_path, user_id, task_id, bool(metadata.get("bulk")), trace.trace_id)
+            response = {"status": "success", "task_id": task_id, "trace_id": trace.trace_id,
+                        "message": "Imagen recibida y procesamiento iniciado"}
+            if protocol >= 2:
+                response["checksum"] = checksum
+            conn.sendall(encode_message(response, metadata))
         except Exception as e:
+            result_dispatcher.unregister(task_id)
             logger.error(f"Error al procesar imagen: {e}")
-            conn.sendall(json.dumps({"status": "error", "message": str(e)}).encode())
+            conn.sendall(encode_message({"status": "error", "message": str(e)}, metadata))
+
+    def process_burst_request(self, metadata, conn):
+        """Procesa una ráfaga de frames si es válida y el control de admisión la acepta."""
+        user_id = int(metadata["user_id"])
+        error = validate_burst(metadata)
+        size = burst_size(metadata)
+        busy = admission.admit(user_id, size) if error is None else None
+        if error is not None or busy is not None:
+            if size is None:
+                # Sin los tamaños de los frames no se sabe dónde termina el payload: se responde y se cierra
+                conn.sendall(encode_message({"status": "error", "message": error}, metadata))
+                conn.shutdown(socket.SHUT_RDWR)
+                return
+            discard_payload(conn, size, int(metadata.get("protocol", 1)))
+            conn.sendall(encode_message(busy or {"status": "error", "message": error}, metadata))
+            return
+        try:
+            self.receive_burst(metadata, conn)
+        finally:
+            admission.release(user_id)
+
+    def receive_burst(self, metadata, conn):
+        """Recibe los frames, lanza la inferencia de los distintos y responde con una sola predicción."""
+        trace = Trace()
+        user_id = int(metadata["user_id"])
+        payloads = [receive_payload(conn, frame["file_size"]) for frame in metadata["frames"]]
+        trace.lap("recepcion")
+        try:
+            image_paths, checksum = prepare_burst(metadata, payloads)
+        except ValueError as e:
+            logger.error(f"Ráfaga rechazada: {e}")
+            conn.sendall(encode_message({"status": "error", "message": str(e)}, metadata))
+            return
+        trace.lap("deduplicacion")
+        frames = {"frames": len(payloads), "distinct_frames": len(image_paths)}
+
+        task_id = str(uuid.uuid4())
+        try:
+            register_frames(user_id, image_paths[1:])
+            cached = cached_prediction(user_id, image_paths[0], checksum)
+            if cached is not None:
+                conn.sendall(encode_message({**cached, **frames, "trace_id": trace.trace_id}, metadata))
+                trace.finish("total_cache")
+                return
+
+            with trace.stage("registro"):
+                with session_scope() as db:
+                    image_id = ingest_image(db, user_id, image_paths[0])
+
+            result_dispatcher.register(task_id, self.result_callback(conn, metadata, user_id, image_id, checksum, trace))
+            with trace.stage("encolado"):
+                submit_burst(image_paths, user_id, task_id, bool(metadata.get("bulk")), trace.trace_id)
+            conn.sendall(encode_message({"status": "success", "task_id": task_id, "trace_id": trace.trace_id, "checksum": checksum,
+                                         **frames, "message": "Ráfaga recibida y procesamiento iniciado"}, metadata))
+        except Exception as e:
+            result_dispatcher.unregister(task_id)
+            logger.error(f"Error al procesar ráfaga: {e}")
+            conn.sendall(encode_message({"status": "error", "message": str(e)}, metadata))
 
     def send_history(self, metadata, conn):
-        """Encola la solicitud de historial para ser procesada en segundo plano."""
+        """Envía una página del historial; con protocolo v3 llega en varios mensajes."""
         user_id = int(metadata["user_id"])
-        logger.info(f"Encolando historial para usuario {user_id}...")
-        history_queue.put((user_id, conn))
+        logger.info(f"Procesando historial para usuario {user_id}...")
+        try:
+            with session_scope() as db:
+                page = get_history_page(db, metadata)
+        except (ValueError, TypeError) as e:
+            conn.sendall(encode_message({"status": "error", "message": f"Parámetros de historial inválidos: {e}"}, metadata))
+            return
+
+        if int(metadata.get("protocol", 1)) >= 3:
+            for message in history_messages(page):
+                conn.sendall(encode_message(message, metadata))
+        else:
+            conn.sendall(encode_message(history_response(page), metadata))
+        logger.info(f"Historial enviado al cliente {user_id}")
 
     def handle_client(self, conn, addr):
         """Maneja la conexión con un cliente."""
         logger.info(f"Conectado con {addr}")
-        db = SessionLocal()
+        conn = LockedSocket(conn)
     
         try:
             while True:
-                size_data = conn.recv(4)
+                size_data = recv_exact(conn, 4)
                 if not size_data:
                     logger.info(f"Cliente {addr} cerró la conexión.")
                     break
                 
                 metadata_size = int.from_bytes(size_data, "big")
-                metadata_bytes = conn.recv(metadata_size)
+                metadata_bytes = recv_exact(conn, metadata_size)
                 if not metadata_bytes:
                     break  
                 
@@ -225,38 +543,507 @@ class ImageServer:
                     # Procesar la imagen y esperar a que se envíe la predicción antes de cerrar la conexión
                     listener_thread = threading.Thread(
                         target=self.process_image_request,
-                        args=(metadata, conn, db),
+                        args=(metadata, conn),
                         daemon=True
                     )
                     listener_thread.start()
                     listener_thread.join()  # Esperar a que el hilo termine antes de cerrar la conexión
-    
+                elif action == "send_burst":
+                    self.process_burst_request(metadata, conn)
                 elif action == "get_history":
-                    self.send_history(metadata, conn, db)
+                    self.send_history(metadata, conn)
+                    if int(metadata.get("protocol", 1)) < 3:
+                        break  # Los clientes antiguos esperan que se cierre la conexión
+                elif action == "ping":
+                    conn.sendall(encode_message({"status": "success", "message": "pong"}, metadata))
+                elif action == "stats":
+                    conn.sendall(encode_message(stats_response(metadata), metadata))
+                elif action == "get_stats":
+                    conn.sendall(encode_message(rollup_response(metadata), metadata))
+                elif action == "export_predictions":
+                    for message in export_messages(metadata):
+                        conn.sendall(encode_message(message, metadata))
                 else:
-                    conn.sendall(json.dumps({"status": "error", "message": "Acción no reconocida"}).encode())
+                    conn.sendall(encode_message({"status": "error", "message": "Acción no reconocida"}, metadata))
     
         except Exception as e:
             logger.error(f"Error general en handle_client: {e}")
         finally:
-            db.close()
             conn.close()  
     
 
-    def start(self):
-        self.server = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
-        self.server.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)  # Permite IPv4 e IPv6
-        self.server.bind(("::", PORT))  # Escucha en todas las interfaces
-        self.server.listen(5)
-        logger.info(f"🚀 Servidor TCP iniciado en {HOST}:{PORT}")
-    
+    def start(self, port=PORT, backlog=BACKLOG, reuse_port=False):
+        self.server = listening_socket(port, reuse_port)
+        self.server.listen(backlog)
+        result_dispatcher.start()
+        logger.info(f"🚀 Servidor TCP (threaded) iniciado en {HOST}:{port}")
+
+        try:
+            while True:
+                conn, addr = self.server.accept()
+                threading.Thread(target=self.handle_client, args=(conn, addr), daemon=True).start()
+        except KeyboardInterrupt:
+            # SIGINT o SIGTERM: no se aceptan conexiones nuevas y se esperan los resultados en curso
+            logger.info("Deteniendo servidor...")
+            self.server.close()
+            wait_for_pending_results()
+            self.results.shutdown(wait=True)
+
+
+class AsyncImageServer:
+    """Servidor basado en asyncio: atiende el protocolo completo sin un hilo por conexión."""
+
+    def __init__(self):
+        self.server = None
+        # Las operaciones bloqueantes (BD, Celery) corren en un pool acotado
+        self.executor = ThreadPoolExecutor(max_workers=ASYNC_DB_WORKERS, thread_name_prefix="farmeye-db")
+        self.pending_results = set()
+        os.makedirs(IMAGE_FOLDER, exist_ok=True)
+
+    async def run_blocking(self, func, *args):
+        """Ejecuta una función bloqueante en el pool de hilos del servidor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    @staticmethod
+    async def iterate_blocking(iterator, buffered=2):
+        """Recorre un generador bloqueante (ej. un cursor de la BD) en un hilo propio.
+
+        Todo el generador corre en el mismo hilo, así la sesión no cambia de hilo, y a lo sumo
+        `buffered` elementos esperan en memoria a que el cliente los lea. Si el consumidor se
+        detiene (el cliente se desconecta), el generador se cierra.
+        """
+        loop = asyncio.get_running_loop()
+        buffer = asyncio.Queue(maxsize=buffered)
+        stop = threading.Event()
+        end = object()
+
+        def produce():
+            last = end
+            try:
+                for item in iterator:
+                    asyncio.run_coroutine_threadsafe(buffer.put(item), loop).result()
+                    if stop.is_set():
+                        return
+            except Exception as e:
+                last = e  # Se relanza en el loop
+            finally:
+                iterator.close()
+            asyncio.run_coroutine_threadsafe(buffer.put(last), loop).result()
+
+        threading.Thread(target=produce, name="farmeye-stream", daemon=True).start()
+        try:
+            while (item := await buffer.get()) is not end:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            while not buffer.empty():  # Libera al productor si estaba esperando lugar
+                buffer.get_nowait()
+
+    @staticmethod
+    def register_image_in_db(user_id, image_path):
+        """Registra la imagen en una sesión propia (se ejecuta en el pool)."""
+        with session_scope() as db:
+            return ingest_image(db, user_id, image_path)
+
+    @staticmethod
+    def query_history(metadata):
+        """Consulta una página de historial en una sesión propia (se ejecuta en el pool)."""
+        with session_scope() as db:
+            return get_history_page(db, metadata)
+
+    async def send_message(self, writer, payload, metadata):
+        writer.write(encode_message(payload, metadata))
+        await writer.drain()
+
+    @staticmethod
+    async def receive_payload(reader, file_size):
+        """Recibe el payload completo en un buffer preasignado (protocolo v2)."""
+        check_upload_size(file_size)
+        payload = bytearray(file_size)
+        view = memoryview(payload)
+        received_size = 0
+        while received_size < file_size:
+            chunk = await reader.read(min(BUFFER_SIZE, file_size - received_size))
+            if not chunk:
+                raise ConnectionError("Conexión interrumpida")
+            view[received_size:received_size + len(chunk)] = chunk
+            received_size += len(chunk)
+        return payload
+
+    async def listen_for_result(self, writer, metadata, user_id, image_id, checksum, task_id, future, trace):
+        """Espera el resultado que entrega el despachador y lo reenvía al cliente."""
+        try:
+            result_data = await asyncio.wait_for(future, RESULT_TIMEOUT)
+        except asyncio.TimeoutError:
+            result_dispatcher.unregister(task_id)
+            logger.error(f"Sin resultado para {user_id} (tarea {task_id}) tras {RESULT_TIMEOUT}s.")
+            return
+
+        logger.info(f"Resultado recibido para {user_id}: {result_data}")
+        if "final_result" in result_data:  # Los errores del worker solo se reenvían
+            await self.run_blocking(save_prediction, image_id, result_data)
+            await self.run_blocking(prediction_cache.put, checksum, result_data)
+
+        if writer.is_closing():
+            logger.warning(f"Conexión con {user_id} ya estaba cerrada.")
+        else:
+            try:
+                await self.send_message(writer, result_data, metadata)
+                logger.info(f"Resultado enviado a {user_id}")
+            except (BrokenPipeError, ConnectionResetError):
+                logger.error(f"El cliente {user_id} cerró la conexión antes de recibir el resultado.")
+        await self.run_blocking(trace.finish, "total")
+
+    @staticmethod
+    def result_future(task_id):
+        """Registra `task_id` en el despachador y devuelve un future que se resuelve en este loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(result_data):
+            if not future.done():
+                future.set_result(result_data)
+
+        result_dispatcher.register(task_id, lambda result_data: loop.call_soon_threadsafe(resolve, result_data))
+        return future
+
+    @staticmethod
+    async def discard_payload(reader, writer, file_size, protocol):
+        """Lee y descarta el payload de una subida rechazada para que la conexión siga sincronizada."""
+        remaining = file_size
+        while remaining:
+            chunk = await reader.read(min(BUFFER_SIZE, remaining))
+            if not chunk:
+                raise ConnectionError("Conexión interrumpida")
+            remaining -= len(chunk)
+            if protocol < 2:
+                writer.write(b"ACK")  # Los clientes v1 esperan un ACK por chunk
+                await writer.drain()
+
+    async def process_image_request(self, metadata, reader, writer):
+        """Procesa una solicitud de imagen si el control de admisión la acepta."""
+        user_id = int(metadata["user_id"])
+        file_size = metadata.get("file_size")
+        if not valid_size(file_size):
+            # Sin un tamaño válido no se sabe dónde termina el payload: se responde y se cierra
+            await self.send_message(writer, {"status": "error", "message": "Tamaño de archivo inválido"}, metadata)
+            writer.close()
+            return
+        if file_size > MAX_UPLOAD_SIZE:
+            await self.discard_payload(reader, writer, file_size, int(metadata.get("protocol", 1)))
+            await self.send_message(writer, {"status": "error", "message": f"La imagen supera el máximo de {MAX_UPLOAD_SIZE} bytes"}, metadata)
+            return
+        busy = await self.run_blocking(admission.admit, user_id, metadata["file_size"])
+        if busy is not None:
+            await self.discard_payload(reader, writer, metadata["file_size"], int(metadata.get("protocol", 1)))
+            await self.send_message(writer, busy, metadata)
+            return
+        try:
+            await self.receive_image(metadata, reader, writer)
+        finally:
+            await self.run_blocking(admission.release, user_id)
+
+    async def receive_image(self, metadata, reader, writer):
+        """Recibe una imagen, la registra y lanza su procesamiento."""
+        trace = Trace()  # Mide cada etapa de esta imagen; el id viaja hasta el worker y vuelve en el resultado
+        user_id = int(metadata["user_id"])
+        filename = metadata["image_name"]
+        file_size = metadata["file_size"]
+
+        logger.debug(f"Recibiendo imagen {filename} ({file_size} bytes)...")
+        if "transform" in metadata:
+            logger.info(f"Imagen {filename} reducida por el cliente: {metadata['transform']}")
+
+        protocol = int(metadata.get("protocol", 1))
+
+        if protocol >= 2:
+            payload = await self.receive_payload(reader, file_size)
+            # SHA-256 de hasta MAX_UPLOAD_SIZE bytes, escritura y lock del contenido: fuera del loop
+            valid, checksum = await self.run_blocking(verify_checksum, metadata, payload)
+            if not valid:
+                logger.error(f"Checksum inválido para {filename}")
+                await self.send_message(writer, {"status": "error", "message": "Checksum inválido", "checksum": checksum}, metadata)
+                return
+            image_path = await self.run_blocking(store_payload, payload, checksum, filename)
+        else:
+            # El hash se calcula mientras se recibe; el nombre final se conoce al terminar
+            hasher = hashlib.sha256()
+            tmp_path = temporary_path()
+            received_size = 0
+            with open(tmp_path, "wb") as f:
+                while received_size < file_size:
+                    chunk = await reader.read(min(BUFFER_SIZE, file_size - received_size))
+                    if not chunk:
+                        os.remove(tmp_path)
+                        raise ConnectionError("Conexión interrumpida")
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    received_size += len(chunk)
+                    writer.write(b"ACK")
+                    await writer.drain()
+            checksum = hasher.hexdigest()
+            image_path = await self.run_blocking(store_file, tmp_path, checksum, filename)
+
+        logger.info(f"Imagen guardada en {image_path}")
+        trace.lap("recepcion")
+
+        task_id = str(uuid.uuid4())
+        try:
+            # Con respuestas enmarcadas (v3) un acierto de caché responde en un solo mensaje
+            cached = await self.run_blocking(cached_prediction, user_id, image_path, checksum) if protocol >= 3 else None
+            if cached is not None:
+                await self.send_message(writer, {**cached, "trace_id": trace.trace_id}, metadata)
+                await self.run_blocking(trace.finish, "total_cache")
+                return
+
+            image_id = await self.run_blocking(self.register_image_in_db, user_id, image_path)
+            trace.lap("registro")
+            future = self.result_future(task_id)
+            await self.run_blocking(submit_image, image_path, user_id, task_id, bool(metadata.get("bulk")), trace.trace_id)
+            trace.lap("encolado")
+            response = {"status": "success", "task_id": task_id, "trace_id": trace.trace_id,
+                        "message": "Imagen recibida y procesamiento iniciado"}
+            if protocol >= 2:
+                response["checksum"] = checksum
+            await self.send_message(writer, response, metadata)
+        except Exception as e:
+            result_dispatcher.unregister(task_id)
+            logger.error(f"Error al procesar imagen: {e}")
+            await self.send_message(writer, {"status": "error", "message": str(e)}, metadata)
+            return
+
+        # La espera del resultado no bloquea la lectura de la siguiente solicitud
+        listener = asyncio.create_task(self.listen_for_result(writer, metadata, user_id, image_id, checksum, task_id, future, trace))
+        self.pending_results.add(listener)
+        listener.add_done_callback(self.pending_results.discard)
+
+    async def process_burst_request(self, metadata, reader, writer):
+        """Procesa una ráfaga de frames si es válida y el control de admisión la acepta."""
+        user_id = int(metadata["user_id"])
+        error = validate_burst(metadata)
+        size = burst_size(metadata)
+        busy = await self.run_blocking(admission.admit, user_id, size) if error is None else None
+        if error is not None or busy is not None:
+            if size is None:
+                # Sin los tamaños de los frames no se sabe dónde termina el payload: se responde y se cierra
+                await self.send_message(writer, {"status": "error", "message": error}, metadata)
+                writer.close()
+                return
+            await self.discard_payload(reader, writer, size, int(metadata.get("protocol", 1)))
+            await self.send_message(writer, busy or {"status": "error", "message": error}, metadata)
+            return
+        try:
+            await self.receive_burst(metadata, reader, writer)
+        finally:
+            await self.run_blocking(admission.release, user_id)
+
+    async def receive_burst(self, metadata, reader, writer):
+        """Recibe los frames, lanza la inferencia de los distintos y responde con una sola predicción."""
+        trace = Trace()
+        user_id = int(metadata["user_id"])
+        payloads = [await self.receive_payload(reader, frame["file_size"]) for frame in metadata["frames"]]
+        trace.lap("recepcion")
+        try:
+            # Decodificar las miniaturas y guardar los frames no debe frenar el loop
+            image_paths, checksum = await self.run_blocking(prepare_burst, metadata, payloads)
+        except ValueError as e:
+            logger.error(f"Ráfaga rechazada: {e}")
+            await self.send_message(writer, {"status": "error", "message": str(e)}, metadata)
+            return
+        trace.lap("deduplicacion")
+        frames = {"frames": len(payloads), "distinct_frames": len(image_paths)}
+
+        task_id = str(uuid.uuid4())
+        try:
+            await self.run_blocking(register_frames, user_id, image_paths[1:])
+            cached = await self.run_blocking(cached_prediction, user_id, image_paths[0], checksum)
+            if cached is not None:
+                await self.send_message(writer, {**cached, **frames, "trace_id": trace.trace_id}, metadata)
+                await self.run_blocking(trace.finish, "total_cache")
+                return
+
+            image_id = await self.run_blocking(self.register_image_in_db, user_id, image_paths[0])
+            trace.lap("registro")
+            future = self.result_future(task_id)
+            await self.run_blocking(submit_burst, image_paths, user_id, task_id, bool(metadata.get("bulk")), trace.trace_id)
+            trace.lap("encolado")
+            await self.send_message(writer, {"status": "success", "task_id": task_id, "trace_id": trace.trace_id, "checksum": checksum,
+                                             **frames, "message": "Ráfaga recibida y procesamiento iniciado"}, metadata)
+        except Exception as e:
+            result_dispatcher.unregister(task_id)
+            logger.error(f"Error al procesar ráfaga: {e}")
+            await self.send_message(writer, {"status": "error", "message": str(e)}, metadata)
+            return
+
+        listener = asyncio.create_task(self.listen_for_result(writer, metadata, user_id, image_id, checksum, task_id, future, trace))
+        self.pending_results.add(listener)
+        listener.add_done_callback(self.pending_results.discard)
+
+    async def send_history(self, metadata, writer):
+        """Envía una página del historial; con protocolo v3 llega en varios mensajes."""
+        user_id = int(metadata["user_id"])
+        logger.info(f"Procesando historial para usuario {user_id}...")
+        try:
+            page = await self.run_blocking(self.query_history, metadata)
+        except (ValueError, TypeError) as e:
+            await self.send_message(writer, {"status": "error", "message": f"Parámetros de historial inválidos: {e}"}, metadata)
+            return
+
+        if int(metadata.get("protocol", 1)) >= 3:
+            for message in history_messages(page):
+                writer.write(encode_message(message, metadata))
+                await writer.drain()
+        else:
+            await self.send_message(writer, history_response(page), metadata)
+            writer.close()  # Los clientes antiguos esperan que se cierre la conexión
+        logger.info(f"Historial enviado al cliente {user_id}")
+
+    async def handle_client(self, reader, writer):
+        """Maneja la conexión con un cliente."""
+        addr = writer.get_extra_info("peername")
+        logger.info(f"Conectado con {addr}")
+
+        try:
+            while not writer.is_closing():
+                try:
+                    size_data = await reader.readexactly(4)
+                except asyncio.IncompleteReadError:
+                    logger.info(f"Cliente {addr} cerró la conexión.")
+                    break
+
+                metadata_size = int.from_bytes(size_data, "big")
+                metadata = json.loads((await reader.readexactly(metadata_size)).decode())
+                action = metadata.get("action", "send_image")
+
+                if action == "send_image":
+                    await self.process_image_request(metadata, reader, writer)
+                elif action == "send_burst":
+                    await self.process_burst_request(metadata, reader, writer)
+                elif action == "get_history":
+                    await self.send_history(metadata, writer)
+                elif action == "ping":
+                    await self.send_message(writer, {"status": "success", "message": "pong"}, metadata)
+                elif action == "stats":
+                    await self.send_message(writer, await self.run_blocking(stats_response, metadata), metadata)
+                elif action == "get_stats":
+                    await self.send_message(writer, await self.run_blocking(rollup_response, metadata), metadata)
+                elif action == "export_predictions":
+                    async for message in self.iterate_blocking(export_messages(metadata)):
+                        await self.send_message(writer, message, metadata)
+                else:
+                    await self.send_message(writer, {"status": "error", "message": "Acción no reconocida"}, metadata)
+
+        except Exception as e:
+            logger.error(f"Error general en handle_client: {e}")
+        finally:
+            # Las predicciones pendientes siguen su curso aunque el cliente se vaya
+            if not writer.is_closing():
+                writer.close()
+
+    async def serve(self, port=PORT, backlog=BACKLOG, reuse_port=False):
+        sock = listening_socket(port, reuse_port)
+        self.server = await asyncio.start_server(self.handle_client, sock=sock, backlog=backlog)
+        await self.run_blocking(result_dispatcher.start)
+        logger.info(f"🚀 Servidor TCP (async) iniciado en {HOST}:{port}")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        await stop.wait()
+
+        # No se aceptan conexiones nuevas; las predicciones en curso se entregan y se guardan
+        logger.info("Deteniendo servidor...")
+        self.server.close()
+        if self.pending_results:
+            _, pending = await asyncio.wait(self.pending_results, timeout=SHUTDOWN_GRACE)
+            if pending:
+                logger.warning(f"Se detiene el servidor con {len(pending)} predicciones sin recibir")
+
+    def start(self, port=PORT, backlog=BACKLOG, reuse_port=False):
+        asyncio.run(self.serve(port, backlog, reuse_port))
+
+
+def run_acceptor(mode, port, backlog, reuse_port=False, queue=None):
+    """Atiende conexiones hasta recibir SIGINT o SIGTERM; con `reuse_port` comparte el puerto con otros acceptors.
+
+    `queue` es la cola del writer cuando el acceptor corre en otro proceso.
+    """
+    if queue is not None:
+        use_prediction_queue(queue)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # SIGTERM se detiene igual que Ctrl+C
+    server = AsyncImageServer() if mode == "async" else ImageServer()
+    try:
+        server.start(port, backlog, reuse_port)
+    except KeyboardInterrupt:
+        logger.info("Deteniendo servidor...")
+
+
+def supervise_acceptors(mode, port, backlog, workers):
+    """Lanza `workers` procesos acceptor con SO_REUSEPORT y los relanza si alguno muere.
+
+    Cada acceptor recibe la cola de predicciones como argumento (no depende de heredarla
+    con fork, así funciona también con spawn o forkserver) y todos alimentan al mismo
+    writer. Al recibir SIGINT o SIGTERM se les reenvía SIGTERM y se espera a que
+    terminen de entregar sus resultados.
+    """
+    def spawn(index):
+        process = multiprocessing.Process(target=run_acceptor, args=(mode, port, backlog, True, prediction_queue),
+                                          name=f"acceptor-{index}")
+        process.start()
+        return process
+
+    acceptors = [spawn(index) for index in range(workers)]
+    logger.info(f"{workers} acceptors ({mode}) compartiendo el puerto {port}")
+    try:
         while True:
-            conn, addr = self.server.accept()
-            threading.Thread(target=self.handle_client, args=(conn, addr), daemon=True).start()
+            multiprocessing.connection.wait([process.sentinel for process in acceptors])
+            for index, process in enumerate(acceptors):
+                if not process.is_alive():
+                    logger.error(f"El acceptor {process.name} terminó con código {process.exitcode}; se relanza")
+                    time.sleep(1)  # Evita relanzar en bucle si falla al arrancar
+                    acceptors[index] = spawn(index)
+    except KeyboardInterrupt:
+        logger.info("Deteniendo acceptors...")
+    finally:
+        for process in acceptors:
+            if process.is_alive():
+                process.terminate()
+        for process in acceptors:
+            process.join(SHUTDOWN_GRACE + 5)
+            if process.is_alive():
+                logger.warning(f"El acceptor {process.name} no terminó a tiempo")
+                process.kill()
+
 
 if __name__ == "__main__":
-    multiprocessing.Process(target=prediction_worker, args=(prediction_queue,), daemon=True).start()
-    multiprocessing.Process(target=history_worker, args=(history_queue,), daemon=True).start()
+    parser = argparse.ArgumentParser(description="Servidor de imágenes FarmEye")
+    parser.add_argument("--mode", choices=["async", "threaded"], default=SERVER_MODE, help="Modelo de concurrencia del servidor")
+    parser.add_argument("--port", type=int, default=PORT, help="Puerto de escucha")
+    parser.add_argument("--backlog", type=int, default=BACKLOG, help="Tamaño de la cola de conexiones pendientes")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Procesos acceptor que comparten el puerto (SO_REUSEPORT)")
+    args = parser.parse_args()
+
+    # Se espera a Redis al arrancar el servidor, no al importar los módulos
+    if not wait_for_redis():
+        raise SystemExit("No se pudo conectar a Redis")
+
+    # Un único writer para todos los acceptors
+    writer_process = multiprocessing.Process(target=prediction_worker, args=(prediction_queue, os.getpid()), daemon=True)
+    writer_process.start()
 
-    server = ImageServer()
-    server.start()
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # SIGTERM se detiene igual que Ctrl+C
+    try:
+        if args.workers > 1:
+            supervise_acceptors(args.mode, args.port, args.backlog, args.workers)
+        else:
+            run_acceptor(args.mode, args.port, args.backlog)
+    except KeyboardInterrupt:
+        logger.info("Deteniendo servidor...")
+    finally:
+        # Con los acceptors ya detenidos, el centinela hace que el writer guarde lo pendiente y salga
+        prediction_queue.put(None)
+        writer_process.join(timeout=10)
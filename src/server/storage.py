@@ -0,0 +1,278 @@
+"""Mantenimiento de IMAGE_FOLDER: particionado, compactación y retención de las imágenes subidas.
+
+Tres pasadas sobre la tabla `images`, por lotes en orden de id:
+
+- particionado: mueve los archivos de antes del particionado (IMAGE_FOLDER/<sha>.jpg) a
+  IMAGE_FOLDER/ab/cd/<sha>.jpg, donde el servidor ya guarda las subidas nuevas;
+- compactación: las imágenes con más de STORAGE_COMPACT_DAYS días se re-codifican a WebP
+  (<sha>.c.webp) junto con una miniatura (<sha>.t.webp) y se borra el original;
+- retención: pasados STORAGE_RETENTION_DAYS días se borra también la imagen y queda la miniatura.
+
+Un archivo compartido por varias filas (misma imagen subida dos veces) se procesa recién
+cuando la más nueva supera el plazo. Cada cambio escribe el archivo nuevo, actualiza
+`image_path` de las filas que lo usaban y recién después borra el anterior, bajo el mismo
+lock que usa el servidor para reutilizar un archivo duplicado y solo si ninguna fila lo
+sigue usando ni se reutilizó en los últimos STORAGE_REUSE_GRACE segundos. Los archivos por
+borrar y el avance de cada pasada se guardan en IMAGE_FOLDER/.storage_state.json, así que
+si el proceso se corta se repite el lote y se completa. La E/S se limita a
+STORAGE_MAX_BYTES_PER_SECOND:
+
+    cd src && python3 -m server.storage           # una vuelta cada STORAGE_INTERVAL segundos
+    cd src && python3 -m server.storage --once
+"""
+import json
+import os
+import time
+import argparse
+import logging
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from PIL import Image as PILImage
+from sqlalchemy import func, select, update
+from utils.blobstore import content_lock, shard_path
+from utils.database import session_scope
+from server.models import Image
+
+# Cargar variables desde .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FOLDER = os.getenv("IMAGE_FOLDER", "server/uploads/")
+STORAGE_COMPACT_DAYS = int(os.getenv("STORAGE_COMPACT_DAYS", 30))  # 0 desactiva la compactación
+STORAGE_RETENTION_DAYS = int(os.getenv("STORAGE_RETENTION_DAYS", 365))  # 0 conserva las imágenes para siempre
+STORAGE_WEBP_QUALITY = int(os.getenv("STORAGE_WEBP_QUALITY", 80))
+STORAGE_COMPACT_MAX_SIDE = int(os.getenv("STORAGE_COMPACT_MAX_SIDE", 1600))  # Lado mayor de la imagen compactada
+STORAGE_THUMB_SIZE = int(os.getenv("STORAGE_THUMB_SIZE", 256))
+STORAGE_BATCH_SIZE = int(os.getenv("STORAGE_BATCH_SIZE", 500))
+STORAGE_MAX_BYTES_PER_SECOND = int(os.getenv("STORAGE_MAX_BYTES_PER_SECOND", 20 * 2**20))  # Leídos + escritos; 0 sin límite
+STORAGE_INTERVAL = int(os.getenv("STORAGE_INTERVAL", 3600))  # Segundos entre vueltas
+STORAGE_REUSE_GRACE = int(os.getenv("STORAGE_REUSE_GRACE", 3600))  # No borrar archivos reutilizados hace menos segundos
+
+COMPACT_SUFFIX = ".c.webp"
+THUMB_SUFFIX = ".t.webp"
+STATE_FILE = ".storage_state.json"
+
+
+class IOThrottle:
+    """Duerme lo necesario para que los bytes procesados no superen `max_bytes_per_second` en promedio."""
+
+    def __init__(self, max_bytes_per_second=STORAGE_MAX_BYTES_PER_SECOND):
+        self.max_bytes_per_second = max_bytes_per_second
+        self.start = time.monotonic()
+        self.total = 0
+
+    def consume(self, nbytes):
+        if not self.max_bytes_per_second:
+            return
+        self.total += nbytes
+        delay = self.total / self.max_bytes_per_second - (time.monotonic() - self.start)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def stem(name):
+    """Hash de un archivo guardado, sin la extensión original ni los sufijos de compactación."""
+    for suffix in (COMPACT_SUFFIX, THUMB_SUFFIX):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return os.path.splitext(name)[0]
+
+
+def save_webp(img, path, quality):
+    """Escribe la imagen en WebP a un temporal y la mueve a `path`; devuelve los bytes escritos."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.part"
+    img.save(tmp_path, "WEBP", quality=quality, method=4)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def write_thumbnail(img, name, throttle):
+    thumb_path = shard_path(IMAGE_FOLDER, stem(name) + THUMB_SUFFIX)
+    if not os.path.exists(thumb_path):
+        thumb = img.copy()
+        thumb.thumbnail((STORAGE_THUMB_SIZE, STORAGE_THUMB_SIZE))
+        throttle.consume(save_webp(thumb, thumb_path, STORAGE_WEBP_QUALITY))
+    return thumb_path
+
+
+def shard_file(path, throttle):
+    """Pasada de particionado: ruta nueva de un archivo plano de IMAGE_FOLDER, o None si ya está particionado."""
+    name = os.path.basename(path)
+    if os.path.normpath(os.path.dirname(path)) != os.path.normpath(IMAGE_FOLDER):
+        return None
+    target = shard_path(IMAGE_FOLDER, name)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)  # Mismo disco: solo cambia la entrada de directorio
+    return target
+
+
+def compact_file(path, throttle):
+    """Pasada de compactación: WebP reducido más miniatura; devuelve la ruta del WebP."""
+    name = os.path.basename(path)
+    if name.endswith((COMPACT_SUFFIX, THUMB_SUFFIX)):
+        return None
+    target = shard_path(IMAGE_FOLDER, stem(name) + COMPACT_SUFFIX)
+    if os.path.exists(target) and os.path.exists(shard_path(IMAGE_FOLDER, stem(name) + THUMB_SUFFIX)):
+        return target  # Ya compactada en una vuelta que se cortó antes de actualizar la BD
+    throttle.consume(os.path.getsize(path))
+    with PILImage.open(path) as img:
+        img = img.convert("RGB")
+        if not os.path.exists(target):
+            compacted = img.copy()
+            if STORAGE_COMPACT_MAX_SIDE:
+                compacted.thumbnail((STORAGE_COMPACT_MAX_SIDE, STORAGE_COMPACT_MAX_SIDE))
+            throttle.consume(save_webp(compacted, target, STORAGE_WEBP_QUALITY))
+        write_thumbnail(img, name, throttle)
+    return target
+
+
+def expire_file(path, throttle):
+    """Pasada de retención: deja solo la miniatura (creándola si hace falta) y devuelve su ruta."""
+    name = os.path.basename(path)
+    if name.endswith(THUMB_SUFFIX):
+        return None
+    thumb_path = shard_path(IMAGE_FOLDER, stem(name) + THUMB_SUFFIX)
+    if not os.path.exists(thumb_path):
+        throttle.consume(os.path.getsize(path))
+        with PILImage.open(path) as img:
+            write_thumbnail(img.convert("RGB"), name, throttle)
+    return thumb_path
+
+
+def load_state():
+    try:
+        with open(os.path.join(IMAGE_FOLDER, STATE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(state):
+    path = os.path.join(IMAGE_FOLDER, STATE_FILE)
+    with open(f"{path}.part", "w") as f:
+        json.dump(state, f)
+    os.replace(f"{path}.part", path)
+
+
+def remove_unused(path):
+    """Borra `path` si ninguna imagen lo usa; devuelve False si hay que reintentarlo más tarde.
+
+    El servidor reutiliza un archivo duplicado tocando su fecha bajo `content_lock` y lo
+    registra en la BD poco después: un archivo tocado hace menos de STORAGE_REUSE_GRACE
+    segundos se conserva por si su fila todavía no llegó.
+    """
+    with session_scope() as db:
+        if db.execute(select(Image.id).where(Image.image_path == path).limit(1)).first():
+            return True  # La usa una subida más nueva; se procesa cuando esa cumpla el plazo
+    # El lock solo cubre la fecha y el borrado: una reutilización posterior a la consulta la actualiza
+    with content_lock(IMAGE_FOLDER, os.path.basename(path)):
+        try:
+            if time.time() - os.path.getmtime(path) < STORAGE_REUSE_GRACE:
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return True
+
+
+def remove_pending(state):
+    """Reintenta los borrados que quedaron pendientes; devuelve los que siguen pendientes."""
+    state["borrar"] = [path for path in state.get("borrar", []) if not remove_unused(path)]
+    save_state(state)
+    return state["borrar"]
+
+
+def relocate(old_path, new_path, state, cutoff=None):
+    """Apunta a `new_path` las imágenes que usaban `old_path` (subidas antes de `cutoff`) y borra el anterior.
+
+    El archivo viejo se anota en `state["borrar"]` antes de actualizar y se borra después del
+    commit, así que un corte en el medio no deja archivos huérfanos.
+    """
+    state.setdefault("borrar", []).append(old_path)
+    save_state(state)
+    query = update(Image).where(Image.image_path == old_path)
+    if cutoff is not None:
+        query = query.where(Image.uploaded_at < cutoff)
+    with session_scope() as db:
+        rows = db.execute(query.values(image_path=new_path)).rowcount
+    if os.path.exists(old_path) and not remove_unused(old_path):
+        logger.info(f"{old_path} se reutilizó hace poco; se borra en otra vuelta")
+        return rows
+    state["borrar"].remove(old_path)
+    save_state(state)
+    return rows
+
+
+def run_pass(name, process, state, throttle, cutoff=None, batch_size=STORAGE_BATCH_SIZE):
+    """Aplica `process` a las imágenes de id mayor al último guardado (y subidas antes de `cutoff`)."""
+    cursor = state.get(name, 0)
+    files = rows_updated = 0
+    while True:
+        query = select(Image.id, Image.image_path).where(Image.id > cursor).order_by(Image.id).limit(batch_size)
+        if cutoff is not None:
+            query = query.where(Image.uploaded_at < cutoff)
+        with session_scope() as db:
+            rows = db.execute(query).all()
+            paths = sorted({row.image_path for row in rows})
+            newest = {}
+            if cutoff is not None and paths:
+                newest = dict(db.execute(
+                    select(Image.image_path, func.max(Image.uploaded_at)).where(Image.image_path.in_(paths)).group_by(Image.image_path)
+                ).all())
+        if not rows:
+            break
+
+        for path in paths:
+            if cutoff is not None and newest.get(path) and newest[path] >= cutoff:
+                continue  # También la usa una subida más nueva; se procesa cuando esa cumpla el plazo
+            try:
+                new_path = process(path, throttle)
+            except OSError as e:  # Archivo faltante o ilegible
+                logger.warning(f"{name}: no se pudo procesar {path}: {e}")
+                continue
+            if new_path and new_path != path:
+                rows_updated += relocate(path, new_path, state, cutoff)
+                files += 1
+
+        cursor = rows[-1].id
+        state[name] = cursor
+        save_state(state)
+    if files:
+        logger.info(f"{name}: {files} archivos, {rows_updated} imágenes actualizadas (hasta el id {cursor})")
+    return files
+
+
+def run_once(throttle=None):
+    """Una vuelta de las tres pasadas; devuelve los archivos procesados por pasada."""
+    throttle = throttle or IOThrottle()
+    state = load_state()
+    remove_pending(state)
+    now = datetime.now()
+    processed = {"particionado": run_pass("particionado", shard_file, state, throttle)}
+    if STORAGE_COMPACT_DAYS:
+        processed["compactacion"] = run_pass("compactacion", compact_file, state, throttle,
+                                             now - timedelta(days=STORAGE_COMPACT_DAYS))
+    if STORAGE_RETENTION_DAYS:
+        processed["retencion"] = run_pass("retencion", expire_file, state, throttle,
+                                          now - timedelta(days=STORAGE_RETENTION_DAYS))
+    return processed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Particionado, compactación y retención de IMAGE_FOLDER")
+    parser.add_argument("--once", action="store_true", help="Hacer una sola vuelta y salir")
+    parser.add_argument("--reset", action="store_true", help="Volver a recorrer todas las imágenes desde el principio")
+    args = parser.parse_args()
+
+    os.makedirs(IMAGE_FOLDER, exist_ok=True)
+    if args.reset:
+        save_state({})
+    while True:
+        run_once()
+        if args.once:
+            break
+        time.sleep(STORAGE_INTERVAL)
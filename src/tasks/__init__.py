@@ -1,3 +1,9 @@
-from tasks.celery_config import celery
+def __getattr__(name):
+    # `celery -A tasks` encuentra la app, pero importar tasks.<módulo> no carga Celery
+    if name == "celery":
+        from tasks.celery_config import celery
+        return celery
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = ('celery',)
@@ -0,0 +1,251 @@
+"""Autoscaler de workers de Celery guiado por el p95 del tiempo hasta la predicción.
+
+Cada AUTOSCALE_INTERVAL segundos lee dos señales de Redis:
+
+- el p95 de la etapa AUTOSCALE_STAGE (por defecto `total`, del servidor) en la última
+  ventana, restando los histogramas acumulados de `utils.metrics`;
+- la espera estimada de la cola: mensajes pendientes (`queue_depth`) por el tiempo medio
+  de `inferencia` de la ventana, dividido por los procesos actuales.
+
+Si la mayor supera AUTOSCALE_TARGET_P95_MS durante AUTOSCALE_UP_AFTER ventanas seguidas,
+suma la mitad de los procesos (al menos uno); si aun repartida entre un proceso menos
+quedaría por debajo de AUTOSCALE_DOWN_RATIO del objetivo durante AUTOSCALE_DOWN_AFTER
+ventanas, quita uno. Tras cada cambio espera
+AUTOSCALE_COOLDOWN segundos y nunca sale de [AUTOSCALE_MIN, AUTOSCALE_MAX]. Dos formas de
+escalar:
+
+    cd src && python3 -m tasks.autoscaler --mode processes      # lanza workers -P solo locales
+    cd src && python3 -m tasks.autoscaler --mode pool --worker celery@host   # pool_grow/pool_shrink
+
+`--mode pool` necesita un worker prefork (el pool por defecto) y no debe combinarse con su
+opción `--autoscale`. El último estado queda en Redis, en `autoscaler:estado`.
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import argparse
+import logging
+from dotenv import load_dotenv
+import redis
+from tasks.celery_config import celery
+from tasks.scheduling import BULK_QUEUE, INTERACTIVE_QUEUE, queue_depth
+from utils.metrics import quantile, snapshot
+from utils.redis_client import get_redis
+
+# Cargar variables desde el .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+AUTOSCALE_TARGET_P95_MS = float(os.getenv("AUTOSCALE_TARGET_P95_MS", 5000))
+AUTOSCALE_STAGE = os.getenv("AUTOSCALE_STAGE", "total")  # Etapa de utils.metrics cuyo p95 se controla
+AUTOSCALE_MIN = int(os.getenv("AUTOSCALE_MIN", 1))
+AUTOSCALE_MAX = int(os.getenv("AUTOSCALE_MAX", os.cpu_count() or 1))
+AUTOSCALE_INTERVAL = float(os.getenv("AUTOSCALE_INTERVAL", 10))  # Segundos por ventana
+AUTOSCALE_UP_AFTER = int(os.getenv("AUTOSCALE_UP_AFTER", 2))  # Ventanas seguidas sobre el objetivo para crecer
+AUTOSCALE_DOWN_AFTER = int(os.getenv("AUTOSCALE_DOWN_AFTER", 6))  # Ventanas seguidas holgadas para achicar
+AUTOSCALE_DOWN_RATIO = float(os.getenv("AUTOSCALE_DOWN_RATIO", 0.5))  # Holgada: por debajo de esta fracción del objetivo
+AUTOSCALE_COOLDOWN = float(os.getenv("AUTOSCALE_COOLDOWN", 30))  # Segundos sin cambios después de escalar
+AUTOSCALE_MIN_SAMPLES = int(os.getenv("AUTOSCALE_MIN_SAMPLES", 5))  # Observaciones para confiar en el p95 de una ventana
+STATUS_KEY = "autoscaler:estado"
+
+
+class ScalingPolicy:
+    """Decide cuántos procesos usar a partir de la latencia observada, con histéresis y cooldown."""
+
+    def __init__(self, target_ms=AUTOSCALE_TARGET_P95_MS, minimum=AUTOSCALE_MIN, maximum=AUTOSCALE_MAX,
+                 up_after=AUTOSCALE_UP_AFTER, down_after=AUTOSCALE_DOWN_AFTER, down_ratio=AUTOSCALE_DOWN_RATIO,
+                 cooldown=AUTOSCALE_COOLDOWN):
+        self.target_ms = target_ms
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.up_after = up_after
+        self.down_after = down_after
+        self.down_ratio = down_ratio
+        self.cooldown = cooldown
+        self.above = self.below = 0
+        self.last_change = float("-inf")
+
+    def decide(self, current, latency_ms, now=None):
+        """Procesos deseados dado el actual y la peor latencia estimada (None: sin datos ni cola)."""
+        now = time.monotonic() if now is None else now
+        # Holgada solo si con un proceso menos (la misma carga repartida entre menos) seguiría holgada
+        projected_ms = latency_ms * current / (current - 1) if latency_ms is not None and current > 1 else latency_ms
+        if latency_ms is not None and latency_ms > self.target_ms:
+            self.above, self.below = self.above + 1, 0
+        elif latency_ms is None or projected_ms < self.target_ms * self.down_ratio:
+            self.above, self.below = 0, self.below + 1
+        else:
+            self.above = self.below = 0
+
+        desired = current
+        if now - self.last_change >= self.cooldown:
+            if self.above >= self.up_after:
+                desired = current + max(1, current // 2)
+            elif self.below >= self.down_after:
+                desired = current - 1
+        desired = min(self.maximum, max(self.minimum, desired))
+        if desired != current:
+            self.last_change = now
+            self.above = self.below = 0
+        return desired
+
+
+def window(previous, current):
+    """Histograma de una etapa entre dos `snapshot()`: (buckets acumulados como los usa `quantile`, count, suma en ms)."""
+    previous = previous or {}
+    old = {str(limit): total for limit, total in previous.get("buckets", [])}
+    buckets = [(float("inf") if limit == "+Inf" else limit, total - old.get(str(limit), 0))
+               for limit, total in current.get("buckets", [])]
+    return buckets, current.get("count", 0) - previous.get("count", 0), current.get("sum_ms", 0) - previous.get("sum_ms", 0)
+
+
+class CeleryPoolScaler:
+    """Agranda o achica el pool prefork de workers ya levantados con pool_grow/pool_shrink."""
+
+    def __init__(self, destination=None):
+        self.destination = [destination] if destination else None
+        stats = celery.control.inspect(destination=self.destination, timeout=2).stats() or {}
+        if not stats:
+            raise RuntimeError("Ningún worker de Celery respondió a inspect stats")
+        # Con varios workers se ajustan todos por igual; se parte del más chico. `max-concurrency`
+        # queda en el valor de -c, los procesos reales son los de `processes`
+        self.current = min(len(data["pool"]["processes"]) for data in stats.values())
+        logger.info(f"Workers {sorted(stats)} con {self.current} procesos")
+
+    def resize(self, target):
+        if target > self.current:
+            replies = celery.control.pool_grow(target - self.current, destination=self.destination, reply=True)
+        else:
+            replies = celery.control.pool_shrink(self.current - target, destination=self.destination, reply=True)
+        for reply in replies or []:
+            for worker, answer in reply.items():
+                if "error" in answer:
+                    raise RuntimeError(f"{worker} no pudo cambiar su pool: {answer['error']}")
+        self.current = target
+
+    def close(self):
+        pass
+
+
+class LocalWorkerScaler:
+    """Un worker `-P solo` (un proceso con su modelo cargado) por unidad de concurrencia, en esta máquina."""
+
+    def __init__(self, queues=f"{INTERACTIVE_QUEUE},{BULK_QUEUE}", extra_args=()):
+        self.queues = queues
+        self.extra_args = list(extra_args)
+        self.processes = []
+        self.stopping = []  # Workers terminando su última tarea
+        self.spawned = 0
+
+    @property
+    def current(self):
+        for process in [p for p in self.processes if p.poll() is not None]:
+            logger.warning(f"El worker {process.pid} terminó con código {process.returncode}")
+            self.processes.remove(process)
+        self.stopping = [process for process in self.stopping if process.poll() is None]
+        return len(self.processes)
+
+    def resize(self, target):
+        while len(self.processes) < target:
+            self.spawned += 1
+            command = [sys.executable, "-m", "celery", "-A", "tasks.celery_config", "worker", "-P", "solo",
+                       "-Q", self.queues, "-n", f"autoscaler-{os.getpid()}-{self.spawned}@%h", *self.extra_args]
+            self.processes.append(subprocess.Popen(command))
+        while len(self.processes) > target:
+            # SIGTERM: apagado en caliente, termina la tarea en curso (y con acks tardíos no se pierde nada)
+            process = self.processes.pop()
+            process.send_signal(signal.SIGTERM)
+            self.stopping.append(process)
+
+    def close(self):
+        self.resize(0)
+        for process in self.stopping:
+            try:
+                process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.stopping = []
+
+
+class Autoscaler:
+    """Lazo de control: mide una ventana, decide con la política y ajusta el scaler."""
+
+    def __init__(self, scaler, policy=None, stage=AUTOSCALE_STAGE, interval=AUTOSCALE_INTERVAL):
+        self.scaler = scaler
+        self.policy = policy or ScalingPolicy()
+        self.stage = stage
+        self.interval = interval
+        self.previous = snapshot()
+        self.inference_ms = None  # Último tiempo medio de inferencia conocido
+
+    def measure(self, current):
+        """p95 de la etapa en la ventana, espera estimada de la cola repartida entre `current` procesos y su profundidad."""
+        stages = snapshot()
+        buckets, count, _ = window(self.previous.get(self.stage), stages.get(self.stage, {}))
+        _, inferences, inference_sum = window(self.previous.get("inferencia"), stages.get("inferencia", {}))
+        self.previous = stages
+
+        p95_ms = quantile(buckets, count, 0.95) if count >= AUTOSCALE_MIN_SAMPLES else None
+        if inferences:
+            self.inference_ms = inference_sum / inferences
+
+        depth = queue_depth()
+        if depth and not current:
+            backlog_ms = float("inf")  # Hay cola y ningún proceso
+        elif depth and self.inference_ms:
+            backlog_ms = depth * self.inference_ms / current
+        else:
+            backlog_ms = None
+        return p95_ms, backlog_ms, depth
+
+    def step(self):
+        current = self.scaler.current  # Una sola lectura por ventana: en LocalWorkerScaler también recoge workers caídos
+        p95_ms, backlog_ms, depth = self.measure(current)
+        signals = [value for value in (p95_ms, backlog_ms) if value is not None]
+        target = self.policy.decide(current, max(signals) if signals else None)
+        if target != current:
+            logger.info(f"Escalando de {current} a {target} procesos (p95 {p95_ms} ms, espera de cola {backlog_ms} ms, "
+                        f"{depth} en cola)")
+            self.scaler.resize(target)
+        status = {"workers": target, "target_ms": self.policy.target_ms, "p95_ms": p95_ms, "backlog_ms": backlog_ms,
+                  "depth": depth, "timestamp": time.time()}
+        try:
+            get_redis().set(STATUS_KEY, json.dumps(status), ex=max(60, int(self.interval * 3)))
+        except redis.RedisError as e:
+            logger.warning(f"No se pudo publicar el estado del autoscaler: {e}")
+        return status
+
+    def run(self):
+        if not self.policy.minimum <= self.scaler.current <= self.policy.maximum:
+            self.scaler.resize(min(self.policy.maximum, max(self.policy.minimum, self.scaler.current)))
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.step()
+            except redis.RedisError as e:
+                logger.warning(f"Sin métricas de Redis en esta ventana: {e}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Autoscaler de workers de Celery por p95 del tiempo hasta la predicción")
+    parser.add_argument("--mode", choices=["processes", "pool"], default="processes")
+    parser.add_argument("--worker", default=None, help="Con --mode pool: nombre del worker (por defecto todos)")
+    parser.add_argument("--queues", default=f"{INTERACTIVE_QUEUE},{BULK_QUEUE}", help="Con --mode processes: colas de los workers")
+    parser.add_argument("--target-ms", type=float, default=AUTOSCALE_TARGET_P95_MS)
+    parser.add_argument("--min", type=int, default=AUTOSCALE_MIN)
+    parser.add_argument("--max", type=int, default=AUTOSCALE_MAX)
+    args = parser.parse_args()
+
+    scaler = CeleryPoolScaler(args.worker) if args.mode == "pool" else LocalWorkerScaler(args.queues, ["--loglevel=warning"])
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        Autoscaler(scaler, ScalingPolicy(args.target_ms, args.min, args.max)).run()
+    except KeyboardInterrupt:
+        logger.info("Autoscaler detenido")
+    finally:
+        scaler.close()
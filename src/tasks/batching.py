@@ -0,0 +1,92 @@
+"""Etapa de micro-batching: agrupa imágenes pendientes y las infiere en una sola pasada.
+
+El servidor encola cada imagen en una lista de Redis (INFERENCE_BATCHING=1); este proceso
+junta hasta BATCH_MAX_SIZE imágenes o lo que llegue en BATCH_MAX_WAIT_MS y envía el lote
+a los workers de Celery como una única tarea:
+
+    cd src && python3 -m tasks.batching
+"""
+import json
+import os
+import time
+import logging
+from dotenv import load_dotenv
+from tasks.celery_config import celery
+from utils.redis_client import get_redis
+
+# Cargar variables desde el .env
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "false").lower() in ("1", "true", "yes")
+BATCH_QUEUE_KEY = os.getenv("BATCH_QUEUE_KEY", "imagenes:pendientes")
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 50))
+
+
+def enqueue_image(image_key, user_id, task_id, trace_id=None, route=None):
+    """Deja una imagen pendiente para el próximo lote; `route` es la cola y prioridad de `scheduling.route_image`."""
+    item = {"image_key": image_key, "user_id": user_id, "task_id": task_id, "trace_id": trace_id,
+            "enqueued_at": time.time(), **(route or {})}
+    get_redis(decode_responses=True).rpush(BATCH_QUEUE_KEY, json.dumps(item))
+
+
+class MicroBatcher:
+    """Junta elementos de `fetch` hasta `max_batch_size` o `max_wait` segundos y se los pasa a `handle_batch`.
+
+    `fetch(timeout)` devuelve un elemento o None si no llegó nada en ese tiempo
+    (timeout <= 0 significa no bloquear).
+    """
+
+    def __init__(self, fetch, handle_batch, max_batch_size=BATCH_MAX_SIZE, max_wait=BATCH_MAX_WAIT_MS / 1000):
+        self.fetch = fetch
+        self.handle_batch = handle_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+    def collect(self, idle_timeout=1.0):
+        first = self.fetch(idle_timeout)
+        if first is None:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            item = self.fetch(deadline - time.monotonic())
+            if item is None:
+                break
+            batch.append(item)
+        return batch
+
+    def run(self, should_stop=lambda: False):
+        while not should_stop():
+            batch = self.collect()
+            if batch:
+                self.handle_batch(batch)
+
+
+def fetch_from_redis(timeout):
+    if timeout <= 0:
+        data = get_redis(decode_responses=True).lpop(BATCH_QUEUE_KEY)
+    else:
+        popped = get_redis(decode_responses=True).blpop(BATCH_QUEUE_KEY, timeout=timeout)
+        data = popped[1] if popped else None
+    return json.loads(data) if data else None
+
+
+def dispatch_batch(batch):
+    """Envía el lote como una tarea por cola (interactive/bulk), con la prioridad más alta de sus imágenes."""
+    by_queue = {}
+    for item in batch:
+        by_queue.setdefault(item.get("queue", celery.conf.task_default_queue), []).append(item)
+    for queue, items in by_queue.items():
+        priority = min(item.get("priority", 0) for item in items)  # En Redis 0 es la prioridad más alta
+        celery.send_task("tasks.image_processing.process_image_batch_task", args=(items,), queue=queue, priority=priority)
+        logger.info(f"Lote de {len(items)} imágenes enviado a {queue} (prioridad {priority})")
+
+
+if __name__ == "__main__":
+    logger.info(f"Micro-batching iniciado (máx. {BATCH_MAX_SIZE} imágenes, espera máx. {BATCH_MAX_WAIT_MS} ms)")
+    MicroBatcher(fetch_from_redis, dispatch_batch).run()
@@ -1,33 +1,25 @@
 from celery import Celery
+from kombu import Queue
+import os
 import logging
-import redis
-from redis.exceptions import ConnectionError
-import time
+from dotenv import load_dotenv
+
+# Cargar variables desde el .env
+load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def wait_for_redis(max_retries=5, retry_delay=2):
-    """Espera hasta que Redis esté disponible"""
-    for attempt in range(max_retries):
-        try:
-            redis_client = redis.Redis(host='localhost', port=6379, db=0)
-            redis_client.ping()
-            logger.info("Conexión exitosa con Redis")
-            return True
-        except ConnectionError as e:
-            logger.warning(f"Intento {attempt + 1}/{max_retries}: No se puede conectar a Redis. Reintentando en {retry_delay} segundos...")
-            time.sleep(retry_delay)
-    return False
-if not wait_for_redis():
-    logger.error("No se pudo establecer conexión con Redis después de varios intentos")
-    raise ConnectionError("No se pudo conectar a Redis")
+# Broker y backend desde el .env; Celery no se conecta hasta enviar o consumir la primera tarea
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", REDIS_URL)
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", REDIS_URL)
 
 # Configuración de Celery
 celery = Celery(
     'tasks',
-    broker='redis://localhost:6379/0',
-    backend='redis://localhost:6379/0',
+    broker=CELERY_BROKER_URL,
+    backend=CELERY_RESULT_BACKEND,
     include=['tasks.image_processing']
 )
 
@@ -39,5 +31,18 @@ celery.conf.update(
     broker_connection_retry=True,
     broker_connection_retry_on_startup=True,
     broker_connection_max_retries=10,
-    broker_connection_timeout=5
+    broker_connection_timeout=5,
+    # Colas: el servidor decide si una imagen es interactiva o parte de una importación masiva
+    task_queues=(Queue('interactive', routing_key='interactive'), Queue('bulk', routing_key='bulk')),
+    task_default_queue='interactive',
+    broker_transport_options={
+        'priority_steps': list(range(10)),  # 0 es la prioridad más alta en Redis
+        'sep': ':',
+        'queue_order_strategy': 'priority',  # Con -Q interactive,bulk se vacía primero interactive
+        'visibility_timeout': 3600,
+    },
+    # Tareas largas: un mensaje por proceso y ack al terminar (se reencola si el worker muere)
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True
 )
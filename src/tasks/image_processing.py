@@ -1,54 +1,231 @@
+import functools
 import json
 import os
 import time
-import random
 from collections import Counter
+from contextlib import ExitStack
 import logging
+import numpy as np
+from celery.signals import worker_process_init
 from dotenv import load_dotenv
-import redis
 from tasks.celery_config import celery
+from tasks.model import LABELS, get_runner
+from tasks.scheduling import release_image
+from tasks.preprocessing import augment, load_image
+from utils.blobstore import get_blob_store
+from utils.metrics import Trace
+from utils.redis_client import get_redis
 
 # Cargar variables desde el .env
 load_dotenv()
 
 # Configuración de Redis desde .env
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-REDIS_HOST = REDIS_URL.split("//")[-1].split(":")[0]
-REDIS_PORT = int(REDIS_URL.split(":")[-1].split("/")[0])
 REDIS_CHANNEL = os.getenv("REDIS_CHANNEL", "resultados")
+NUM_REPEATS = int(os.getenv("NUM_REPEATS", 5))  # Variantes de test-time augmentation por imagen
+CONSENSUS_MODE = os.getenv("CONSENSUS_MODE", "fixed")  # fixed: siempre NUM_REPEATS, adaptive: corta al haber mayoría
+CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", 0))  # Probabilidad media para cortar antes (0 desactiva)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-@celery.task
-def process_image_task(image_path: str, user_id: int):
-    """Simula el procesamiento de imágenes y publica el resultado en Redis."""
-    num_repeats = 5
-    labels = {0: "Sano", 1: "Posible Enfermedad", 2: "Enfermo"}
-    results = []
+@worker_process_init.connect
+def load_model_on_worker_start(**kwargs):
+    """Carga el modelo una sola vez en cada proceso del pool, antes de recibir tareas."""
+    get_runner()
 
-    for _ in range(num_repeats):
-        time.sleep(1)  # Simula procesamiento
-        prediction = random.choice([0, 1, 2])
-        results.append(prediction)
 
-    # Determinar la predicción final y su confianza
+def vote(results):
+    """Predicción final por mayoría y su confianza: acuerdo entre las variantes evaluadas (`details`)."""
     final_prediction, count = Counter(results).most_common(1)[0]
-    confidence = (count / num_repeats) * 100
-    result = {
-        "image": image_path,
-        "final_result": labels[final_prediction],
+    confidence = (count / len(results)) * 100
+    return {
+        "final_result": LABELS[final_prediction],
         "confidence": round(confidence, 2),
         "details": results,
-        "user_id": user_id
     }
 
-    # Publicar el resultado en un canal único para cada usuario
+
+def is_decided(probabilities, num_repeats):
+    """True si las variantes restantes ya no pueden cambiar la mayoría o se alcanzó el umbral de confianza."""
+    counts = np.bincount(probabilities.argmax(axis=1), minlength=probabilities.shape[1])
+    leader, runner_up = np.sort(counts)[::-1][:2]
+    if leader - runner_up > num_repeats - len(probabilities):
+        return True
+    best = counts.argmax()
+    return CONFIDENCE_THRESHOLD > 0 and probabilities[:, best].mean() >= CONFIDENCE_THRESHOLD
+
+
+def predict_adaptive(runner, images, num_repeats):
+    """Votos de TTA en modo adaptive para varias imágenes, en dos lotes como mucho.
+
+    El primero tiene las variantes justas para formar mayoría de todas las imágenes; el
+    segundo, las variantes restantes de las que no quedaron decididas.
+    """
+    majority = num_repeats // 2 + 1
+    first = runner.predict(np.stack([augment(image, index) for image in images for index in range(majority)]))
+    probabilities = [first[position * majority:(position + 1) * majority] for position in range(len(images))]
+    pending = [position for position, votes in enumerate(probabilities) if not is_decided(votes, num_repeats)]
+    if pending and num_repeats > majority:
+        remaining = num_repeats - majority
+        rest = runner.predict(np.stack([augment(images[position], index)
+                                        for position in pending for index in range(majority, num_repeats)]))
+        for offset, position in enumerate(pending):
+            probabilities[position] = np.concatenate([probabilities[position], rest[offset * remaining:(offset + 1) * remaining]])
+    return [votes.argmax(axis=1).tolist() for votes in probabilities]
+
+
+def classify_image(source, num_repeats=NUM_REPEATS, mode=None):
+    """Una predicción por cada variante de TTA y voto por mayoría.
+
+    En modo adaptive se evalúan primero las variantes justas para formar mayoría, en un solo
+    lote; si coinciden (o superan CONFIDENCE_THRESHOLD) no se corre el resto, y si no, las
+    restantes van juntas en un segundo lote. `details` tiene una entrada por variante evaluada
+    y la confianza es el acuerdo entre ellas: 3 de 3 es 100%, igual que 5 de 5 en modo fixed.
+    `source` es una ruta o un archivo abierto.
+    """
+    runner = get_runner()
+    image = load_image(source, runner.input_size)
+
+    if (mode or CONSENSUS_MODE) == "adaptive":
+        return vote(predict_adaptive(runner, [image], num_repeats)[0])
+
+    results = []
+    for index in range(num_repeats):
+        probabilities = runner.predict(augment(image, index)[np.newaxis])
+        results.append(int(probabilities[0].argmax()))
+
+    return vote(results)
+
+
+def classify_batch(sources, num_repeats=NUM_REPEATS, mode=None):
+    """Clasifica varias imágenes con una sola pasada del modelo sobre todas sus variantes de TTA.
+
+    En modo adaptive (CONSENSUS_MODE) son dos pasadas, como en `classify_image`, y la segunda
+    solo lleva las imágenes que no quedaron decididas con la primera.
+    """
+    runner = get_runner()
+    images = [load_image(source, runner.input_size) for source in sources]
+    if (mode or CONSENSUS_MODE) == "adaptive":
+        return [vote(results) for results in predict_adaptive(runner, images, num_repeats)]
+    batch = np.stack([augment(image, index) for image in images for index in range(num_repeats)])
+    predictions = runner.predict(batch).argmax(axis=1).reshape(len(images), num_repeats)
+    return [vote(row.tolist()) for row in predictions]
+
+
+def aggregate_frames(classifications):
+    """Predicción de una ráfaga: mayoría sobre las variantes de TTA de todos sus frames."""
+    details = [result for classification in classifications for result in classification["details"]]
+    return {**vote(details), "frame_results": [classification["final_result"] for classification in classifications]}
+
+
+def publish_result(user_id, result):
+    """Publica el resultado en un canal único para cada usuario."""
     try:
-        r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+        r = get_redis()
         user_channel = f"resultados:{user_id}"  # Canal basado en user_id
         r.publish(user_channel, json.dumps(result))
         logger.info(f"Resultado publicado en Redis en {user_channel}: {result}")
     except Exception as e:
         logger.error(f"No se pudo publicar el resultado en Redis: {e}")
+
+
+def build_result(classify, image_key, user_id, task_id, trace_id):
+    """Resultado a publicar con lo que devuelve `classify()`.
+
+    Si la clasificación falla (imagen ilegible, ausente en el almacenamiento, ...) el resultado
+    es un error con el mismo task_id, así el servidor responde al cliente en lugar de esperar
+    hasta RESULT_TIMEOUT.
+    """
+    try:
+        classification = classify()
+    except Exception as e:
+        logger.exception(f"No se pudo procesar {image_key} (tarea {task_id})")
+        classification = {"status": "error", "message": f"No se pudo procesar la imagen ({type(e).__name__})"}
+    return {"image": image_key, **classification, "user_id": user_id, "task_id": task_id, "trace_id": trace_id}
+
+
+def classify_stored(store, image_key):
+    with store.open(image_key) as image:
+        return classify_batch([image])[0]
+
+
+@celery.task(bind=True)
+def process_image_task(self, image_key: str, user_id: int):
+    """Pide la imagen al almacenamiento, la clasifica con el modelo del worker y publica el resultado en Redis."""
+    # trace_id y enqueued_at llegan en los headers de la tarea (ver tasks.scheduling.submit_image)
+    trace = Trace(self.request.get("trace_id"))
+    enqueued_at = self.request.get("enqueued_at")
+    if enqueued_at:
+        trace.add("espera_cola", max(0.0, (time.time() - enqueued_at) * 1000))
+
+    def classify():
+        with trace.stage("inferencia"), get_blob_store().open(image_key) as image:
+            return classify_image(image)
+
+    try:
+        result = build_result(classify, image_key, user_id, self.request.id, trace.trace_id)
+        with trace.stage("publicacion"):
+            publish_result(user_id, result)
+        trace.finish()
+    finally:
+        release_image(user_id)
+
+
+@celery.task
+def process_image_batch_task(items):
+    """Infere un lote armado por tasks.batching y publica cada resultado en el canal de su usuario.
+
+    Si el lote falla (p. ej. una imagen ilegible) cada imagen se clasifica por separado, así
+    solo las que fallan vuelven con error.
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    store = get_blob_store()
+    try:
+        with ExitStack() as stack:
+            images = [stack.enter_context(store.open(item["image_key"])) for item in items]
+            results = classify_batch(images)
+    except Exception:
+        logger.exception(f"Falló el lote de {len(items)} imágenes; se clasifican por separado")
+        results = [None] * len(items)
+    inference_ms = (time.perf_counter() - start) * 1000
+
+    for item, classification in zip(items, results):
+        try:
+            trace = Trace(item.get("trace_id"))
+            trace.add("espera_cola", max(0.0, (started_at - item["enqueued_at"]) * 1000))
+            trace.add("inferencia", inference_ms)
+            if classification is None:
+                classify = functools.partial(classify_stored, store, item["image_key"])
+            else:
+                classify = lambda: classification  # Se llama en esta misma iteración
+            result = build_result(classify, item["image_key"], item["user_id"], item["task_id"], trace.trace_id)
+            with trace.stage("publicacion"):
+                publish_result(item["user_id"], result)
+            trace.finish()
+        finally:
+            release_image(item["user_id"])
+
+
+@celery.task(bind=True)
+def process_burst_task(self, image_keys, user_id: int):
+    """Clasifica en un solo lote los frames distintos de una ráfaga y publica una predicción agregada."""
+    trace = Trace(self.request.get("trace_id"))
+    enqueued_at = self.request.get("enqueued_at")
+    if enqueued_at:
+        trace.add("espera_cola", max(0.0, (time.time() - enqueued_at) * 1000))
+    store = get_blob_store()
+
+    def classify():
+        with trace.stage("inferencia"), ExitStack() as stack:
+            images = [stack.enter_context(store.open(image_key)) for image_key in image_keys]
+            return {**aggregate_frames(classify_batch(images)), "frames": len(image_keys)}
+
+    try:
+        result = build_result(classify, image_keys[0], user_id, self.request.id, trace.trace_id)
+        with trace.stage("publicacion"):
+            publish_result(user_id, result)
+        trace.finish()
+    finally:
+        release_image(user_id)
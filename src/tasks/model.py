@@ -0,0 +1,91 @@
+import importlib
+import os
+import time
+import logging
+import numpy as np
+from dotenv import load_dotenv
+from tasks.preprocessing import MODEL_INPUT_SIZE, normalize
+
+# Cargar variables desde el .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MODEL_FACTORY = os.getenv("MODEL_FACTORY")  # "paquete.modulo:funcion" que devuelve el modelo
+MODEL_PATH = os.getenv("MODEL_PATH")  # Pesos .npz para el modelo lineal de referencia
+LABELS = {0: "Sano", 1: "Posible Enfermedad", 2: "Enfermo"}
+
+
+class LinearColorModel:
+    """Modelo de referencia: regresión softmax sobre estadísticas de color por canal.
+
+    Sirve mientras no haya un modelo entrenado enchufado con MODEL_FACTORY. Cualquier modelo
+    debe exponer `predict(batch)` con batch float32 (N, H, W, 3) normalizado y devolver
+    probabilidades (N, len(LABELS)).
+    """
+
+    # Pesos por defecto (6 features: media y desvío de R, G, B)
+    DEFAULT_WEIGHTS = np.array([
+        [0.8, -0.2, -0.6],
+        [1.0, 0.1, -1.1],
+        [0.3, 0.1, -0.4],
+        [-0.9, 0.2, 0.7],
+        [-0.4, 0.3, 0.1],
+        [-0.2, 0.1, 0.1],
+    ], dtype=np.float32)
+    DEFAULT_BIAS = np.array([0.1, 0.0, -0.1], dtype=np.float32)
+
+    def __init__(self, weights=None, bias=None):
+        self.weights = self.DEFAULT_WEIGHTS if weights is None else weights
+        self.bias = self.DEFAULT_BIAS if bias is None else bias
+
+    @classmethod
+    def from_file(cls, path):
+        data = np.load(path)
+        return cls(data["weights"].astype(np.float32), data["bias"].astype(np.float32))
+
+    def predict(self, batch):
+        # Media y desvío por canal en una pasada: E[x] y E[x²] sobre los píxeles aplanados
+        pixels = batch.reshape(len(batch), -1, batch.shape[-1])
+        mean = pixels.mean(axis=1)
+        mean_sq = np.einsum("npc,npc->nc", pixels, pixels) / pixels.shape[1]
+        features = np.concatenate([mean, np.sqrt(np.maximum(mean_sq - mean * mean, 0))], axis=1)
+        logits = features @ self.weights + self.bias
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+def load_model():
+    """Carga el modelo configurado: MODEL_FACTORY, pesos en MODEL_PATH o el modelo de referencia."""
+    if MODEL_FACTORY:
+        module_name, _, attribute = MODEL_FACTORY.partition(":")
+        return getattr(importlib.import_module(module_name), attribute)()
+    if MODEL_PATH:
+        return LinearColorModel.from_file(MODEL_PATH)
+    return LinearColorModel()
+
+
+class ModelRunner:
+    """Modelo cargado una vez por proceso worker, con normalización vectorizada."""
+
+    def __init__(self, model, input_size=MODEL_INPUT_SIZE):
+        self.model = model
+        self.input_size = input_size
+
+    def predict(self, batch):
+        """Probabilidades para un lote uint8 (N, H, W, 3)."""
+        return np.asarray(self.model.predict(normalize(batch)))
+
+
+_runner = None
+
+
+def get_runner():
+    """Devuelve el runner del proceso, cargando el modelo la primera vez."""
+    global _runner
+    if _runner is None:
+        start = time.perf_counter()
+        _runner = ModelRunner(load_model())
+        logger.info(f"Modelo cargado en {time.perf_counter() - start:.2f}s (pid {os.getpid()})")
+    return _runner
@@ -0,0 +1,49 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image
+
+# Cargar variables desde el .env
+load_dotenv()
+
+MODEL_INPUT_SIZE = int(os.getenv("MODEL_INPUT_SIZE", 224))
+
+# Normalización por canal (valores de ImageNet, usados por la mayoría de los modelos preentrenados)
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+# (x / 255 - MEAN) / STD == x * SCALE + OFFSET: dos pasadas sobre el lote en lugar de cuatro
+SCALE = (1 / (255.0 * STD)).astype(np.float32)
+OFFSET = (-MEAN / STD).astype(np.float32)
+
+
+def load_image(source, size=MODEL_INPUT_SIZE):
+    """Decodifica una imagen reducida a size x size como array uint8 (H, W, 3).
+
+    `draft` hace que los JPEG se decodifiquen directamente a una escala menor (1/2, 1/4, 1/8)
+    y `reducing_gap` reduce por bloques antes del remuestreo final, así una foto de cámara
+    nunca se decodifica ni se copia a resolución completa.
+    """
+    with Image.open(source) as img:
+        img.draft("RGB", (size, size))
+        img = img.convert("RGB").resize((size, size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        return np.asarray(img, dtype=np.uint8)
+
+
+def normalize(batch):
+    """Convierte un lote uint8 (N, H, W, 3) a float32 normalizado, sin bucles en Python."""
+    normalized = batch.astype(np.float32)
+    normalized *= SCALE
+    normalized += OFFSET
+    return normalized
+
+
+def augment(image, index):
+    """Variante `index` de test-time augmentation (vistas sin copia del array original)."""
+    variants = (
+        lambda a: a,
+        lambda a: a[:, ::-1],
+        lambda a: a[::-1, :],
+        lambda a: a[::-1, ::-1],
+        lambda a: a.transpose(1, 0, 2),
+    )
+    return variants[index % len(variants)](image)
@@ -0,0 +1,106 @@
+import os
+import time
+import logging
+from dotenv import load_dotenv
+import redis
+from tasks.batching import BATCH_QUEUE_KEY, INFERENCE_BATCHING, enqueue_image
+from tasks.celery_config import celery
+from utils.blobstore import get_blob_store
+from utils.redis_client import get_redis
+
+# Cargar variables desde el .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE_QUEUE = "interactive"
+BULK_QUEUE = "bulk"
+BULK_THRESHOLD = int(os.getenv("BULK_THRESHOLD", 20))  # Imágenes pendientes de un usuario antes de pasar a bulk
+FAIR_SHARE_STEP = int(os.getenv("FAIR_SHARE_STEP", 10))  # Cada tantas imágenes pendientes baja un nivel de prioridad
+MAX_PRIORITY = 9  # En Redis 0 es la prioridad más alta
+
+
+def pending_key(user_id):
+    return f"pendientes:{user_id}"
+
+
+def add_pending(user_id):
+    """Suma una imagen pendiente del usuario (la descuenta `release_image`); devuelve cuántas tiene."""
+    try:
+        pipe = get_redis(decode_responses=True).pipeline()
+        pipe.incr(pending_key(user_id))
+        pipe.expire(pending_key(user_id), 6 * 3600)
+        return pipe.execute()[0]
+    except redis.RedisError as e:
+        logger.warning(f"No se pudo contar imágenes pendientes de {user_id}: {e}")
+        return 1
+
+
+def route_image(user_id, bulk=False):
+    """Decide cola y prioridad de una imagen nueva.
+
+    Las importaciones masivas (marcadas por el cliente o detectadas por tener más de
+    BULK_THRESHOLD imágenes pendientes) van a la cola bulk. Dentro de cada cola, cuantas
+    más imágenes pendientes tiene un usuario, menor es la prioridad de las siguientes:
+    los usuarios con pocas imágenes se intercalan con los que tienen miles.
+    """
+    pending = add_pending(user_id)
+    queue = BULK_QUEUE if bulk or pending > BULK_THRESHOLD else INTERACTIVE_QUEUE
+    priority = min(MAX_PRIORITY, (pending - 1) // FAIR_SHARE_STEP)
+    return {"queue": queue, "priority": priority}
+
+
+def release_image(user_id):
+    """Descuenta una imagen pendiente del usuario cuando su resultado ya se publicó."""
+    try:
+        if get_redis(decode_responses=True).decr(pending_key(user_id)) <= 0:
+            get_redis(decode_responses=True).delete(pending_key(user_id))
+    except redis.RedisError as e:
+        logger.warning(f"No se pudo descontar imagen pendiente de {user_id}: {e}")
+
+
+def queue_keys():
+    """Listas de Redis donde esperan las imágenes: cada cola de Celery con sus subcolas de
+    prioridad (`interactive`, `interactive:1`, ...) y la lista de la etapa de batching."""
+    keys = [BATCH_QUEUE_KEY]
+    for queue in (INTERACTIVE_QUEUE, BULK_QUEUE):
+        keys += [queue] + [f"{queue}:{priority}" for priority in range(1, MAX_PRIORITY + 1)]
+    return keys
+
+
+def queue_depth():
+    """Mensajes esperando inferencia en todas las colas, en un solo viaje a Redis."""
+    pipe = get_redis().pipeline(transaction=False)
+    for key in queue_keys():
+        pipe.llen(key)
+    return sum(pipe.execute())
+
+
+def submit_image(image_path, user_id, task_id, bulk=False, trace_id=None):
+    """Publica la imagen en el almacenamiento y la encola para inferencia por su clave:
+    tarea individual de Celery o etapa de micro-batching. En los dos casos la imagen cuenta
+    como pendiente del usuario hasta que la tarea llama a `release_image`, y su cola y
+    prioridad salen de `route_image` (el lote las toma de sus imágenes).
+
+    La tarea se envía por nombre, así el servidor no importa el código de inferencia; el
+    trace id y la hora de encolado viajan en los headers para medir la espera en la cola.
+    """
+    image_key = get_blob_store().put(image_path)
+    if INFERENCE_BATCHING:
+        enqueue_image(image_key, user_id, task_id, trace_id, route_image(user_id, bulk))
+    else:
+        celery.send_task("tasks.image_processing.process_image_task", args=(image_key, user_id),
+                         task_id=task_id, headers={"trace_id": trace_id, "enqueued_at": time.time()},
+                         **route_image(user_id, bulk))
+
+
+def submit_burst(image_paths, user_id, task_id, bulk=False, trace_id=None):
+    """Encola los frames distintos de una ráfaga como una única tarea que devuelve una predicción agregada.
+
+    Las ráfagas no pasan por la etapa de micro-batching: la tarea ya infiere todos sus frames en un lote.
+    """
+    store = get_blob_store()
+    image_keys = [store.put(image_path) for image_path in image_paths]
+    celery.send_task("tasks.image_processing.process_burst_task", args=(image_keys, user_id),
+                     task_id=task_id, headers={"trace_id": trace_id, "enqueued_at": time.time()},
+                     **route_image(user_id, bulk))
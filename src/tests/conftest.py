@@ -0,0 +1,5 @@
+"""Los módulos se importan como desde src/ (`utils.…`, `server.…`), igual que al ejecutarlos."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,48 @@
+import pytest
+from server import admission
+
+
+@pytest.mark.parametrize("file_size", [-1, "100", 1.5, None, True])
+def test_check_upload_size_rejects_invalid(file_size):
+    assert not admission.valid_size(file_size)
+    with pytest.raises(ValueError):
+        admission.check_upload_size(file_size)
+
+
+def test_check_upload_size_limit(monkeypatch):
+    monkeypatch.setattr(admission, "MAX_UPLOAD_SIZE", 1000)
+    admission.check_upload_size(0)
+    admission.check_upload_size(1000)
+    with pytest.raises(ValueError, match="máximo"):
+        admission.check_upload_size(1001)
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(admission, "get_redis", lambda **kwargs: client)
+    return admission.AdmissionController(max_queue_depth=0), client
+
+
+def test_release_never_goes_below_zero(controller):
+    pytest.importorskip("lupa")  # Scripts Lua en fakeredis
+    controller, client = controller
+    key = controller.uploads_key(1)
+    assert controller.admit(1, 10) is None
+    assert controller.admit(1, 10) is None
+    controller.release(1)
+    assert client.get(key) == "1" and client.ttl(key) > 0  # El DECR conserva el TTL
+    controller.release(1)
+    assert client.get(key) is None
+    controller.release(1)  # La clave venció con la subida en curso: no queda en -1
+    assert client.get(key) is None
+
+
+def test_rejected_upload_is_undone(controller):
+    pytest.importorskip("lupa")
+    controller, client = controller
+    controller.max_uploads_per_user = 1
+    assert controller.admit(1, 10) is None
+    assert controller.admit(1, 10)["status"] == "busy"
+    assert client.get(controller.uploads_key(1)) == "1"
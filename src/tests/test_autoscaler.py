@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+import pytest
+from tasks import autoscaler
+from tasks.autoscaler import Autoscaler, ScalingPolicy, window
+
+
+@pytest.fixture
+def policy():
+    return ScalingPolicy(target_ms=1000, minimum=1, maximum=4, up_after=2, down_after=3, down_ratio=0.5, cooldown=30)
+
+
+def test_grows_after_consecutive_slow_windows(policy):
+    assert policy.decide(2, 1500, now=0) == 2
+    assert policy.decide(2, 1500, now=10) == 3
+
+
+def test_fast_window_resets_hysteresis(policy):
+    assert policy.decide(2, 1500, now=0) == 2
+    assert policy.decide(2, 800, now=10) == 2
+    assert policy.decide(2, 1500, now=20) == 2
+    assert policy.decide(2, 1500, now=30) == 3
+
+
+def test_cooldown_after_change(policy):
+    policy.decide(2, 1500, now=0)
+    assert policy.decide(2, 1500, now=10) == 3
+    assert policy.decide(3, 1500, now=20) == 3
+    assert policy.decide(3, 1500, now=30) == 3
+    assert policy.decide(3, 1500, now=40) == 4  # Pasaron 30 s desde el cambio
+
+
+def test_shrinks_only_if_projected_latency_stays_low(policy):
+    # 300 ms con 2 procesos serían 600 ms con 1: por encima de la mitad del objetivo
+    for now in range(0, 100, 10):
+        assert policy.decide(2, 300, now=now) == 2
+    # 300 ms con 4 procesos serían 400 ms con 3
+    assert [policy.decide(4, 300, now=now) for now in (100, 110, 120)] == [4, 4, 3]
+
+
+def test_idle_windows_shrink(policy):
+    assert [policy.decide(2, None, now=now) for now in (0, 10, 20)] == [2, 2, 1]
+
+
+def test_clamps_to_limits(policy):
+    for now in range(0, 50, 10):
+        assert policy.decide(4, 5000, now=now) == 4
+    assert policy.last_change == float("-inf")
+    assert [policy.decide(1, None, now=now) for now in (50, 60, 70)] == [1, 1, 1]
+    assert policy.decide(6, 800, now=80) == 4
+    assert policy.decide(0, 800, now=200) == 1
+
+
+def test_window_subtracts_previous_snapshot():
+    previous = {"count": 3, "sum_ms": 30.0, "buckets": [[10, 2], [50, 3], ["+Inf", 3]]}
+    current = {"count": 7, "sum_ms": 130.0, "buckets": [[10, 2], [50, 5], ["+Inf", 7]]}
+    assert window(previous, current) == ([(10, 0), (50, 2), (float("inf"), 4)], 4, 100.0)
+
+
+def test_window_without_previous_snapshot():
+    current = {"count": 2, "sum_ms": 20.0, "buckets": [[10, 1], ["+Inf", 2]]}
+    assert window(None, current) == ([(10, 1), (float("inf"), 2)], 2, 20.0)
+    assert window(None, {}) == ([], 0, 0)
+
+
+def test_step_reads_current_once(monkeypatch, policy):
+    class Scaler:
+        reads = 0
+        resized = None
+
+        @property
+        def current(self):
+            self.reads += 1
+            return 2
+
+        def resize(self, target):
+            self.resized = target
+
+    monkeypatch.setattr(autoscaler, "snapshot", lambda: {})
+    monkeypatch.setattr(autoscaler, "queue_depth", lambda: 10)
+    monkeypatch.setattr(autoscaler, "get_redis", lambda: SimpleNamespace(set=lambda *args, **kwargs: None))
+    scaler = Scaler()
+    loop = Autoscaler(scaler, policy)
+    loop.inference_ms = 200
+    status = loop.step()
+    assert scaler.reads == 1
+    assert status["backlog_ms"] == 10 * 200 / 2
+    assert status["workers"] == 2
@@ -0,0 +1,34 @@
+import io
+import os
+import pytest
+from PIL import Image
+from tasks.preprocessing import load_image
+from utils.blobstore import LocalBlobStore, shard_path
+
+
+def small_image(image_format, size=(8, 8)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (40, 160, 60)).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("image_format,extension", [("WEBP", ".webp"), ("JPEG", ".jpg"), ("PNG", ".png")])
+def test_open_small_image(tmp_path, image_format, extension):
+    # Menos de 2 KB: Pillow prueba el formato PCD haciendo seek al byte 2048
+    data = small_image(image_format)
+    assert len(data) < 2048
+    key = f"0123abcd{extension}"
+    path = shard_path(str(tmp_path), key)
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as f:
+        f.write(data)
+
+    with LocalBlobStore(str(tmp_path)).open(key) as source:
+        assert load_image(source, 16).shape == (16, 16, 3)
+
+
+def test_local_path_falls_back_to_flat_file(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    (tmp_path / "abcdef.jpg").write_bytes(small_image("JPEG"))
+    assert store.local_path("abcdef.jpg") == os.path.join(str(tmp_path), "abcdef.jpg")
+    assert store.local_path("012345.jpg") == shard_path(str(tmp_path), "012345.jpg")
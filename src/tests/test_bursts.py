@@ -0,0 +1,39 @@
+import pytest
+from server import bursts
+
+
+def burst(*frames):
+    return {"action": "send_burst", "protocol": 3, "user_id": 1, "frames": list(frames)}
+
+
+def test_validate_burst_accepts_frames():
+    metadata = burst({"image_name": "a.jpg", "file_size": 10}, {"image_name": "b.jpg", "file_size": 0})
+    assert bursts.validate_burst(metadata) is None
+    assert bursts.burst_size(metadata) == 10
+
+
+@pytest.mark.parametrize("frame", [
+    "a.jpg",
+    {"file_size": 10},
+    {"image_name": "", "file_size": 10},
+    {"image_name": 3, "file_size": 10},
+    {"image_name": "a.jpg"},
+    {"image_name": "a.jpg", "file_size": "10"},
+    {"image_name": "a.jpg", "file_size": -1},
+])
+def test_validate_burst_rejects_bad_frames(frame):
+    metadata = burst({"image_name": "ok.jpg", "file_size": 10}, frame)
+    assert "frame 2" in bursts.validate_burst(metadata)
+
+
+def test_burst_size_unknown_with_bad_sizes():
+    assert bursts.burst_size(burst({"image_name": "a.jpg", "file_size": "10"})) is None
+    assert bursts.burst_size({"frames": "a.jpg"}) is None
+    assert bursts.validate_burst({"protocol": 3, "frames": "a.jpg"}) == "frames debe ser una lista"
+
+
+def test_validate_burst_oversized_frame_keeps_size(monkeypatch):
+    monkeypatch.setattr(bursts, "MAX_UPLOAD_SIZE", 5)
+    metadata = burst({"image_name": "a.jpg", "file_size": 10})
+    assert "máximo" in bursts.validate_burst(metadata)
+    assert bursts.burst_size(metadata) == 10  # El payload se puede descartar
@@ -0,0 +1,26 @@
+from datetime import datetime
+import pytest
+from server import export
+
+
+def test_export_denied_without_token(monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_TOKEN", None)
+    messages = list(export.export_messages({"token": ""}))
+    assert [message["status"] for message in messages] == ["error"]
+    assert messages[0]["done"]
+
+
+def test_export_rejects_wrong_token(monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_TOKEN", "secreto")
+    for metadata in ({}, {"token": "otro"}):
+        messages = list(export.export_messages(metadata))
+        assert messages == [{"status": "error", "message": "Token de exportación inválido", "done": True}]
+
+
+def test_write_parquet_rounds_float_confidence(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    when = datetime(2025, 5, 1, 12, 30)
+    chunks = [[(1, 1, 1, "a.jpg", when, "Sano", 66.67, when), (2, 2, 1, "b.jpg", when, "Enfermo", 60, when)]]
+    output = str(tmp_path / "predicciones.parquet")
+    assert export.write_parquet(chunks, output) == 2
+    assert pq.read_table(output).column("confidence").to_pylist() == [67, 60]
@@ -0,0 +1,123 @@
+import io
+import os
+import numpy as np
+import pytest
+from PIL import Image
+import utils.metrics
+from tasks import image_processing
+from utils.blobstore import LocalBlobStore, shard_path
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    """Tareas con un almacenamiento en tmp_path y sin Redis: registra lo publicado y lo liberado."""
+    published, released = [], []
+    monkeypatch.setattr(image_processing, "get_blob_store", lambda: LocalBlobStore(str(tmp_path)))
+    monkeypatch.setattr(image_processing, "publish_result", lambda user_id, result: published.append(result))
+    monkeypatch.setattr(image_processing, "release_image", released.append)
+    monkeypatch.setattr(utils.metrics, "record_stages", lambda durations: None)
+
+    def store(key, data):
+        path = shard_path(str(tmp_path), key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return key
+
+    return store, published, released
+
+
+def jpeg():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (120, 90, 30)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_missing_image_publishes_error(worker):
+    _, published, released = worker
+    image_processing.process_image_task.apply(args=("ffff0000.jpg", 7), task_id="t-1")
+    assert published == [{"image": "ffff0000.jpg", "status": "error", "message": published[0]["message"],
+                          "user_id": 7, "task_id": "t-1", "trace_id": published[0]["trace_id"]}]
+    assert released == [7]
+
+
+def test_unreadable_burst_publishes_error(worker):
+    store, published, released = worker
+    store("aaaa0000.jpg", b"no es una imagen")
+    image_processing.process_burst_task.apply(args=(["aaaa0000.jpg"], 3), task_id="t-2")
+    assert published[0]["status"] == "error" and published[0]["task_id"] == "t-2"
+    assert "final_result" not in published[0]
+    assert released == [3]
+
+
+def test_batch_falls_back_to_single_images(worker):
+    store, published, released = worker
+    items = [{"image_key": store("bbbb0000.jpg", jpeg()), "user_id": 1, "task_id": "ok", "enqueued_at": 0},
+             {"image_key": store("cccc0000.jpg", b"roto"), "user_id": 2, "task_id": "roto", "enqueued_at": 0}]
+    image_processing.process_image_batch_task.apply(args=(items,))
+    by_task = {result["task_id"]: result for result in published}
+    assert "final_result" in by_task["ok"]
+    assert by_task["roto"]["status"] == "error"
+    assert sorted(released) == [1, 2]
+
+
+class ConstantRunner:
+    """Modelo falso: siempre la misma clase, contando cuántas variantes evalúa."""
+    input_size = 16
+
+    def __init__(self, label):
+        self.label = label
+        self.evaluated = 0
+
+    def predict(self, batch):
+        self.evaluated += len(batch)
+        probabilities = np.zeros((len(batch), 3), dtype=np.float32)
+        probabilities[:, self.label] = 1.0
+        return probabilities
+
+
+def test_adaptive_confidence_over_evaluated_variants(monkeypatch):
+    runner = ConstantRunner(label=2)
+    monkeypatch.setattr(image_processing, "get_runner", lambda: runner)
+    fixed = image_processing.classify_image(io.BytesIO(jpeg()), num_repeats=5, mode="fixed")
+    runner.evaluated = 0
+    adaptive = image_processing.classify_image(io.BytesIO(jpeg()), num_repeats=5, mode="adaptive")
+
+    assert runner.evaluated == 3  # Mayoría de 5 tras el primer lote
+    assert adaptive["final_result"] == fixed["final_result"] == "Enfermo"
+    assert adaptive["details"] == [2, 2, 2]
+    assert adaptive["confidence"] == fixed["confidence"] == 100.0
+
+
+class CornerRunner:
+    """Modelo falso: clase 1 si la esquina superior izquierda es más clara que la derecha, si no 0."""
+    input_size = 16
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, batch):
+        self.calls.append(len(batch))
+        labels = (batch[:, 0, 0].mean(axis=-1) > batch[:, 0, -1].mean(axis=-1)).astype(int)
+        return np.eye(2, dtype=np.float32)[labels]
+
+
+def png(split):
+    img = Image.new("RGB", (32, 32), (20, 20, 20))
+    if split:
+        img.paste((240, 240, 240), (16, 0, 32, 32))  # Mitad derecha clara: las variantes espejadas votan distinto
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer
+
+
+def test_batch_adaptive_only_reruns_undecided_images(monkeypatch):
+    runner = CornerRunner()
+    monkeypatch.setattr(image_processing, "get_runner", lambda: runner)
+    uniform, split = image_processing.classify_batch([png(False), png(True)], num_repeats=5, mode="adaptive")
+
+    assert runner.calls == [6, 2]  # 3 variantes de cada una y luego las 2 restantes de la indecisa
+    assert uniform["details"] == [0, 0, 0]
+    assert split["details"] == [0, 1, 0, 1, 0]
+    assert (uniform["confidence"], split["confidence"]) == (100.0, 60.0)
+    assert image_processing.classify_batch([png(True)], num_repeats=5, mode="fixed")[0]["details"] == [0, 1, 0, 1, 0]
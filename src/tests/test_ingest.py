@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from utils.database import Base
+from server import ingest
+from server.models import Image, User
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+
+@pytest.mark.parametrize("upsert", [True, False])
+def test_ingest_creates_user_once(db, monkeypatch, upsert):
+    if not upsert:
+        monkeypatch.setattr(ingest, "DIALECT_INSERTS", {})  # Motor sin INSERT ... ON CONFLICT: camino del ORM
+    first = ingest.ingest_image(db, 7, "a.jpg")
+    second = ingest.ingest_image(db, 7, "b.jpg")
+    db.commit()
+    assert second == first + 1
+    assert db.scalars(select(User.username)).all() == ["usuario_7"]
+    assert db.scalars(select(Image.image_path).order_by(Image.id)).all() == ["a.jpg", "b.jpg"]
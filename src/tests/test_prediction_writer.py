@@ -0,0 +1,40 @@
+from datetime import datetime
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from utils.database import Base
+from server.models import Image, Prediction, User
+from server.prediction_writer import PredictionBatchWriter
+
+
+def test_copy_buffer_format():
+    created_at = datetime(2025, 5, 1, 12, 30, 0, 250000)
+    rows = [{"image_id": 1, "result": "Sano", "confidence": 60, "created_at": created_at},
+            {"image_id": 2, "result": "Posible Enfermedad", "confidence": 67, "created_at": created_at}]
+    assert PredictionBatchWriter.copy_buffer(rows).getvalue() == (
+        "1,Sano,60,2025-05-01 12:30:00.250000\r\n"
+        "2,Posible Enfermedad,67,2025-05-01 12:30:00.250000\r\n"
+    )
+
+
+def test_flush_rounds_confidence():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add(User(id=1, username="granja"))
+        db.add_all([Image(id=1, user_id=1, image_path="a.jpg"), Image(id=2, user_id=1, image_path="b.jpg")])
+        db.commit()
+
+    rows = []
+
+    class RecordingWriter(PredictionBatchWriter):
+        def insert_rows(self, db, batch):
+            rows.extend(batch)
+            PredictionBatchWriter.insert_rows(db, batch)
+
+    RecordingWriter(session_factory=factory).flush([(1, "Sano", 60.0), (2, "Enfermo", 66.67)])
+
+    assert [row["confidence"] for row in rows] == [60, 67]
+    assert all(type(row["confidence"]) is int for row in rows)
+    with factory() as db:
+        assert db.scalars(select(Prediction.confidence).order_by(Prediction.image_id)).all() == [60, 67]
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+import pytest
+from tasks import scheduling
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(scheduling, "get_redis", lambda **kwargs: client)
+    monkeypatch.setattr(scheduling, "get_blob_store", lambda: SimpleNamespace(put=lambda path: path))
+    return client
+
+
+@pytest.mark.parametrize("batching", [False, True])
+def test_submit_and_release_balance_pending(redis_client, monkeypatch, batching):
+    monkeypatch.setattr(scheduling, "INFERENCE_BATCHING", batching)
+    monkeypatch.setattr(scheduling, "enqueue_image", lambda *args: None)
+    monkeypatch.setattr(scheduling.celery, "send_task", lambda *args, **kwargs: None)
+
+    for task_id in ("t1", "t2"):
+        scheduling.submit_image(f"{task_id}.jpg", 7, task_id)
+    assert redis_client.get(scheduling.pending_key(7)) == "2"
+
+    scheduling.release_image(7)
+    scheduling.release_image(7)
+    assert redis_client.get(scheduling.pending_key(7)) is None
+
+
+def test_dispatch_batch_routes_by_queue(monkeypatch):
+    from tasks import batching
+    sent = []
+    monkeypatch.setattr(batching.celery, "send_task", lambda name, args, **kwargs: sent.append((args[0], kwargs)))
+    batch = [{"task_id": "a", "queue": "interactive", "priority": 2},
+             {"task_id": "b", "queue": "bulk", "priority": 5},
+             {"task_id": "c", "queue": "interactive", "priority": 0},
+             {"task_id": "d"}]  # Encolada sin ruta: cola por defecto
+    batching.dispatch_batch(batch)
+    assert [([item["task_id"] for item in items], kwargs) for items, kwargs in sent] == [
+        (["a", "c", "d"], {"queue": "interactive", "priority": 0}),
+        (["b"], {"queue": "bulk", "priority": 5}),
+    ]
+
+
+def test_batched_submission_carries_route(redis_client, monkeypatch):
+    enqueued = []
+    monkeypatch.setattr(scheduling, "INFERENCE_BATCHING", True)
+    monkeypatch.setattr(scheduling, "enqueue_image", lambda *args: enqueued.append(args))
+    scheduling.submit_image("a.jpg", 7, "t1", bulk=True)
+    assert enqueued == [("a.jpg", 7, "t1", None, {"queue": scheduling.BULK_QUEUE, "priority": 0})]
@@ -0,0 +1,40 @@
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+from server import server
+
+
+def test_cached_prediction_returns_blob_key(monkeypatch):
+    saved = []
+    monkeypatch.setattr(server.prediction_cache, "get", lambda checksum: {"final_result": "Sano", "confidence": 100, "details": [0]})
+    monkeypatch.setattr(server, "session_scope", contextmanager(lambda: (yield None)))
+    monkeypatch.setattr(server, "ingest_image", lambda db, user_id, image_path: 5)
+    monkeypatch.setattr(server, "save_prediction", lambda image_id, result: saved.append(image_id))
+
+    reply = server.cached_prediction(1, "/srv/uploads/ab/cd/abcd.jpg", "abcd")
+    assert reply["image"] == "abcd.jpg"
+    assert reply["cached"] and reply["final_result"] == "Sano"
+    assert saved == [5]
+
+
+def test_result_callback_does_not_block_dispatcher(monkeypatch, tmp_path):
+    release, delivered = threading.Event(), threading.Event()
+    monkeypatch.setattr(server, "IMAGE_FOLDER", str(tmp_path))
+    monkeypatch.setattr(server, "save_prediction", lambda image_id, result: release.wait(5))
+    monkeypatch.setattr(server.prediction_cache, "put", lambda checksum, result: None)
+
+    class Conn:
+        def fileno(self):
+            return 3
+
+        def sendall(self, data):
+            delivered.set()
+
+    trace = SimpleNamespace(finish=lambda name: None)
+    image_server = server.ImageServer()
+    callback = image_server.result_callback(Conn(), {"protocol": 3}, 1, 5, "abcd", trace)
+    callback({"final_result": "Sano", "confidence": 100, "task_id": "t"})  # Vuelve aunque la cola del writer esté llena
+    assert not delivered.is_set()
+    release.set()
+    image_server.results.shutdown(wait=True)
+    assert delivered.is_set()
@@ -0,0 +1,88 @@
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from utils.database import Base
+from server.models import Image, User
+from server import storage
+
+
+@pytest.fixture
+def folder(tmp_path, monkeypatch):
+    """IMAGE_FOLDER temporal y una base SQLite en memoria para server.storage."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add(User(id=1, username="granja"))
+        db.commit()
+
+    @contextmanager
+    def session_scope():
+        db = factory()
+        try:
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    monkeypatch.setattr(storage, "IMAGE_FOLDER", str(tmp_path))
+    monkeypatch.setattr(storage, "session_scope", session_scope)
+    return SimpleNamespace(path=tmp_path, factory=factory)
+
+
+def add_file(folder, name, age=7200):
+    path = str(folder.path / name)
+    with open(path, "wb") as f:
+        f.write(b"imagen")
+    os.utime(path, (time.time() - age, time.time() - age))
+    return path
+
+
+def add_image(folder, path, days):
+    with folder.factory() as db:
+        db.add(Image(user_id=1, image_path=path, uploaded_at=datetime.now() - timedelta(days=days)))
+        db.commit()
+
+
+def image_paths(folder):
+    with folder.factory() as db:
+        return db.scalars(select(Image.image_path).order_by(Image.id)).all()
+
+
+def test_relocate_deletes_after_update(folder):
+    old = add_file(folder, "abc.jpg")
+    add_image(folder, old, days=40)
+    state = {}
+    assert storage.relocate(old, "abc.c.webp", state, datetime.now() - timedelta(days=30)) == 1
+    assert not os.path.exists(old)
+    assert image_paths(folder) == ["abc.c.webp"]
+    assert state["borrar"] == []
+
+
+def test_relocate_keeps_file_still_referenced(folder):
+    old = add_file(folder, "abc.jpg")
+    add_image(folder, old, days=40)
+    add_image(folder, old, days=0)  # Subida repetida que llegó durante la pasada
+    state = {}
+    assert storage.relocate(old, "abc.c.webp", state, datetime.now() - timedelta(days=30)) == 1
+    assert os.path.exists(old)
+    assert image_paths(folder) == ["abc.c.webp", old]
+    assert state["borrar"] == []
+
+
+def test_relocate_keeps_recently_reused_file(folder):
+    old = add_file(folder, "abc.jpg", age=0)  # El servidor lo reutilizó y todavía no registró la fila
+    add_image(folder, old, days=40)
+    state = {}
+    storage.relocate(old, "abc.c.webp", state, datetime.now() - timedelta(days=30))
+    assert os.path.exists(old)
+    assert state["borrar"] == [old]
+
+    os.utime(old, (time.time() - 7200, time.time() - 7200))
+    assert storage.remove_pending(state) == []
+    assert not os.path.exists(old)
@@ -0,0 +1,119 @@
+"""Almacenamiento de imágenes independiente de la máquina que las recibió.
+
+El servidor guarda cada subida en IMAGE_FOLDER con un nombre direccionado por contenido
+(`<sha256><ext>`), en subdirectorios por los primeros caracteres del hash (`ab/cd/abcd...jpg`),
+y ese nombre es la clave con la que los workers piden los bytes:
+
+- BLOB_BACKEND=local: los workers leen IMAGE_FOLDER (misma máquina o disco compartido).
+- BLOB_BACKEND=redis: el servidor además copia la imagen a Redis (`blob:<clave>`, con TTL)
+  y un worker en otra máquina la lee de ahí. Si el archivo existe en el IMAGE_FOLDER del
+  worker (misma máquina que el servidor) se lee de disco sin pasar por Redis.
+"""
+import fcntl
+import io
+import os
+import logging
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from utils.redis_client import get_redis
+
+# Cargar variables desde el .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BLOB_BACKEND = os.getenv("BLOB_BACKEND", "local")
+BLOB_TTL = int(os.getenv("BLOB_TTL", 86400))  # Segundos que una imagen queda en Redis
+IMAGE_FOLDER = os.getenv("IMAGE_FOLDER", "server/uploads/")
+SHARD_LEVELS = 2  # Subdirectorios de 2 caracteres: hasta 65536 directorios hoja
+
+
+def shard_path(root, name):
+    """Ruta de `name` dentro de `root` particionada por sus primeros caracteres (root/ab/cd/abcd...)."""
+    return os.path.join(root, *(name[2 * level:2 * level + 2] for level in range(SHARD_LEVELS)), name)
+
+
+@contextmanager
+def content_lock(root, name):
+    """Lock entre procesos (flock) para reutilizar o borrar un archivo por contenido.
+
+    Lo comparten el servidor al deduplicar una subida y server.storage al borrar un archivo
+    viejo; hay 256 archivos de lock en root/.locks, repartidos por los 2 primeros caracteres del hash.
+    """
+    directory = os.path.join(root, ".locks")
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{name[:2]}.lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def blob_key(image_path):
+    """Clave de una imagen guardada: su nombre por contenido."""
+    return os.path.basename(image_path)
+
+
+class LocalBlobStore:
+    """Imágenes en un directorio local."""
+
+    def __init__(self, root=IMAGE_FOLDER):
+        self.root = root
+
+    def local_path(self, key):
+        path = shard_path(self.root, key)
+        flat = os.path.join(self.root, key)
+        # Imágenes de antes del particionado que server.storage todavía no movió
+        return flat if not os.path.exists(path) and os.path.exists(flat) else path
+
+    def put(self, image_path):
+        """Publica una imagen ya guardada en disco y devuelve su clave."""
+        return blob_key(image_path)
+
+    @contextmanager
+    def open(self, key):
+        """Archivo de solo lectura con los bytes de la imagen (válido dentro del `with`).
+
+        Un archivo común y no un mmap: Pillow prueba formatos haciendo seek más allá del final
+        (PCD salta al byte 2048) y un mmap lo rechaza, así que imágenes chicas no se podían abrir.
+        """
+        with open(self.local_path(key), "rb") as f:
+            yield f
+
+
+class RedisBlobStore(LocalBlobStore):
+    """Copia las imágenes a Redis para workers en otras máquinas."""
+
+    def __init__(self, root=IMAGE_FOLDER, ttl=BLOB_TTL):
+        super().__init__(root)
+        self.redis = get_redis()
+        self.ttl = ttl
+
+    def put(self, image_path):
+        key = blob_key(image_path)
+        # Contenido inmutable: si la clave ya existe solo se renueva el TTL
+        if not self.redis.expire(f"blob:{key}", self.ttl):
+            with open(image_path, "rb") as f:
+                self.redis.set(f"blob:{key}", f.read(), ex=self.ttl)
+        return key
+
+    @contextmanager
+    def open(self, key):
+        if os.path.exists(self.local_path(key)):
+            with super().open(key) as data:
+                yield data
+            return
+        data = self.redis.get(f"blob:{key}")
+        if data is None:
+            raise FileNotFoundError(f"La imagen {key} no está en Redis ni en {self.root}")
+        yield io.BytesIO(data)
+
+
+_store = None
+
+
+def get_blob_store():
+    """Backend configurado en BLOB_BACKEND (uno por proceso)."""
+    global _store
+    if _store is None:
+        _store = RedisBlobStore() if BLOB_BACKEND == "redis" else LocalBlobStore()
+        logger.info(f"Almacenamiento de imágenes: {BLOB_BACKEND}")
+    return _store
@@ -1,4 +1,5 @@
 import os
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import create_engine
@@ -9,11 +10,59 @@ load_dotenv()
 # Obtener la URL de la base de datos desde el .env
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Configuración del pool de conexiones
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))  # Segundos esperando una conexión libre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # Segundos antes de renovar una conexión
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+def engine_options(url):
+    """Opciones del engine según el motor; SQLite no admite el tamaño de pool."""
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if not url.startswith("sqlite"):
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
 Base = declarative_base()
+_engine = None
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
+
+def get_engine():
+    """Engine del proceso; se crea en el primer uso, así importar este módulo no toca la base."""
+    global _engine
+    if _engine is None:
+        if not DATABASE_URL:
+            raise RuntimeError("DATABASE_URL no está configurada")
+        _engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+        _session_factory.configure(bind=_engine)
+    return _engine
+
+def SessionLocal():
+    """Nueva sesión ligada al engine (creándolo si hace falta)."""
+    get_engine()
+    return _session_factory()
+
+def __getattr__(name):
+    # `from utils.database import engine` sigue funcionando, pero crea el engine recién ahí
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@contextmanager
+def session_scope():
+    """Sesión por solicitud: commit al terminar, rollback si hay errores."""
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
 
 def init_db():
     from src.server.models import User, Image, Prediction 
-    Base.metadata.create_all(bind=engine)  # Crea las tablas en la DB
+    Base.metadata.create_all(bind=get_engine())  # Crea las tablas en la DB
 
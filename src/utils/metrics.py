@@ -0,0 +1,128 @@
+"""Histogramas de latencia por etapa, compartidos entre servidor, workers y writer vía Redis.
+
+Cada solicitud de imagen lleva un trace id que se crea en el servidor, viaja en los headers
+de la tarea de Celery y vuelve en el resultado publicado. Cada proceso mide sus etapas con
+un `Trace` y las suma de una vez a `metricas:etapa:<etapa>` (un hash con un contador por
+bucket, `count` y `sum` en ms).
+"""
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+import redis
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+STAGES_KEY = "metricas:etapas"
+
+
+def stage_key(stage):
+    return f"metricas:etapa:{stage}"
+
+
+def record_stages(durations):
+    """Suma una observación (en ms) al histograma de cada etapa, en un solo viaje a Redis."""
+    if not durations:
+        return
+    pipe = get_redis().pipeline(transaction=False)
+    for stage, elapsed_ms in durations.items():
+        bucket = next((str(limit) for limit in BUCKETS_MS if elapsed_ms <= limit), "+Inf")
+        pipe.sadd(STAGES_KEY, stage)
+        pipe.hincrby(stage_key(stage), bucket, 1)
+        pipe.hincrby(stage_key(stage), "count", 1)
+        pipe.hincrbyfloat(stage_key(stage), "sum", elapsed_ms)
+    try:
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"No se pudieron registrar métricas: {e}")
+
+
+class Trace:
+    """Tiempos de las etapas de una imagen dentro de un proceso."""
+
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.last_lap = self.started
+        self.durations = {}
+
+    def add(self, stage, elapsed_ms):
+        self.durations[stage] = self.durations.get(stage, 0.0) + elapsed_ms
+
+    def lap(self, stage):
+        """Registra el tiempo desde la vuelta anterior (o desde que se creó la traza)."""
+        now = time.perf_counter()
+        self.add(stage, (now - self.last_lap) * 1000)
+        self.last_lap = now
+
+    @contextmanager
+    def stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, (time.perf_counter() - start) * 1000)
+
+    def finish(self, total_stage=None):
+        """Registra las etapas medidas (y el total desde que se creó la traza, si se pide)."""
+        if total_stage:
+            self.add(total_stage, (time.perf_counter() - self.started) * 1000)
+        record_stages(self.durations)
+        summary = ", ".join(f"{stage} {elapsed_ms:.1f} ms" for stage, elapsed_ms in self.durations.items())
+        logger.info(f"Traza {self.trace_id}: {summary}")
+
+
+def quantile(buckets, count, q):
+    """Estimación de un cuantil a partir de los buckets acumulados (interpolando dentro del bucket)."""
+    if not count:
+        return None
+    rank = q * count
+    lower, seen = 0.0, 0
+    for limit, cumulative in buckets:
+        if cumulative >= rank:
+            if limit == float("inf"):
+                return lower
+            in_bucket = cumulative - seen
+            return lower + (limit - lower) * ((rank - seen) / in_bucket if in_bucket else 1.0)
+        lower, seen = limit, cumulative
+    return lower
+
+
+def snapshot():
+    """Histogramas de todas las etapas: buckets acumulados, count, sum y p50/p95/p99 estimados."""
+    r = get_redis(decode_responses=True)
+    stages = sorted(r.smembers(STAGES_KEY))
+    pipe = r.pipeline(transaction=False)
+    for stage in stages:
+        pipe.hgetall(stage_key(stage))
+
+    result = {}
+    for stage, raw in zip(stages, pipe.execute()):
+        cumulative, buckets = 0, []
+        for limit in BUCKETS_MS + (float("inf"),):
+            cumulative += int(raw.get("+Inf" if limit == float("inf") else str(limit), 0))
+            buckets.append((limit, cumulative))
+        count = int(raw.get("count", 0))
+        result[stage] = {
+            "count": count,
+            "sum_ms": round(float(raw.get("sum", 0)), 3),
+            "buckets": [["+Inf" if limit == float("inf") else limit, total] for limit, total in buckets],
+            **{f"p{int(q * 100)}_ms": quantile(buckets, count, q) for q in (0.5, 0.95, 0.99)},
+        }
+    return result
+
+
+def prometheus_text(stages):
+    """Formato de exposición de texto de Prometheus para un `snapshot()`."""
+    lines = [
+        "# HELP farmeye_stage_latency_ms Latencia por etapa del procesamiento de imágenes.",
+        "# TYPE farmeye_stage_latency_ms histogram",
+    ]
+    for stage, data in stages.items():
+        for limit, total in data["buckets"]:
+            lines.append(f'farmeye_stage_latency_ms_bucket{{stage="{stage}",le="{limit}"}} {total}')
+        lines.append(f'farmeye_stage_latency_ms_sum{{stage="{stage}"}} {data["sum_ms"]}')
+        lines.append(f'farmeye_stage_latency_ms_count{{stage="{stage}"}} {data["count"]}')
+    return "\n".join(lines) + "\n"
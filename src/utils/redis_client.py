@@ -0,0 +1,35 @@
+"""Conexión a Redis compartida, configurada con REDIS_URL y creada en el primer uso."""
+import os
+import time
+import logging
+from dotenv import load_dotenv
+import redis
+
+# Cargar variables desde el .env
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+_clients = {}
+
+
+def get_redis(decode_responses=False):
+    """Cliente de Redis del proceso; redis-py abre la conexión en el primer comando."""
+    if decode_responses not in _clients:
+        _clients[decode_responses] = redis.Redis.from_url(REDIS_URL, decode_responses=decode_responses)
+    return _clients[decode_responses]
+
+
+def wait_for_redis(max_retries=5, retry_delay=2):
+    """Espera hasta que Redis esté disponible"""
+    for attempt in range(max_retries):
+        try:
+            get_redis().ping()
+            logger.info("Conexión exitosa con Redis")
+            return True
+        except redis.ConnectionError:
+            logger.warning(f"Intento {attempt + 1}/{max_retries}: No se puede conectar a Redis. Reintentando en {retry_delay} segundos...")
+            time.sleep(retry_delay)
+    return False